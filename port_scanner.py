@@ -1,46 +1,54 @@
 
 import sys
-import socket
 import threading
-import queue
-import ipaddress
-import time
 from datetime import datetime
 import json
-import xml.etree.ElementTree as ET
 import os
 from pathlib import Path
 import logging
 import psutil
 import re
+import ipaddress
+from array import array
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLineEdit, QPushButton, QProgressBar, QComboBox, 
-                            QLabel, QTableWidget, QTableWidgetItem, QHeaderView, 
+                            QLabel, QTableWidget, QTableWidgetItem, QTableView, QHeaderView, 
                             QStyleFactory, QMenuBar, QMenu, QStatusBar,
                             QDialog, QFormLayout, QSpinBox, QMessageBox, QCheckBox,
                             QTabWidget, QGroupBox, QColorDialog, QToolTip)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTranslator, QLocale
+from PyQt6.QtCore import (Qt, QThread, QObject, QTimer, pyqtSignal, QTranslator, QLocale,
+                          QAbstractTableModel, QModelIndex)
 from PyQt6.QtGui import QIcon, QColor, QPalette, QAction, QKeySequence, QShortcut
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from scanner_core import (SCAN_PROFILES, SCAN_MODES, CHUNK_SIZE, TargetSpace, TargetFeeder, ResultStore,
+                          create_worker, validate_ports)
+from scanner_checkpoint import ScanCheckpoint
+from scanner_export import EXPORT_FORMATS, open_sink
+from scanner_db import ScanDatabase
+from scanner_diff import ScanDiff, OPENED
+from scanner_timing import MAX_HOST_CONCURRENCY, create_timing
+from scanner_order import new_seed
+from scanner_ratelimit import RateLimiter
+from scanner_fingerprint import load_fingerprints
+from scanner_discovery import discover_hosts
+from scanner_resolver import parse_targets, targets_valid
+from scanner_source import NETIFACES_AVAILABLE, network_interfaces, create_source_binder
+from scanner_metrics import ScanMetrics, format_duration
+from scanner_logging import setup_logging
 
-# Attempt to import netifaces, but make it optional
-try:
-    import netifaces
-    NETIFACES_AVAILABLE = True
-except ImportError:
-    NETIFACES_AVAILABLE = False
-    logging.warning("netifaces module not available. Network interface selection disabled.")
+# Setup logging: queued and written by a background thread to a rotating log file.
+# The level defaults to INFO; set PORT_SCANNER_LOG_LEVEL=DEBUG to also log every result
+setup_logging()
 
-# Setup logging
-logging.basicConfig(filename='port_scanner.log', level=logging.DEBUG,
-                   format='%(asctime)s - %(levelname)s - %(message)s')
+if not NETIFACES_AVAILABLE:
+    logging.warning("netifaces module not available. Interfaces can only be bound by device name (needs root).")
 
 # Translation dictionaries
 TRANSLATIONS = {
     'en': {
         'title': 'Advanced Network Port Scanner',
-        'ip_label': 'IP Address/Range:',
+        'ip_label': 'Targets:',
         'port_label': 'Port Range:',
         'scan_button': 'Start Scan',
         'stop_button': 'Stop Scan',
@@ -51,6 +59,8 @@ TRANSLATIONS = {
         'language_label': 'Language:',
         'results_label': 'Scan Results:',
         'history_label': 'Scan History:',
+        'find_hosts_label': 'Hosts with port open in the last N days:',
+        'find_hosts': 'Find Hosts',
         'visualization_label': 'Port Distribution:',
         'settings_menu': 'Settings',
         'save_config': 'Save Configuration',
@@ -61,6 +71,21 @@ TRANSLATIONS = {
         'scan_profile_label': 'Scan Profile:',
         'timeout_label': 'Timeout (ms):',
         'threads_label': 'Threads:',
+        'scan_mode_label': 'Scan Mode:',
+        'concurrency_label': 'Max In-Flight Connections:',
+        'banner_timeout_label': 'Banner Timeout (ms):',
+        'filter_placeholder': 'Filter results...',
+        'processes_label': 'Processes:',
+        'adaptive_timing_label': 'Adaptive Timeout:',
+        'discovery_label': 'Discover Live Hosts First:',
+        'stream_export_label': 'Write Results to File While Scanning:',
+        'diff_label': 'Report Only Changes Since the Last Scan:',
+        'stream_export_off': 'Off',
+        'discovering': 'Discovering live hosts...',
+        'resolving': 'Resolving targets...',
+        'unresolved': 'Could not resolve: {}',
+        'resume_title': 'Resume Scan',
+        'resume_prompt': 'This scan did not finish ({} of {} probes done). Resume it where it stopped?',
         'ip': 'IP Address',
         'port': 'Port',
         'service': 'Service',
@@ -72,7 +97,7 @@ TRANSLATIONS = {
         'completed': 'Scan Completed',
         'stopped': 'Scan Stopped',
         'error': 'Error',
-        'invalid_ip': 'Invalid IP address or range (e.g., 192.168.1.1 or 192.168.1.0/24)',
+        'invalid_ip': 'Invalid target (e.g., 192.168.1.0/24, 2001:db8::1, example.com or @targets.txt)',
         'invalid_port': 'Invalid port range (e.g., 1-65535 or 80,443,22)',
         'results_saved': 'Results saved successfully to {}',
         'config_saved': 'Configuration saved successfully',
@@ -80,11 +105,26 @@ TRANSLATIONS = {
         'about': 'About',
         'about_text': 'Advanced Network Port Scanner v2.0\nDeveloped with PyQt6\nSupports multiple themes, languages, and advanced features',
         'direction': 'ltr',
-        'netifaces_warning': 'Network interface selection unavailable (install netifaces)'
+        'netifaces_warning': 'Network interface selection unavailable (install netifaces)',
+        'source_addresses_label': 'Source Addresses (comma-separated):',
+        'source_ports_label': 'Source Ports:',
+        'metrics_status': '{rate} probes/s | RTT p50 {rtt} | in flight {in_flight} | timeouts {timeouts} | '
+                          'refused {refused} | errors {errors} | ETA {eta}',
+        'metrics_errnos': 'Socket errors:',
+        'metrics_errors': 'Scan errors:',
+        'scan_errors': '{count} errors, see the status bar for details',
+        'randomize_label': 'Randomize Scan Order:',
+        'host_concurrency_label': 'Max Probes per Host:',
+        'max_rate_label': 'Max Rate:',
+        'host_rate_label': 'Per Host:',
+        'rate_prefix_label': 'Per-Host Rate Applies to Subnets of Prefix:',
+        'tls_label': 'Inspect TLS Ports:',
+        'unlimited': 'Unlimited',
+        'busiest_hosts': 'Busiest hosts (probes/s):'
     },
     'fa': {
         'title': 'اسکنر پیشرفته پورت شبکه',
-        'ip_label': 'آدرس/محدوده IP:',
+        'ip_label': 'اهداف:',
         'port_label': 'محدوده پورت:',
         'scan_button': 'شروع اسکن',
         'stop_button': 'توقف اسکن',
@@ -95,6 +135,8 @@ TRANSLATIONS = {
         'language_label': 'زبان:',
         'results_label': 'نتایج اسکن:',
         'history_label': 'تاریخچه اسکن:',
+        'find_hosts_label': 'میزبان‌هایی که این پورت در N روز گذشته روی آن‌ها باز بوده:',
+        'find_hosts': 'یافتن میزبان‌ها',
         'visualization_label': 'توزیع پورت‌ها:',
         'settings_menu': 'تنظیمات',
         'save_config': 'ذخیره تنظیمات',
@@ -105,6 +147,21 @@ TRANSLATIONS = {
         'scan_profile_label': 'پروفایل اسکن:',
         'timeout_label': 'تایم‌اوت (میلی‌ثانیه):',
         'threads_label': 'تعداد نخ‌ها:',
+        'scan_mode_label': 'حالت اسکن:',
+        'concurrency_label': 'حداکثر اتصالات همزمان:',
+        'banner_timeout_label': 'تایم‌اوت بنر (میلی‌ثانیه):',
+        'filter_placeholder': 'فیلتر نتایج...',
+        'processes_label': 'تعداد پردازه‌ها:',
+        'adaptive_timing_label': 'تایم‌اوت تطبیقی:',
+        'discovery_label': 'ابتدا میزبان‌های فعال کشف شوند:',
+        'stream_export_label': 'ذخیره نتایج در فایل حین اسکن:',
+        'diff_label': 'فقط تغییرات نسبت به اسکن قبلی گزارش شود:',
+        'stream_export_off': 'خاموش',
+        'discovering': 'در حال کشف میزبان‌های فعال...',
+        'resolving': 'در حال تبدیل نام اهداف...',
+        'unresolved': 'تبدیل این نام‌ها ممکن نشد: {}',
+        'resume_title': 'ادامه اسکن',
+        'resume_prompt': 'این اسکن کامل نشده است ({} از {} بررسی انجام شده). از همان نقطه ادامه داده شود؟',
         'ip': 'آدرس IP',
         'port': 'پورت',
         'service': 'سرویس',
@@ -116,7 +173,7 @@ TRANSLATIONS = {
         'completed': 'اسکن کامل شد',
         'stopped': 'اسکن متوقف شد',
         'error': 'خطا',
-        'invalid_ip': 'آدرس یا محدوده IP نامعتبر است (مثال: 192.168.1.1 یا 192.168.1.0/24)',
+        'invalid_ip': 'هدف نامعتبر است (مثال: 192.168.1.0/24، 2001:db8::1، example.com یا @targets.txt)',
         'invalid_port': 'محدوده پورت نامعتبر است (مثال: 1-65535 یا 80,443,22)',
         'results_saved': 'نتایج با موفقیت در {} ذخیره شد',
         'config_saved': 'تنظیمات با موفقیت ذخیره شد',
@@ -124,11 +181,26 @@ TRANSLATIONS = {
         'about': 'درباره',
         'about_text': 'اسکنر پیشرفته پورت شبکه نسخه 2.0\nتوسعه یافته با PyQt6\nپشتیبانی از چندین تم، زبان و ویژگی‌های پیشرفته',
         'direction': 'rtl',
-        'netifaces_warning': 'انتخاب رابط شبکه در دسترس نیست (netifaces را نصب کنید)'
+        'netifaces_warning': 'انتخاب رابط شبکه در دسترس نیست (netifaces را نصب کنید)',
+        'source_addresses_label': 'آدرس‌های مبدأ (جدا شده با کاما):',
+        'source_ports_label': 'پورت‌های مبدأ:',
+        'metrics_status': '{rate} کاوش/ثانیه | RTT میانه {rtt} | در جریان {in_flight} | مهلت تمام‌شده {timeouts} | '
+                          'ردشده {refused} | خطا {errors} | زمان باقی‌مانده {eta}',
+        'metrics_errnos': 'خطاهای سوکت:',
+        'metrics_errors': 'خطاهای اسکن:',
+        'scan_errors': '{count} خطا، جزئیات در نوار وضعیت',
+        'randomize_label': 'ترتیب تصادفی اسکن:',
+        'host_concurrency_label': 'حداکثر کاوش هم‌زمان هر میزبان:',
+        'max_rate_label': 'حداکثر نرخ:',
+        'host_rate_label': 'هر میزبان:',
+        'rate_prefix_label': 'اعمال نرخ هر میزبان به زیرشبکه‌هایی با پیشوند:',
+        'tls_label': 'بررسی پورت‌های TLS:',
+        'unlimited': 'نامحدود',
+        'busiest_hosts': 'پرکارترین میزبان‌ها (کاوش/ثانیه):'
     },
     'zh': {
         'title': '高级网络端口扫描器',
-        'ip_label': 'IP地址/范围：',
+        'ip_label': '目标：',
         'port_label': '端口范围：',
         'scan_button': '开始扫描',
         'stop_button': '停止扫描',
@@ -139,6 +211,8 @@ TRANSLATIONS = {
         'language_label': '语言：',
         'results_label': '扫描结果：',
         'history_label': '扫描历史：',
+        'find_hosts_label': '最近 N 天内开放该端口的主机：',
+        'find_hosts': '查找主机',
         'visualization_label': '端口分布：',
         'settings_menu': '设置',
         'save_config': '保存配置',
@@ -149,6 +223,21 @@ TRANSLATIONS = {
         'scan_profile_label': '扫描配置文件：',
         'timeout_label': '超时（毫秒）：',
         'threads_label': '线程数：',
+        'scan_mode_label': '扫描模式：',
+        'concurrency_label': '最大并发连接数：',
+        'banner_timeout_label': '横幅超时（毫秒）：',
+        'filter_placeholder': '筛选结果...',
+        'processes_label': '进程数：',
+        'adaptive_timing_label': '自适应超时：',
+        'discovery_label': '先发现存活主机：',
+        'stream_export_label': '扫描时将结果写入文件：',
+        'diff_label': '仅报告自上次扫描以来的变化：',
+        'stream_export_off': '关闭',
+        'discovering': '正在发现存活主机...',
+        'resolving': '正在解析目标...',
+        'unresolved': '无法解析：{}',
+        'resume_title': '继续扫描',
+        'resume_prompt': '此扫描尚未完成（已完成 {} / {} 个探测）。是否从中断处继续？',
         'ip': 'IP地址',
         'port': '端口',
         'service': '服务',
@@ -160,7 +249,7 @@ TRANSLATIONS = {
         'completed': '扫描完成',
         'stopped': '扫描已停止',
         'error': '错误',
-        'invalid_ip': '无效的IP地址或范围（例如：192.168.1.1 或 192.168.1.0/24）',
+        'invalid_ip': '无效的目标（例如：192.168.1.0/24、2001:db8::1、example.com 或 @targets.txt）',
         'invalid_port': '无效的端口范围（例如：1-65535 或 80,443,22）',
         'results_saved': '结果成功保存到 {}',
         'config_saved': '配置保存成功',
@@ -168,84 +257,234 @@ TRANSLATIONS = {
         'about': '关于',
         'about_text': '高级网络端口扫描器 v2.0\n使用PyQt6开发\n支持多种主题、语言和高级功能',
         'direction': 'ltr',
-        'netifaces_warning': '网络接口选择不可用（请安装netifaces）'
+        'netifaces_warning': '网络接口选择不可用（请安装netifaces）',
+        'source_addresses_label': '源地址（逗号分隔）：',
+        'source_ports_label': '源端口：',
+        'metrics_status': '{rate} 探测/秒 | RTT 中位数 {rtt} | 进行中 {in_flight} | 超时 {timeouts} | '
+                          '拒绝 {refused} | 错误 {errors} | 剩余时间 {eta}',
+        'metrics_errnos': '套接字错误：',
+        'metrics_errors': '扫描错误：',
+        'scan_errors': '{count} 个错误，详情见状态栏',
+        'randomize_label': '随机扫描顺序：',
+        'host_concurrency_label': '每个主机最大并发探测数：',
+        'max_rate_label': '最大速率：',
+        'host_rate_label': '每主机：',
+        'rate_prefix_label': '每主机速率按此前缀长度的子网计算：',
+        'tls_label': '检查 TLS 端口：',
+        'unlimited': '不限',
+        'busiest_hosts': '最繁忙的主机（探测/秒）：'
     }
 }
 
-# Common ports and their services
-COMMON_PORTS = {
-    20: 'FTP-DATA', 21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP', 53: 'DNS',
-    80: 'HTTP', 110: 'POP3', 143: 'IMAP', 443: 'HTTPS', 445: 'SMB', 3389: 'RDP',
-    3306: 'MySQL', 5432: 'PostgreSQL', 8080: 'HTTP-ALT', 8443: 'HTTPS-ALT'
-}
-
-# Scan profiles
-SCAN_PROFILES = {
-    'Common': '21,22,23,25,80,110,143,443,445,3389',
-    'Web': '80,443,8080,8443',
-    'Database': '3306,5432',
-    'Full': '1-65535',
-    'Quick': '21,22,80,443'
-}
-
 class ScanThread(QThread):
     scan_result = pyqtSignal(str, int, str, str, str)
     progress = pyqtSignal(int)
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, ip_list, port_list, timeout, queue, interface=None):
+    def __init__(self, worker):
         super().__init__()
-        self.ip_list = ip_list
-        self.port_list = port_list
-        self.timeout = timeout / 1000.0
-        self.queue = queue
-        self.is_running = True
-        self.is_paused = False
-        self.interface = interface
+        self.worker = worker
+        worker.on_result = self.scan_result.emit
+        worker.on_progress = self.progress.emit
+        worker.on_error = self.error.emit
 
-    def get_service_banner(self, ip, port):
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self.timeout)
-            sock.connect((ip, port))
-            sock.send(b'HEAD / HTTP/1.0\r\n\r\n')
-            banner = sock.recv(1024).decode('utf-8', errors='ignore').strip()
-            sock.close()
-            return banner[:100] if banner else 'No banner'
-        except:
-            return 'No banner'
+    @property
+    def is_running(self):
+        return self.worker.is_running
+
+    def run(self):
+        self.worker.run()
+        self.finished.emit()
+
+    def pause(self):
+        self.worker.pause()
+
+    def resume(self):
+        self.worker.resume()
+
+    def stop(self):
+        self.worker.stop()
+
+class TargetThread(QThread):
+    # Resolves the target list and, if asked, sweeps it for live hosts off the GUI thread
+    targets_ready = pyqtSignal(object, object)
+    unresolved = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, target_input, discovery, timeout, concurrency, parent=None):
+        super().__init__(parent)
+        self.target_input = target_input
+        self.discovery = discovery
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.cancel = threading.Event()
 
     def run(self):
-        while self.is_running and not self.queue.empty():
-            if self.is_paused:
-                time.sleep(0.1)
-                continue
+        try:
+            networks, unresolved = parse_targets(self.target_input)
+        except (OSError, ValueError) as e:
+            self.error.emit(str(e))
+            networks, unresolved = [], []
+        if unresolved:
+            self.unresolved.emit(unresolved)
+        hosts = None
+        if networks and self.discovery and not self.cancel.is_set():
             try:
-                ip, port = self.queue.get()
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(self.timeout)
-                result = sock.connect_ex((str(ip), port))
-                status = 'Open' if result == 0 else 'Closed'
-                service = COMMON_PORTS.get(port, 'Unknown')
-                banner = self.get_service_banner(str(ip), port) if status == 'Open' else ''
-                if status == 'Open':
-                    self.scan_result.emit(str(ip), port, service, status, banner)
-                sock.close()
-                self.progress.emit(1)
-                self.queue.task_done()
+                hosts = discover_hosts(networks, self.timeout, concurrency=self.concurrency, cancel=self.cancel)
             except Exception as e:
                 self.error.emit(str(e))
-                self.queue.task_done()
+        if not self.cancel.is_set():
+            self.targets_ready.emit(networks, hosts)
 
-    def pause(self):
-        self.is_paused = True
+    def stop(self):
+        self.cancel.set()
 
-    def resume(self):
-        self.is_paused = False
+class ResultAggregator(QObject):
+    results_ready = pyqtSignal(list)
+    progress_ready = pyqtSignal(int)
+
+    def __init__(self, interval=100, parent=None):
+        super().__init__(parent)
+        self._results = []
+        self._progress = 0
+        self._lock = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def attach(self, thread):
+        # Direct connections run in the scan thread and only append under a lock;
+        # the GUI thread picks the batches up on the timer
+        thread.scan_result.connect(self.add_result, Qt.ConnectionType.DirectConnection)
+        thread.progress.connect(self.add_progress, Qt.ConnectionType.DirectConnection)
+
+    def add_result(self, ip, port, service, status, banner):
+        with self._lock:
+            self._results.append((ip, port, service, status, banner))
+
+    def add_progress(self, count):
+        with self._lock:
+            self._progress += count
+
+    def start(self):
+        self.timer.start()
 
     def stop(self):
-        self.is_running = False
+        self.timer.stop()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            results, self._results = self._results, []
+            progress, self._progress = self._progress, 0
+        if results:
+            self.results_ready.emit(results)
+        if progress:
+            self.progress_ready.emit(progress)
+
+class ResultsTableModel(QAbstractTableModel):
+    COLUMNS = ['ip', 'port', 'service', 'status', 'banner']
+
+    def __init__(self, store, language='en', parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.language = language
+        # Store rows shown by the view, or None to show every row in store order
+        self.rows = None
+        self.filter_text = ''
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store) if self.rows is None else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        row = index.row() if self.rows is None else self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return self.store.ip(row)
+        if column == 1:
+            return str(self.store.ports[row])
+        if column == 2:
+            return self.store.service(row)
+        if column == 3:
+            return self.store.status(row)
+        return self.store.banner(row)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return TRANSLATIONS[self.language][self.COLUMNS[section]]
+        return str(section + 1)
+
+    def set_language(self, language):
+        self.language = language
+        self.headerDataChanged.emit(Qt.Orientation.Horizontal, 0, len(self.COLUMNS) - 1)
+
+    def sort_key(self, column):
+        store = self.store
+        if column == 0:
+            return store.ip_key
+        if column == 1:
+            return store.ports.__getitem__
+        if column == 2:
+            return lambda row: store.service_names[store.services[row]]
+        if column == 3:
+            return lambda row: store.status_names[store.statuses[row]]
+        return lambda row: store.banner_data[store.banner_offsets[row]:store.banner_offsets[row + 1]]
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if column < 0:
+            return
+        self.beginResetModel()
+        rows = range(len(self.store)) if self.rows is None else self.rows
+        self.rows = array('I', sorted(rows, key=self.sort_key(column),
+                                      reverse=order == Qt.SortOrder.DescendingOrder))
+        self.endResetModel()
+
+    def matches(self, row):
+        text = self.filter_text
+        return (text in self.store.ip(row) or text in str(self.store.ports[row])
+                or text in self.store.service(row).lower() or text in self.store.status(row).lower()
+                or text in self.store.banner(row).lower())
+
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.strip().lower()
+        if self.filter_text:
+            self.rows = array('I', (row for row in range(len(self.store)) if self.matches(row)))
+        else:
+            self.rows = None
+        self.endResetModel()
+
+    def append_results(self, results):
+        start = len(self.store)
+        if self.rows is None:
+            self.beginInsertRows(QModelIndex(), start, start + len(results) - 1)
+            self.store.extend(results)
+            self.endInsertRows()
+            return
+        # With a sort or filter active, new rows are appended to the end of the view
+        self.store.extend(results)
+        new_rows = [row for row in range(start, len(self.store)) if not self.filter_text or self.matches(row)]
+        if new_rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+            self.rows.extend(new_rows)
+            self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.rows = None
+        self.filter_text = ''
+        self.endResetModel()
 
 class CustomThemeDialog(QDialog):
     def __init__(self, parent=None, language='en'):
@@ -310,22 +549,97 @@ class SettingsDialog(QDialog):
         self.timeout_input.setRange(100, 5000)
         self.timeout_input.setValue(1000)
         
+        self.banner_timeout_input = QSpinBox()
+        self.banner_timeout_input.setRange(50, 5000)
+        self.banner_timeout_input.setValue(500)
+        
         self.threads_input = QSpinBox()
         self.threads_input.setRange(1, max(1, psutil.cpu_count() * 2))
         self.threads_input.setValue(min(10, psutil.cpu_count()))
         
         self.interface_combo = QComboBox()
-        if NETIFACES_AVAILABLE:
-            interfaces = netifaces.interfaces()
+        interfaces = network_interfaces()
+        if interfaces:
             self.interface_combo.addItems(['Auto'] + interfaces)
         else:
             self.interface_combo.addItems(['Auto'])
             self.interface_combo.setEnabled(False)
             self.interface_combo.setToolTip(TRANSLATIONS[self.language]['netifaces_warning'])
         
+        self.source_addresses_input = QLineEdit()
+        self.source_addresses_input.setPlaceholderText('Auto')
+        self.source_addresses_input.setToolTip('Spread probes round-robin over these local addresses')
+        
+        self.source_ports_input = QLineEdit()
+        self.source_ports_input.setPlaceholderText('Auto')
+        self.source_ports_input.setToolTip('Spread probes over these source ports, e.g. 40000-40999')
+        
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(SCAN_MODES)
+        self.mode_combo.currentTextChanged.connect(self.update_mode_inputs)
+        
+        self.concurrency_input = QSpinBox()
+        self.concurrency_input.setRange(1, 10000)
+        self.concurrency_input.setValue(1000)
+        
+        self.processes_input = QSpinBox()
+        self.processes_input.setRange(1, max(1, psutil.cpu_count()))
+        self.processes_input.setValue(max(1, psutil.cpu_count()))
+        
+        self.adaptive_checkbox = QCheckBox()
+        self.adaptive_checkbox.setChecked(True)
+        self.adaptive_checkbox.setToolTip('Derive each host\'s timeout from its measured RTT and back off on drops')
+        
+        self.randomize_checkbox = QCheckBox()
+        self.randomize_checkbox.setChecked(True)
+        self.randomize_checkbox.setToolTip('Probe hosts and ports in a random order so no single host gets a burst')
+        
+        self.host_concurrency_input = QSpinBox()
+        self.host_concurrency_input.setRange(1, 10000)
+        self.host_concurrency_input.setValue(MAX_HOST_CONCURRENCY)
+        self.host_concurrency_input.setToolTip('Most probes in flight to any one host at a time')
+        
+        self.rate_prefix_input = QSpinBox()
+        self.rate_prefix_input.setRange(8, 32)
+        self.rate_prefix_input.setValue(32)
+        self.rate_prefix_input.setPrefix('/')
+        self.rate_prefix_input.setToolTip('32 limits each host on its own; e.g. 24 shares the per-host rate within '
+                                          'each /24 (and each IPv6 /64)')
+        
+        self.tls_checkbox = QCheckBox()
+        self.tls_checkbox.setToolTip('Handshake with open TLS ports (443, 8443, 993, ...) and show the protocol, cipher, '
+                                     'certificate and JA3S fingerprint instead of a plaintext banner')
+        
+        self.discovery_checkbox = QCheckBox()
+        self.discovery_checkbox.setToolTip('Find live hosts with ICMP (where permitted) and TCP to common ports, then scan only those')
+        
+        self.stream_combo = QComboBox()
+        self.stream_combo.addItem(TRANSLATIONS[self.language]['stream_export_off'], None)
+        for fmt in EXPORT_FORMATS:
+            self.stream_combo.addItem(fmt, fmt)
+        self.stream_combo.setToolTip('Append each result to scan_results_<time>.<format> as soon as it is found')
+        
+        self.diff_checkbox = QCheckBox()
+        self.diff_checkbox.setToolTip('Compare with the last completed scan of the same range and ports and show only '
+                                      'newly opened, closed and changed-banner ports')
+        
         layout.addRow(TRANSLATIONS[self.language]['timeout_label'], self.timeout_input)
+        layout.addRow(TRANSLATIONS[self.language]['banner_timeout_label'], self.banner_timeout_input)
+        layout.addRow(TRANSLATIONS[self.language]['scan_mode_label'], self.mode_combo)
         layout.addRow(TRANSLATIONS[self.language]['threads_label'], self.threads_input)
+        layout.addRow(TRANSLATIONS[self.language]['concurrency_label'], self.concurrency_input)
+        layout.addRow(TRANSLATIONS[self.language]['processes_label'], self.processes_input)
+        layout.addRow(TRANSLATIONS[self.language]['adaptive_timing_label'], self.adaptive_checkbox)
+        layout.addRow(TRANSLATIONS[self.language]['randomize_label'], self.randomize_checkbox)
+        layout.addRow(TRANSLATIONS[self.language]['host_concurrency_label'], self.host_concurrency_input)
+        layout.addRow(TRANSLATIONS[self.language]['rate_prefix_label'], self.rate_prefix_input)
+        layout.addRow(TRANSLATIONS[self.language]['tls_label'], self.tls_checkbox)
+        layout.addRow(TRANSLATIONS[self.language]['discovery_label'], self.discovery_checkbox)
+        layout.addRow(TRANSLATIONS[self.language]['stream_export_label'], self.stream_combo)
+        layout.addRow(TRANSLATIONS[self.language]['diff_label'], self.diff_checkbox)
         layout.addRow(TRANSLATIONS[self.language]['interface_label'], self.interface_combo)
+        layout.addRow(TRANSLATIONS[self.language]['source_addresses_label'], self.source_addresses_input)
+        layout.addRow(TRANSLATIONS[self.language]['source_ports_label'], self.source_ports_input)
         
         buttons = QHBoxLayout()
         save_button = QPushButton(TRANSLATIONS[self.language]['save_config'])
@@ -337,24 +651,53 @@ class SettingsDialog(QDialog):
         
         layout.addRow(buttons)
         self.setLayout(layout)
+        self.update_mode_inputs(self.mode_combo.currentText())
+
+    def update_mode_inputs(self, mode):
+        self.threads_input.setEnabled(mode == 'Threaded')
+        self.concurrency_input.setEnabled(mode in ('Async', 'Multi-process', 'UDP'))
+        self.processes_input.setEnabled(mode == 'Multi-process')
+        # SYN and UDP scans grab no banners
+        self.tls_checkbox.setEnabled(mode not in ('SYN', 'UDP'))
 
 class PortDistributionCanvas(FigureCanvas):
+    # 64 fixed bins of 1024 ports, so a port's bin is port >> 10
+    BIN_SHIFT = 10
+    BINS = 65536 >> BIN_SHIFT
+
     def __init__(self, parent=None):
         self.figure, self.ax = plt.subplots()
         super().__init__(self.figure)
         self.setParent(parent)
+        self.counts = [0] * self.BINS
+        width = 1 << self.BIN_SHIFT
+        self.bars = self.ax.bar([i * width for i in range(self.BINS)], self.counts,
+                                width=width, align='edge', color='blue', alpha=0.7)
+        self.ax.set_xlim(0, 65536)
+        self.ax.set_ylim(0, 1)
         self.ax.set_title(TRANSLATIONS['en']['visualization_label'])
         self.ax.set_xlabel('Port')
         self.ax.set_ylabel('Count')
 
-    def update_plot(self, ports):
-        self.ax.clear()
-        if ports:
-            self.ax.hist(ports, bins=50, color='blue', alpha=0.7)
-        self.ax.set_title(TRANSLATIONS['en']['visualization_label'])
-        self.ax.set_xlabel('Port')
-        self.ax.set_ylabel('Count')
-        self.draw()
+    def add_ports(self, ports):
+        changed = set()
+        for port in ports:
+            index = port >> self.BIN_SHIFT
+            self.counts[index] += 1
+            changed.add(index)
+        if not changed:
+            return
+        for index in changed:
+            self.bars[index].set_height(self.counts[index])
+        self.ax.set_ylim(0, max(self.counts) * 1.1)
+        self.draw_idle()
+
+    def reset(self):
+        self.counts = [0] * self.BINS
+        for bar in self.bars:
+            bar.set_height(0)
+        self.ax.set_ylim(0, 1)
+        self.draw_idle()
 
 class PortScanner(QMainWindow):
     def __init__(self):
@@ -362,15 +705,32 @@ class PortScanner(QMainWindow):
         self.language = 'en'
         self.theme = 'Windows'
         self.scan_threads = []
-        self.task_queue = queue.Queue()
+        self.running_threads = 0
+        self.scan_stopped = False
+        self.target_thread = None
+        self.scan_settings = None
+        self.targets = None
+        self.checkpoint = None
+        self.export_sink = None
+        self.restored_results = set()
         self.total_tasks = 0
         self.completed_tasks = 0
+        self.metrics = None
+        self.rate_limiter = None
+        self.tls_inspector = None
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.update_metrics)
+        self.db = ScanDatabase()
         self.scan_history = []
         self.is_paused = False
         self.translator = QTranslator()
-        self.open_ports = []
+        self.aggregator = ResultAggregator(parent=self)
+        self.aggregator.results_ready.connect(self.add_results)
+        self.aggregator.progress_ready.connect(self.update_progress)
         self.init_ui()
         self.load_config()
+        self.load_scan_history()
         self.setup_shortcuts()
         self.setWindowIcon(QIcon('port_scanner.jpg'))
 
@@ -426,7 +786,7 @@ class PortScanner(QMainWindow):
         input_layout = QHBoxLayout()
         
         self.ip_input = QLineEdit()
-        self.ip_input.setPlaceholderText('192.168.1.0/24 or 192.168.1.1')
+        self.ip_input.setPlaceholderText('192.168.1.0/24, 2001:db8::1, example.com or @targets.txt')
         self.ip_input.textChanged.connect(self.validate_ip_input)
         self.ip_input.setToolTip(TRANSLATIONS[self.language]['invalid_ip'])
         input_layout.addWidget(QLabel(TRANSLATIONS[self.language]['ip_label']))
@@ -445,6 +805,16 @@ class PortScanner(QMainWindow):
         input_layout.addWidget(QLabel(TRANSLATIONS[self.language]['scan_profile_label']))
         input_layout.addWidget(self.profile_combo)
         
+        # Rate limits in probes/s; changes apply to a running scan at once
+        self.max_rate_input = self.rate_input('Most probes per second for the whole scan')
+        self.host_rate_input = self.rate_input('Most probes per second to any one host (or subnet, see Settings)')
+        self.max_rate_label = QLabel(TRANSLATIONS[self.language]['max_rate_label'])
+        self.host_rate_label = QLabel(TRANSLATIONS[self.language]['host_rate_label'])
+        input_layout.addWidget(self.max_rate_label)
+        input_layout.addWidget(self.max_rate_input)
+        input_layout.addWidget(self.host_rate_label)
+        input_layout.addWidget(self.host_rate_input)
+        
         input_group.setLayout(input_layout)
         scan_layout.addWidget(input_group)
         
@@ -497,17 +867,24 @@ class PortScanner(QMainWindow):
         scan_layout.addWidget(self.progress_bar)
         
         # Results table
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(5)
-        self.results_table.setHorizontalHeaderLabels([
-            TRANSLATIONS[self.language]['ip'],
-            TRANSLATIONS[self.language]['port'],
-            TRANSLATIONS[self.language]['service'],
-            TRANSLATIONS[self.language]['status'],
-            TRANSLATIONS[self.language]['banner']
-        ])
+        self.results_store = ResultStore()
+        self.results_model = ResultsTableModel(self.results_store, self.language, self)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.results_table.setSortingEnabled(True)
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        scan_layout.addWidget(QLabel(TRANSLATIONS[self.language]['results_label']))
+        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText(TRANSLATIONS[self.language]['filter_placeholder'])
+        self.filter_input.textChanged.connect(self.results_model.set_filter)
+        filter_layout = QHBoxLayout()
+        self.results_label = QLabel(TRANSLATIONS[self.language]['results_label'])
+        filter_layout.addWidget(self.results_label)
+        filter_layout.addStretch()
+        filter_layout.addWidget(self.filter_input)
+        scan_layout.addLayout(filter_layout)
         scan_layout.addWidget(self.results_table)
         
         self.tabs.addTab(scan_widget, 'Scan')
@@ -516,12 +893,27 @@ class PortScanner(QMainWindow):
         history_widget = QWidget()
         history_layout = QVBoxLayout(history_widget)
         self.history_table = QTableWidget()
-        self.history_table.setColumnCount(3)
-        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'IP Range', 'Ports'])
+        self.history_table.setColumnCount(5)
+        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'IP Range', 'Ports', 'Status', 'Open Ports'])
         self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.history_table.itemDoubleClicked.connect(self.load_history_scan)
         history_layout.addWidget(QLabel(TRANSLATIONS[self.language]['history_label']))
         history_layout.addWidget(self.history_table)
+        query_layout = QHBoxLayout()
+        self.query_label = QLabel(TRANSLATIONS[self.language]['find_hosts_label'])
+        self.query_port_input = QSpinBox()
+        self.query_port_input.setRange(1, 65535)
+        self.query_port_input.setValue(3389)
+        self.query_days_input = QSpinBox()
+        self.query_days_input.setRange(1, 3650)
+        self.query_days_input.setValue(30)
+        self.query_button = QPushButton(TRANSLATIONS[self.language]['find_hosts'])
+        self.query_button.clicked.connect(self.find_hosts_with_port)
+        query_layout.addWidget(self.query_label)
+        query_layout.addWidget(self.query_port_input)
+        query_layout.addWidget(self.query_days_input)
+        query_layout.addWidget(self.query_button)
+        history_layout.addLayout(query_layout)
         self.tabs.addTab(history_widget, 'History')
         
         # Visualization Tab
@@ -535,9 +927,25 @@ class PortScanner(QMainWindow):
         # Status bar
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
+        self.metrics_label = QLabel()
+        self.status_bar.addPermanentWidget(self.metrics_label)
         
         self.update_ui_direction()
 
+    def rate_input(self, tooltip):
+        spin_box = QSpinBox()
+        spin_box.setRange(0, 1000000)
+        spin_box.setSingleStep(100)
+        spin_box.setSuffix(' /s')
+        spin_box.setSpecialValueText(TRANSLATIONS[self.language]['unlimited'])
+        spin_box.setToolTip(tooltip)
+        spin_box.valueChanged.connect(self.apply_rate_limits)
+        return spin_box
+
+    def apply_rate_limits(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.set_rates(self.max_rate_input.value(), self.host_rate_input.value())
+
     def setup_shortcuts(self):
         QShortcut(QKeySequence('Ctrl+S'), self, self.start_scan)
         QShortcut(QKeySequence('Ctrl+P'), self, self.pause_scan)
@@ -619,17 +1027,20 @@ class PortScanner(QMainWindow):
         self.resume_button.setText(TRANSLATIONS[self.language]['resume_button'])
         self.stop_button.setText(TRANSLATIONS[self.language]['stop_button'])
         self.clear_button.setText(TRANSLATIONS[self.language]['clear_button'])
-        self.results_table.setHorizontalHeaderLabels([
-            TRANSLATIONS[self.language]['ip'],
-            TRANSLATIONS[self.language]['port'],
-            TRANSLATIONS[self.language]['service'],
-            TRANSLATIONS[self.language]['status'],
-            TRANSLATIONS[self.language]['banner']
-        ])
-        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'IP Range', 'Ports'])
+        self.results_model.set_language(self.language)
+        self.results_label.setText(TRANSLATIONS[self.language]['results_label'])
+        self.filter_input.setPlaceholderText(TRANSLATIONS[self.language]['filter_placeholder'])
+        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'IP Range', 'Ports', 'Status', 'Open Ports'])
+        self.query_label.setText(TRANSLATIONS[self.language]['find_hosts_label'])
+        self.query_button.setText(TRANSLATIONS[self.language]['find_hosts'])
         self.tabs.setTabText(0, 'Scan')
         self.tabs.setTabText(1, 'History')
         self.tabs.setTabText(2, 'Visualization')
+        self.max_rate_label.setText(TRANSLATIONS[self.language]['max_rate_label'])
+        self.host_rate_label.setText(TRANSLATIONS[self.language]['host_rate_label'])
+        for spin_box in (self.max_rate_input, self.host_rate_input):
+            spin_box.setSpecialValueText(TRANSLATIONS[self.language]['unlimited'])
+        self.update_metrics()
         
         menubar = self.menuBar()
         menubar.clear()
@@ -652,8 +1063,7 @@ class PortScanner(QMainWindow):
         settings_menu.addAction(about_action)
 
     def validate_ip_input(self):
-        ip_input = self.ip_input.text()
-        is_valid = bool(re.match(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}(?:/\d{1,2})?)$', ip_input))
+        is_valid = targets_valid(self.ip_input.text())
         self.ip_input.setStyleSheet('' if is_valid else 'border: 1px solid red')
 
     def validate_port_input(self):
@@ -661,31 +1071,6 @@ class PortScanner(QMainWindow):
         is_valid = bool(re.match(r'^(\d{1,5}(?:-\d{1,5})?|\d{1,5}(?:,\d{1,5})*)$', port_input))
         self.port_input.setStyleSheet('' if is_valid else 'border: 1px solid red')
 
-    def validate_ip(self, ip_input):
-        try:
-            if '/' in ip_input:
-                network = ipaddress.ip_network(ip_input, strict=False)
-                return [str(ip) for ip in network]
-            else:
-                ipaddress.ip_address(ip_input)
-                return [ip_input]
-        except ValueError:
-            return None
-
-    def validate_ports(self, port_input):
-        try:
-            if '-' in port_input:
-                start, end = map(int, port_input.split('-'))
-                if 1 <= start <= end <= 65535:
-                    return list(range(start, end + 1))
-            else:
-                ports = [int(p) for p in port_input.split(',')]
-                if all(1 <= p <= 65535 for p in ports):
-                    return ports
-            return None
-        except ValueError:
-            return None
-
     def apply_scan_profile(self, profile):
         if profile != 'Custom':
             self.port_input.setText(SCAN_PROFILES[profile])
@@ -694,10 +1079,9 @@ class PortScanner(QMainWindow):
         ip_input = self.ip_input.text()
         port_input = self.port_input.text()
         
-        ip_list = self.validate_ip(ip_input)
-        port_list = self.validate_ports(port_input)
+        port_list = validate_ports(port_input)
         
-        if not ip_list:
+        if not targets_valid(ip_input):
             QMessageBox.critical(self, TRANSLATIONS[self.language]['error'],
                                TRANSLATIONS[self.language]['invalid_ip'])
             return
@@ -711,74 +1095,270 @@ class PortScanner(QMainWindow):
             return
 
         timeout = settings_dialog.timeout_input.value()
-        threads = settings_dialog.threads_input.value()
-        interface = settings_dialog.interface_combo.currentText() if settings_dialog.interface_combo.currentText() != 'Auto' and NETIFACES_AVAILABLE else None
+        interface = settings_dialog.interface_combo.currentText()
+        interface = interface if interface != 'Auto' and settings_dialog.interface_combo.isEnabled() else None
+        source_addresses = settings_dialog.source_addresses_input.text().strip()
+        source_ports = settings_dialog.source_ports_input.text().strip()
+        try:
+            source = create_source_binder(interface, source_addresses, source_ports)
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        diff = None
+        if settings_dialog.diff_checkbox.isChecked():
+            # Look up the baseline before this scan gets its own history entry
+            baseline_id = self.db.latest_scan(ip_input, port_input)
+            diff = ScanDiff(self.db.scan_results(baseline_id) if baseline_id is not None else [])
 
+        # Save to history
+        mode = settings_dialog.mode_combo.currentText()
+        history_entry = {
+            'id': self.db.begin_scan(ip_input, port_input, mode),
+            'started': datetime.now().timestamp(),
+            'ip_range': ip_input,
+            'ports': port_input,
+            'mode': mode,
+            'status': 'running',
+            'checkpoint': None,
+            'open_ports': 0
+        }
+        self.scan_history.insert(0, history_entry)
+        self.update_history_table()
+
+        self.scan_settings = {
+            'networks': None,
+            'ports': port_list,
+            'timeout': timeout,
+            'banner_timeout': settings_dialog.banner_timeout_input.value(),
+            'threads': settings_dialog.threads_input.value(),
+            'mode': mode,
+            'concurrency': settings_dialog.concurrency_input.value(),
+            'processes': settings_dialog.processes_input.value(),
+            'timing': create_timing(timeout, settings_dialog.adaptive_checkbox.isChecked(),
+                                    settings_dialog.host_concurrency_input.value()),
+            'seed': new_seed() if settings_dialog.randomize_checkbox.isChecked() else None,
+            'rate_prefix': settings_dialog.rate_prefix_input.value(),
+            'tls': settings_dialog.tls_checkbox.isChecked() and mode not in ('SYN', 'UDP'),
+            'interface': source,
+            'history': history_entry,
+            'stream_format': settings_dialog.stream_combo.currentData(),
+            'diff': diff
+        }
+        self.scan_settings['params'] = {
+            'ip_range': ip_input,
+            'ports': port_input,
+            'mode': self.scan_settings['mode'],
+            'timeout': timeout,
+            'banner_timeout': self.scan_settings['banner_timeout'],
+            'threads': self.scan_settings['threads'],
+            'concurrency': self.scan_settings['concurrency'],
+            'processes': self.scan_settings['processes'],
+            'adaptive': settings_dialog.adaptive_checkbox.isChecked(),
+            'host_concurrency': settings_dialog.host_concurrency_input.value(),
+            'seed': self.scan_settings['seed'],
+            'max_rate': self.max_rate_input.value(),
+            'host_rate': self.host_rate_input.value(),
+            'rate_prefix': self.scan_settings['rate_prefix'],
+            'tls': self.scan_settings['tls'],
+            'interface': interface,
+            'source_addresses': source_addresses,
+            'source_ports': source_ports
+        }
+        self.reset_scan_view()
+
+        # Hostnames and target files are resolved (and hosts discovered) in the background
+        discovery = settings_dialog.discovery_checkbox.isChecked()
+        self.status_bar.showMessage(TRANSLATIONS[self.language]['discovering' if discovery else 'resolving'])
+        self.progress_bar.setRange(0, 0)
+        # Parented so a thread dropped by stop_scan lives until it returns, then deletes itself
+        self.target_thread = TargetThread(ip_input, discovery, timeout, self.scan_settings['concurrency'], parent=self)
+        self.target_thread.finished.connect(self.target_thread.deleteLater)
+        self.target_thread.targets_ready.connect(self.targets_resolved)
+        self.target_thread.unresolved.connect(self.show_unresolved)
+        self.target_thread.error.connect(self.show_error)
+        self.target_thread.start()
+
+    def targets_resolved(self, networks, hosts):
+        if self.sender() is not self.target_thread:
+            # From a thread stop_scan has already let go of
+            return
+        if not networks:
+            self.stop_scan()
+            return
+        self.scan_settings['networks'] = networks
+        # Stored with the checkpoint so a resumed scan doesn't resolve names again
+        self.scan_settings['params']['networks'] = [str(network) for network in networks]
+        self.launch_scan(hosts)
+
+    def show_unresolved(self, names):
+        self.show_error(TRANSLATIONS[self.language]['unresolved'].format(', '.join(names)))
+
+    def reset_scan_view(self):
         self.scan_button.setEnabled(False)
         self.pause_button.setEnabled(True)
         self.resume_button.setEnabled(False)
         self.stop_button.setEnabled(True)
-        self.results_table.setRowCount(0)
+        self.restored_results = set()
+        self.scan_stopped = False
+        self.results_model.clear()
         self.progress_bar.setValue(0)
-        self.open_ports = []
+        self.canvas.reset()
+        self.scan_threads = []
+
+    def launch_scan(self, hosts, checkpoint=None):
+        settings = self.scan_settings
+        self.target_thread = None
+        self.progress_bar.setRange(0, 100)
         self.status_bar.showMessage(TRANSLATIONS[self.language]['scanning'])
 
-        self.task_queue = queue.Queue()
-        self.total_tasks = len(ip_list) * len(port_list)
-        self.completed_tasks = 0
-        
-        for ip in ip_list:
-            for port in port_list:
-                self.task_queue.put((ip, port))
+        space = TargetSpace(settings['networks'], settings['ports'], hosts, settings['seed'])
+        if checkpoint is None:
+            params = dict(settings['params'], hosts=hosts)
+            try:
+                checkpoint = ScanCheckpoint.create(params, len(space), CHUNK_SIZE)
+            except OSError as e:
+                logging.warning("Scan checkpointing disabled: %s", e)
+        if checkpoint is not None:
+            settings['history']['checkpoint'] = str(checkpoint.path)
+            self.db.set_checkpoint(settings['history']['id'], str(checkpoint.path))
+            self.targets = TargetFeeder(space, checkpoint.chunk_size, completed=checkpoint.completed)
+            self.targets.on_chunk_done = checkpoint.chunk_done
+            checkpoint.open()
+        else:
+            self.targets = TargetFeeder(space)
+        self.checkpoint = checkpoint
+        self.total_tasks = len(space)
+        self.completed_tasks = self.total_tasks - self.targets.total
+        self.metrics = ScanMetrics(self.targets.total)
+        # Created even without limits so they can be set while the scan runs
+        self.rate_limiter = RateLimiter(self.max_rate_input.value(), self.host_rate_input.value(),
+                                        settings['rate_prefix'])
+        if settings['tls']:
+            # Imported lazily, like the optional engines
+            from scanner_tls import TlsInspector
+            self.tls_inspector = TlsInspector(settings['timeout'], settings['banner_timeout'],
+                                              interface=settings['interface'])
+        self.update_progress(0)
+        if settings.get('stream_format'):
+            sink_class = EXPORT_FORMATS[settings['stream_format']]
+            filename = f"scan_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{sink_class.extension}"
+            try:
+                self.export_sink = open_sink(sink_class, filename)
+                logging.info("Streaming results to %s", filename)
+            except OSError as e:
+                self.show_error(str(e))
 
         self.scan_threads = []
-        for _ in range(threads):
-            thread = ScanThread(ip_list, port_list, timeout, self.task_queue, interface)
-            thread.scan_result.connect(self.add_result)
-            thread.progress.connect(self.update_progress)
+        for _ in range(settings['threads'] if settings['mode'] == 'Threaded' else 1):
+            worker = create_worker(self.targets, settings['mode'], settings['timeout'], settings['interface'],
+                                   settings['concurrency'], settings['banner_timeout'], settings['processes'],
+                                   settings['timing'])
+            worker.metrics = self.metrics
+            worker.limiter = self.rate_limiter
+            worker.fingerprints = load_fingerprints()
+            worker.tls = self.tls_inspector
+            thread = ScanThread(worker)
+            self.aggregator.attach(thread)
+            if checkpoint is not None:
+                thread.scan_result.connect(checkpoint.add_result, Qt.ConnectionType.DirectConnection)
+            if self.export_sink is not None:
+                write = self.export_sink.write if settings['diff'] is None else settings['diff'].wrap(self.export_sink.write)
+                thread.scan_result.connect(write, Qt.ConnectionType.DirectConnection)
             thread.finished.connect(self.thread_finished)
-            thread.error.connect(self.show_error)
+            # Counted in the worker's thread and shown in the status bar, not one dialog per error
+            thread.error.connect(self.metrics.add_error, Qt.ConnectionType.DirectConnection)
             self.scan_threads.append(thread)
+        self.running_threads = len(self.scan_threads)
+        self.aggregator.start()
+        self.update_metrics()
+        self.metrics_timer.start()
+        for thread in self.scan_threads:
             thread.start()
 
-        # Save to history
-        self.scan_history.append({
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'ip_range': ip_input,
-            'ports': port_input
-        })
-        self.update_history_table()
+    def add_results(self, results):
+        if self.restored_results:
+            # Chunks that were in flight when a resumed scan stopped are probed again
+            results = [result for result in results if (result[0], result[1]) not in self.restored_results]
+        # The database always gets the full result set so this scan can serve as the next baseline
+        self.db.add_results(self.scan_settings['history']['id'], results)
+        self.scan_settings['history']['open_ports'] += sum(1 for result in results if result[3] == 'Open')
+        if self.scan_settings['diff'] is not None:
+            results = self.scan_settings['diff'].filter(results)
+        self.results_model.append_results(results)
+        if self.export_sink is not None:
+            # Don't leave the tail of a burst sitting in the file buffer
+            self.export_sink.flush()
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # Results are already in the database; the log only gets them when debugging
+            for result in results:
+                logging.debug("Scan result: IP=%s, Port=%d, Service=%s, Status=%s, Banner=%s", *result)
+        self.canvas.add_ports([result[1] for result in results if result[3] in ('Open', OPENED)])
 
-    def add_result(self, ip, port, service, status, banner):
-        if status == 'Open':
-            self.open_ports.append(port)
-            self.canvas.update_plot(self.open_ports)
-        row = self.results_table.rowCount()
-        self.results_table.insertRow(row)
-        self.results_table.setItem(row, 0, QTableWidgetItem(ip))
-        self.results_table.setItem(row, 1, QTableWidgetItem(str(port)))
-        self.results_table.setItem(row, 2, QTableWidgetItem(service))
-        self.results_table.setItem(row, 3, QTableWidgetItem(status))
-        self.results_table.setItem(row, 4, QTableWidgetItem(banner))
-        logging.info(f"Scan result: IP={ip}, Port={port}, Service={service}, Status={status}, Banner={banner}")
-
-    def update_progress(self):
-        self.completed_tasks += 1
-        progress = (self.completed_tasks / self.total_tasks) * 100
+    def update_progress(self, count):
+        self.completed_tasks += count
+        if self.metrics is not None:
+            self.metrics.add_progress(count)
+        progress = (self.completed_tasks / self.total_tasks) * 100 if self.total_tasks else 100
         self.progress_bar.setValue(int(progress))
 
     def thread_finished(self):
-        if all(not thread.is_running for thread in self.scan_threads):
+        # Counted rather than polled: a stopped worker reports not running before its thread exits
+        self.running_threads -= 1
+        if self.running_threads == 0:
+            self.aggregator.stop()
+            if self.tls_inspector is not None:
+                self.tls_inspector.close()
+                self.tls_inspector = None
+            finished = not self.scan_stopped
+            if self.checkpoint is not None:
+                self.checkpoint.close(finished=self.checkpoint.completed_count() == self.checkpoint.total)
+                finished = self.checkpoint.finished
+                self.checkpoint = None
+            if finished and self.scan_settings['diff'] is not None:
+                # Baseline ports not seen again are only known to be closed once the scan is complete
+                closed = self.scan_settings['diff'].closed()
+                self.results_model.append_results(closed)
+                if self.export_sink is not None:
+                    self.export_sink.write_all(closed)
+            self.close_export_sink()
+            self.finish_history_entry('completed' if finished else 'stopped')
             self.scan_button.setEnabled(True)
             self.pause_button.setEnabled(False)
             self.resume_button.setEnabled(False)
             self.stop_button.setEnabled(False)
-            self.status_bar.showMessage(TRANSLATIONS[self.language]['completed'])
-            self.canvas.update_plot(self.open_ports)
+            self.metrics_timer.stop()
+            snapshot = self.update_metrics()
+            message = TRANSLATIONS[self.language]['stopped' if self.scan_stopped else 'completed']
+            if snapshot['errors']:
+                message += ' - ' + TRANSLATIONS[self.language]['scan_errors'].format(count=snapshot['errors'])
+            self.status_bar.showMessage(message)
+
+    def update_metrics(self):
+        if self.metrics is None:
+            return None
+        snapshot = self.metrics.snapshot()
+        p50 = snapshot['rtt']['p50']
+        self.metrics_label.setText(TRANSLATIONS[self.language]['metrics_status'].format(
+            rate=f"{snapshot['rate']:.0f}", rtt='-' if p50 is None else f'<{p50 * 1000:g} ms',
+            in_flight=snapshot['in_flight'], timeouts=snapshot['timeouts'], refused=snapshot['refused'],
+            errors=snapshot['errors'] + sum(snapshot['errnos'].values()), eta=format_duration(snapshot['eta'])))
+        details = []
+        if snapshot['errnos']:
+            details.append(TRANSLATIONS[self.language]['metrics_errnos'])
+            details.extend(f'  {name}: {count}' for name, count in snapshot['errnos'].items())
+        if snapshot['errors']:
+            details.append(TRANSLATIONS[self.language]['metrics_errors'])
+            details.extend(f'  {count} x {message}' for message, count in list(snapshot['error_messages'].items())[:10])
+        busiest = self.rate_limiter.busiest() if self.rate_limiter is not None else []
+        if busiest:
+            details.append(TRANSLATIONS[self.language]['busiest_hosts'])
+            details.extend(f'  {host}: {rate:.0f}' for host, rate in busiest)
+        self.metrics_label.setToolTip('\n'.join(details))
+        return snapshot
 
     def show_error(self, error_msg):
         QMessageBox.critical(self, TRANSLATIONS[self.language]['error'], error_msg)
-        logging.error(f"Error: {error_msg}")
+        logging.error("Error: %s", error_msg)
 
     def pause_scan(self):
         self.is_paused = True
@@ -801,6 +1381,13 @@ class PortScanner(QMainWindow):
         self.status_bar.showMessage(TRANSLATIONS[self.language]['resumed'])
 
     def stop_scan(self):
+        if self.target_thread is not None:
+            self.target_thread.stop()
+            self.target_thread = None
+            self.progress_bar.setRange(0, 100)
+            # No scan thread was started, so nothing else will close the history entry
+            self.finish_history_entry('stopped')
+        self.scan_stopped = True
         for thread in self.scan_threads:
             thread.stop()
         self.scan_button.setEnabled(True)
@@ -808,13 +1395,42 @@ class PortScanner(QMainWindow):
         self.resume_button.setEnabled(False)
         self.stop_button.setEnabled(False)
         self.status_bar.showMessage(TRANSLATIONS[self.language]['stopped'])
-        self.canvas.update_plot(self.open_ports)
+        self.aggregator.flush()
+
+    def closeEvent(self, event):
+        # Stopping aborts in-flight probes, so the wait is short; the checkpoint
+        # is closed only after the last result has been written
+        target_thread = self.target_thread
+        self.stop_scan()
+        if target_thread is not None:
+            target_thread.wait()
+        for thread in self.scan_threads:
+            thread.wait()
+        self.aggregator.stop()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
+            self.finish_history_entry('stopped')
+        self.close_export_sink()
+        self.db.close()
+        super().closeEvent(event)
+
+    def finish_history_entry(self, status):
+        entry = self.scan_settings['history']
+        self.db.finish_scan(entry['id'], status)
+        entry['status'] = status
+        self.update_history_table()
+
+    def close_export_sink(self):
+        if self.export_sink is not None:
+            self.export_sink.close()
+            logging.info("Streamed %d results to %s", self.export_sink.count, self.export_sink.file.name)
+            self.export_sink = None
 
     def clear_results(self):
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
         self.progress_bar.setValue(0)
-        self.open_ports = []
-        self.canvas.update_plot([])
+        self.canvas.reset()
         self.status_bar.showMessage('')
 
     def update_history_table(self):
@@ -822,9 +1438,19 @@ class PortScanner(QMainWindow):
         for scan in self.scan_history:
             row = self.history_table.rowCount()
             self.history_table.insertRow(row)
-            self.history_table.setItem(row, 0, QTableWidgetItem(scan['timestamp']))
+            timestamp = datetime.fromtimestamp(scan['started']).strftime('%Y-%m-%d %H:%M:%S')
+            self.history_table.setItem(row, 0, QTableWidgetItem(timestamp))
             self.history_table.setItem(row, 1, QTableWidgetItem(scan['ip_range']))
             self.history_table.setItem(row, 2, QTableWidgetItem(scan['ports']))
+            self.history_table.setItem(row, 3, QTableWidgetItem(scan['status']))
+            self.history_table.setItem(row, 4, QTableWidgetItem(str(scan['open_ports'])))
+
+    def load_scan_history(self):
+        self.scan_history = self.db.scans()
+        self.update_history_table()
+
+    def is_scanning(self):
+        return self.running_threads > 0 or self.target_thread is not None
 
     def load_history_scan(self, item):
         row = item.row()
@@ -832,13 +1458,100 @@ class PortScanner(QMainWindow):
         self.ip_input.setText(scan['ip_range'])
         self.port_input.setText(scan['ports'])
         self.tabs.setCurrentIndex(0)
+        if self.is_scanning():
+            return
+        self.show_stored_results(self.db.scan_results(scan['id']))
+        if scan['checkpoint'] and scan['status'] != 'completed':
+            self.offer_resume(scan)
+
+    def show_stored_results(self, results):
+        self.results_model.clear()
+        self.canvas.reset()
+        self.results_model.append_results(results)
+        self.canvas.add_ports([result[1] for result in results if result[3] == 'Open'])
+
+    def find_hosts_with_port(self):
+        if self.is_scanning():
+            return
+        rows = self.db.hosts_with_port(self.query_port_input.value(), self.query_days_input.value())
+        self.show_stored_results([row[:5] for row in rows])
+        self.tabs.setCurrentIndex(0)
+
+    def offer_resume(self, scan):
+        try:
+            checkpoint = ScanCheckpoint.load(scan['checkpoint'])
+        except (OSError, ValueError) as e:
+            self.show_error(str(e))
+            return
+        if checkpoint.finished:
+            return
+        answer = QMessageBox.question(
+            self, TRANSLATIONS[self.language]['resume_title'],
+            TRANSLATIONS[self.language]['resume_prompt'].format(checkpoint.completed_count(), checkpoint.total))
+        if answer == QMessageBox.StandardButton.Yes:
+            self.resume_from_checkpoint(scan, checkpoint)
+
+    def resume_from_checkpoint(self, scan, checkpoint):
+        params = checkpoint.params
+        try:
+            if params.get('networks'):
+                networks = [ipaddress.ip_network(network) for network in params['networks']]
+            else:
+                networks = parse_targets(params['ip_range'])[0]
+        except (OSError, ValueError):
+            networks = None
+        port_list = validate_ports(params['ports'])
+        if not networks or not port_list:
+            QMessageBox.critical(self, TRANSLATIONS[self.language]['error'],
+                               TRANSLATIONS[self.language]['invalid_ip' if not networks else 'invalid_port'])
+            return
+        try:
+            source = create_source_binder(params['interface'], params.get('source_addresses'),
+                                          params.get('source_ports'))
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        # Start the resumed file from a compact snapshot instead of appending to the old log
+        checkpoint.write_compacted()
+        self.scan_settings = {
+            'networks': networks,
+            'ports': port_list,
+            'timeout': params['timeout'],
+            'banner_timeout': params['banner_timeout'],
+            'threads': params['threads'],
+            'mode': params['mode'],
+            'concurrency': params['concurrency'],
+            'processes': params['processes'],
+            'timing': create_timing(params['timeout'], params['adaptive'],
+                                    params.get('host_concurrency', MAX_HOST_CONCURRENCY)),
+            # Checkpoints from before randomized ordering have no seed and resume in sequential order
+            'seed': params.get('seed'),
+            'rate_prefix': params.get('rate_prefix', 32),
+            'tls': params.get('tls', False),
+            'interface': source,
+            'history': scan,
+            'params': params,
+            'stream_format': None,
+            'diff': None
+        }
+        self.reset_scan_view()
+        scan['status'] = 'running'
+        self.update_history_table()
+        self.restored_results = set(checkpoint.found)
+        self.results_model.append_results(checkpoint.results)
+        self.canvas.add_ports([result[1] for result in checkpoint.results if result[3] == 'Open'])
+        self.max_rate_input.setValue(params.get('max_rate', 0))
+        self.host_rate_input.setValue(params.get('host_rate', 0))
+        self.launch_scan(params.get('hosts'), checkpoint)
 
     def save_config(self):
         config = {
             'ip': self.ip_input.text(),
             'ports': self.port_input.text(),
             'theme': self.theme_combo.currentText(),
-            'language': self.language_combo.currentText()
+            'language': self.language_combo.currentText(),
+            'max_rate': self.max_rate_input.value(),
+            'host_rate': self.host_rate_input.value()
         }
         try:
             with open('scanner_config.json', 'w', encoding='utf-8') as f:
@@ -857,6 +1570,8 @@ class PortScanner(QMainWindow):
                 self.port_input.setText(config.get('ports', ''))
                 self.theme_combo.setCurrentText(config.get('theme', 'Windows'))
                 self.language_combo.setCurrentText(config.get('language', 'English'))
+                self.max_rate_input.setValue(config.get('max_rate', 0))
+                self.host_rate_input.setValue(config.get('host_rate', 0))
                 self.status_bar.showMessage(TRANSLATIONS[self.language]['config_loaded'])
                 logging.info("Configuration loaded")
         except Exception as e:
@@ -865,7 +1580,7 @@ class PortScanner(QMainWindow):
     def export_results(self):
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            formats = ['CSV', 'JSON', 'XML']
+            formats = list(EXPORT_FORMATS)
             format_dialog = QDialog(self)
             format_layout = QVBoxLayout()
             format_combo = QComboBox()
@@ -877,41 +1592,16 @@ class PortScanner(QMainWindow):
             format_dialog.setLayout(format_layout)
             
             def export_selected():
-                fmt = format_combo.currentText()
-                filename = f'scan_results_{timestamp}.{fmt.lower()}'
-                if fmt == 'CSV':
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write('IP,Port,Service,Status,Banner\n')
-                        for row in range(self.results_table.rowCount()):
-                            items = [self.results_table.item(row, col).text() 
-                                    for col in range(self.results_table.columnCount())]
-                            f.write(','.join(items) + '\n')
-                elif fmt == 'JSON':
-                    results = []
-                    for row in range(self.results_table.rowCount()):
-                        results.append({
-                            'ip': self.results_table.item(row, 0).text(),
-                            'port': self.results_table.item(row, 1).text(),
-                            'service': self.results_table.item(row, 2).text(),
-                            'status': self.results_table.item(row, 3).text(),
-                            'banner': self.results_table.item(row, 4).text()
-                        })
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        json.dump(results, f, ensure_ascii=False, indent=2)
-                elif fmt == 'XML':
-                    root = ET.Element('scan_results')
-                    for row in range(self.results_table.rowCount()):
-                        result = ET.SubElement(root, 'result')
-                        ET.SubElement(result, 'ip').text = self.results_table.item(row, 0).text()
-                        ET.SubElement(result, 'port').text = self.results_table.item(row, 1).text()
-                        ET.SubElement(result, 'service').text = self.results_table.item(row, 2).text()
-                        ET.SubElement(result, 'status').text = self.results_table.item(row, 3).text()
-                        ET.SubElement(result, 'banner').text = self.results_table.item(row, 4).text()
-                    tree = ET.ElementTree(root)
-                    tree.write(filename, encoding='utf-8', xml_declaration=True)
+                sink_class = EXPORT_FORMATS[format_combo.currentText()]
+                filename = f'scan_results_{timestamp}.{sink_class.extension}'
+                sink = open_sink(sink_class, filename)
+                try:
+                    sink.write_all(self.results_store)
+                finally:
+                    sink.close()
                 self.status_bar.showMessage(TRANSLATIONS[self.language]['results_saved'].format(filename))
                 format_dialog.accept()
-                logging.info(f"Results exported to {filename}")
+                logging.info("Results exported to %s", filename)
 
             format_button.clicked.connect(export_selected)
             format_dialog.exec()
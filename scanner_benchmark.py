@@ -0,0 +1,448 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from scanner_core import SCAN_MODES, TargetSpace, TargetFeeder, create_worker, validate_ip
+from scanner_fingerprint import load_fingerprints
+from scanner_timing import MAX_HOST_CONCURRENCY, create_timing
+from scanner_order import new_seed
+
+# resource is POSIX-only; without it peak RSS isn't reported
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+BENCHMARK_FORMAT = 'port-scanner-benchmark/1'
+DEFAULT_BANNER = 'SSH-2.0-FakeTarget_1.0'
+# Both ends of the veth pair used with --netns
+NETNS_HOST_ADDRESS = '10.254.254.1'
+NETNS_TARGET_ADDRESS = '10.254.254.2'
+# The GUI timer fires this often; lag is how late each tick arrives
+GUI_TICK = 0.010
+
+class FakeTargetServer:
+    # Open ports accept and send a banner after latency seconds (TCP) or answer
+    # each datagram with it (UDP). Blackholed ports are listeners whose accept
+    # queue is kept full so further SYNs are dropped and probes time out.
+    # Closed ports have nothing bound, so the kernel refuses them
+    def __init__(self, host, open_ports, blackholed_ports, closed_ports, latency=0.0, banner=DEFAULT_BANNER):
+        self.host = host
+        self.open_ports = open_ports
+        self.blackholed_ports = blackholed_ports
+        self.closed_ports = closed_ports
+        self.latency = latency
+        self.banner = (banner + '\r\n').encode() if banner else b''
+        self.sockets = []
+
+    async def handle(self, reader, writer):
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            writer.write(self.banner)
+            await writer.drain()
+            await asyncio.wait_for(reader.read(1024), 1.0)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    def blackhole(self, port):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, port))
+        listener.listen(0)
+        self.sockets.append(listener)
+        for _ in range(8):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex((self.host, port))
+            self.sockets.append(filler)
+
+    def check_closed(self, port):
+        # A port that is already bound elsewhere would not be closed
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            probe.bind((self.host, port))
+        finally:
+            probe.close()
+
+    async def serve(self, ready):
+        loop = asyncio.get_running_loop()
+        banner, latency = self.banner, self.latency
+
+        class Datagrams(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, address):
+                loop.call_later(latency, self.transport.sendto, banner or b'\0', address)
+
+        for port in self.open_ports:
+            await asyncio.start_server(self.handle, self.host, port, backlog=4096, reuse_address=True)
+            await loop.create_datagram_endpoint(Datagrams, local_addr=(self.host, port))
+        for port in self.blackholed_ports:
+            self.blackhole(port)
+        for port in self.closed_ports:
+            self.check_closed(port)
+        ready()
+        await asyncio.Event().wait()
+
+def port_layout(base_port, ports, open_count, blackholed_count, seed=0):
+    # Open and blackholed ports are scattered over the range so no engine gets them in one batch
+    ports = list(range(base_port, base_port + ports))
+    special = random.Random(seed).sample(ports, open_count + blackholed_count)
+    open_ports = sorted(special[:open_count])
+    blackholed_ports = sorted(special[open_count:])
+    closed_ports = sorted(set(ports) - set(special))
+    return open_ports, blackholed_ports, closed_ports
+
+class ProbeClock(TargetFeeder):
+    # Times each probe from the moment a worker decodes its target to its
+    # first result or its completion, whichever comes first. Only sees probes
+    # made in this process, so Multi-process scans report no latency; SYN
+    # probes without a SYN-ACK complete when their reply window ends
+    def __init__(self, targets):
+        super().__init__(targets)
+        self.started = {}
+        self.latencies = []
+
+    def decode(self, index):
+        target = super().decode(index)
+        self.started[target] = time.perf_counter()
+        return target
+
+    def finish(self, target):
+        started = self.started.pop(target, None)
+        if started is not None:
+            self.latencies.append(time.perf_counter() - started)
+
+    def complete(self, index):
+        self.finish(self.targets.decode(index))
+        super().complete(index)
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def peak_rss():
+    # Peak resident set of this process and of its largest child, in MB
+    if not RESOURCE_AVAILABLE:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1))
+
+def run_engine(mode, host, ports, timeout, threads, concurrency, banner_timeout, processes, adaptive,
+               host_concurrency, randomize):
+    # ports is [first, last + 1]
+    feeder = ProbeClock(TargetSpace(validate_ip(host), range(*ports), seed=new_seed() if randomize else None))
+    timing = create_timing(timeout, adaptive, host_concurrency)
+    statuses = {}
+    errors = {}
+    lock = threading.Lock()
+
+    def on_result(ip, port, service, status, banner):
+        feeder.finish((ip, port))
+        with lock:
+            statuses.setdefault(status, []).append(port)
+
+    def on_error(message):
+        with lock:
+            errors[message] = errors.get(message, 0) + 1
+
+    workers = [create_worker(feeder, mode, timeout, None, concurrency, banner_timeout, processes, timing)
+               for _ in range(threads if mode == 'Threaded' else 1)]
+    for worker in workers:
+        worker.fingerprints = load_fingerprints()
+        worker.on_result = on_result
+        worker.on_error = on_error
+    scan_threads = [threading.Thread(target=worker.run) for worker in workers]
+    started = time.perf_counter()
+    for thread in scan_threads:
+        thread.start()
+    for thread in scan_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss, child_rss = peak_rss()
+    p50, p99 = percentile(feeder.latencies, 0.5), percentile(feeder.latencies, 0.99)
+    return {
+        'engine': mode,
+        'probes': len(feeder.targets),
+        'elapsed': round(elapsed, 3),
+        'probes_per_second': round(len(feeder.targets) / elapsed, 1) if elapsed else None,
+        'latency_p50_ms': None if p50 is None else round(p50 * 1000, 2),
+        'latency_p99_ms': None if p99 is None else round(p99 * 1000, 2),
+        'peak_rss_mb': rss,
+        'peak_child_rss_mb': child_rss if mode == 'Multi-process' else None,
+        'open_ports': sorted(statuses.get('Open', [])),
+        'statuses': {status: len(found) for status, found in statuses.items()},
+        'errors': errors
+    }
+
+def run_gui(mode, host, port_range, timeout, threads, concurrency, banner_timeout, processes, adaptive,
+            host_concurrency, randomize):
+    # Drives a real PortScanner window (offscreen unless a display is set) and
+    # measures how late a 10 ms timer fires while the scan runs
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+    import port_scanner
+
+    def configure(dialog):
+        dialog.timeout_input.setValue(timeout)
+        dialog.banner_timeout_input.setValue(banner_timeout)
+        dialog.mode_combo.setCurrentText(mode)
+        dialog.threads_input.setValue(min(threads, dialog.threads_input.maximum()))
+        dialog.concurrency_input.setValue(concurrency)
+        if processes:
+            dialog.processes_input.setValue(min(processes, dialog.processes_input.maximum()))
+        dialog.adaptive_checkbox.setChecked(adaptive)
+        dialog.host_concurrency_input.setValue(max(1, host_concurrency or dialog.host_concurrency_input.maximum()))
+        dialog.randomize_checkbox.setChecked(randomize)
+        return True
+
+    port_scanner.SettingsDialog.exec = configure
+    app = QApplication([])
+    window = port_scanner.PortScanner()
+    window.ip_input.setText(host)
+    window.port_input.setText(port_range)
+    lags = []
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        lags.append(max(0.0, now - last_tick[0] - GUI_TICK))
+        last_tick[0] = now
+        if not window.is_scanning():
+            app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(tick)
+    timer.start(int(GUI_TICK * 1000))
+    started = time.perf_counter()
+    window.start_scan()
+    app.exec()
+    elapsed = time.perf_counter() - started
+    rows = len(window.results_store)
+    window.close()
+    rss, child_rss = peak_rss()
+    p50, p99 = percentile(lags, 0.5), percentile(lags, 0.99)
+    return {
+        'engine': f'GUI ({mode})',
+        'elapsed': round(elapsed, 3),
+        'lag_p50_ms': None if p50 is None else round(p50 * 1000, 2),
+        'lag_p99_ms': None if p99 is None else round(p99 * 1000, 2),
+        'lag_max_ms': round(max(lags) * 1000, 2) if lags else None,
+        'peak_rss_mb': rss,
+        'peak_child_rss_mb': child_rss if mode == 'Multi-process' else None,
+        'results': rows
+    }
+
+def run_child(command, cwd=None):
+    # Each measurement runs in a fresh interpreter so peak RSS is its own
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)] + command, cwd=cwd,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else 'benchmark child failed')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def start_server(config, netns=None):
+    command = [sys.executable, os.path.abspath(__file__), 'serve', json.dumps(config)]
+    if netns:
+        command = ['ip', 'netns', 'exec', netns] + command
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if server.stdout.readline().strip() != 'ready':
+        server.wait()
+        raise RuntimeError(f'fake target server failed: {server.stderr.read().strip()}')
+    return server
+
+def create_netns(name, latency):
+    # A namespace behind a veth pair, so latency can be added to the handshake itself with netem
+    host_link, target_link = f'{name}a', f'{name}b'
+    commands = [
+        ['ip', 'netns', 'add', name],
+        ['ip', 'link', 'add', host_link, 'type', 'veth', 'peer', 'name', target_link],
+        ['ip', 'link', 'set', target_link, 'netns', name],
+        ['ip', 'addr', 'add', f'{NETNS_HOST_ADDRESS}/30', 'dev', host_link],
+        ['ip', 'link', 'set', host_link, 'up'],
+        ['ip', 'netns', 'exec', name, 'ip', 'addr', 'add', f'{NETNS_TARGET_ADDRESS}/30', 'dev', target_link],
+        ['ip', 'netns', 'exec', name, 'ip', 'link', 'set', target_link, 'up'],
+        ['ip', 'netns', 'exec', name, 'ip', 'link', 'set', 'lo', 'up']
+    ]
+    if latency:
+        commands.append(['tc', 'qdisc', 'add', 'dev', host_link, 'root', 'netem', 'delay', f'{latency}ms'])
+    try:
+        for command in commands:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        delete_netns(name)
+        raise RuntimeError(f'{" ".join(e.cmd)}: {e.stderr.strip()}')
+
+def delete_netns(name):
+    subprocess.run(['ip', 'link', 'del', f'{name}a'], capture_output=True)
+    subprocess.run(['ip', 'netns', 'del', name], capture_output=True)
+
+def available_engines():
+    engines = [mode for mode in SCAN_MODES if mode != 'SYN']
+    from scanner_syn import syn_scan_available
+    if syn_scan_available():
+        engines.append('SYN')
+    return engines
+
+def compare(report, baseline):
+    # Throughput and tail latency of each engine against an earlier report
+    previous = {result['engine']: result for result in baseline['results']}
+    lines = []
+    if baseline.get('config') != report['config']:
+        lines.append('Note: the reports were made with different benchmark settings')
+    for result in report['results']:
+        old = previous.get(result['engine'])
+        if old is None:
+            continue
+        changes = []
+        for key in ('probes_per_second', 'latency_p99_ms', 'lag_p99_ms', 'peak_rss_mb'):
+            if result.get(key) and old.get(key):
+                changes.append(f'{key} {(result[key] - old[key]) / old[key] * 100:+.1f}%')
+        lines.append(f'{result["engine"]}: ' + ', '.join(changes))
+    return lines
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the scan engines against a local fake target server')
+    parser.add_argument('--engines', nargs='+', choices=SCAN_MODES,
+                        help='Engines to run (default: every engine; SYN only with raw socket privileges)')
+    parser.add_argument('--gui', choices=SCAN_MODES, default='Async',
+                        help='Engine for the GUI event-loop lag run (default: Async)')
+    parser.add_argument('--no-gui', action='store_true', help='Skip the GUI run (it needs PyQt6)')
+    parser.add_argument('--ports', type=int, default=5000, help='Ports scanned on the fake target (default: 5000)')
+    parser.add_argument('--open', type=int, default=50, help='Open ports among them (default: 50)')
+    parser.add_argument('--blackholed', type=int, default=10,
+                        help='Ports that drop connection attempts (default: 10)')
+    parser.add_argument('--base-port', type=int, default=20000, help='First port of the range (default: 20000)')
+    parser.add_argument('--latency', type=int, default=0,
+                        help='Delay in ms before open ports answer; with --netns it delays every packet instead')
+    parser.add_argument('--banner', default=DEFAULT_BANNER,
+                        help=f'Banner sent by open ports (default: {DEFAULT_BANNER})')
+    parser.add_argument('--netns', metavar='NAME', nargs='?', const='psbench',
+                        help='Serve the targets from a network namespace behind a veth pair (Linux, root)')
+    parser.add_argument('-t', '--timeout', type=int, default=500, help='Probe timeout in ms (default: 500)')
+    parser.add_argument('--banner-timeout', type=int, default=200, help='Banner read timeout in ms (default: 200)')
+    parser.add_argument('--threads', type=int, default=10, help='Threads for the Threaded engine (default: 10)')
+    parser.add_argument('-c', '--concurrency', type=int, default=1000, help='Probes in flight (default: 1000)')
+    parser.add_argument('--processes', type=int, help='Processes for Multi-process (default: CPU count)')
+    parser.add_argument('--fixed-timeout', action='store_true', help='Disable adaptive timing')
+    parser.add_argument('--host-concurrency', type=int, default=MAX_HOST_CONCURRENCY,
+                        help=f'Cap on probes in flight to the target (default: {MAX_HOST_CONCURRENCY}; 0 for none)')
+    parser.add_argument('--sequential', action='store_true', help='Probe ports in order instead of randomly')
+    parser.add_argument('--label', help='Free-form label stored in the report, e.g. a version or commit')
+    parser.add_argument('-o', '--output', help='Report path (default: benchmark_<time>.json)')
+    parser.add_argument('--compare', metavar='REPORT', help='Print changes against an earlier report')
+    args = parser.parse_args(argv)
+    if args.open + args.blackholed > args.ports:
+        parser.error('--open plus --blackholed must not exceed --ports')
+    return args
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Internal entry points used by the child processes
+    if argv and argv[0] == 'serve':
+        config = json.loads(argv[1])
+        server = FakeTargetServer(config['host'], config['open'], config['blackholed'], config['closed'],
+                                  config['latency'] / 1000.0, config['banner'])
+        asyncio.run(server.serve(lambda: print('ready', flush=True)))
+        return 0
+    if argv and argv[0] in ('engine', 'gui'):
+        options = json.loads(argv[1])
+        result = run_engine(**options) if argv[0] == 'engine' else run_gui(**options)
+        print(json.dumps(result))
+        return 0
+
+    args = parse_args(argv)
+    host = NETNS_TARGET_ADDRESS if args.netns else '127.0.0.1'
+    open_ports, blackholed_ports, closed_ports = port_layout(args.base_port, args.ports, args.open, args.blackholed)
+    config = {'host': host, 'open': open_ports, 'blackholed': blackholed_ports, 'closed': closed_ports,
+              'latency': 0 if args.netns else args.latency, 'banner': args.banner}
+    options = {'timeout': args.timeout, 'banner_timeout': args.banner_timeout, 'threads': args.threads,
+               'concurrency': args.concurrency, 'processes': args.processes, 'adaptive': not args.fixed_timeout,
+               'host_concurrency': args.host_concurrency, 'randomize': not args.sequential}
+    port_range = f'{args.base_port}-{args.base_port + args.ports - 1}'
+    report = {
+        'format': BENCHMARK_FORMAT,
+        'label': args.label,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': {'target': host, 'ports': port_range, 'open': args.open, 'blackholed': args.blackholed,
+                   'latency_ms': args.latency, 'netns': bool(args.netns), 'banner': args.banner, **options},
+        'results': []
+    }
+
+    server = None
+    try:
+        if args.netns:
+            create_netns(args.netns, args.latency)
+        server = start_server(config, args.netns)
+        for mode in args.engines or available_engines():
+            print(f'Running {mode}...', file=sys.stderr)
+            try:
+                result = run_child(['engine', json.dumps(dict(options, mode=mode, host=host,
+                                                              ports=[args.base_port, args.base_port + args.ports]))])
+            except RuntimeError as e:
+                print(f'{mode} failed: {e}', file=sys.stderr)
+                continue
+            # Open ports the engine missed (or invented) matter as much as its speed
+            result['missed_open'] = len(set(open_ports) - set(result['open_ports']))
+            result['unexpected_open'] = len(set(result.pop('open_ports')) - set(open_ports))
+            report['results'].append(result)
+        if not args.no_gui:
+            print(f'Running GUI ({args.gui})...', file=sys.stderr)
+            with tempfile.TemporaryDirectory() as workdir:
+                try:
+                    report['results'].append(run_child(['gui', json.dumps(dict(options, mode=args.gui, host=host,
+                                                                                port_range=port_range))], workdir))
+                except RuntimeError as e:
+                    print(f'GUI run failed: {e}', file=sys.stderr)
+    except (OSError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if args.netns:
+            delete_netns(args.netns)
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    for result in report['results']:
+        if 'probes_per_second' in result:
+            print(f"{result['engine']:<14} {result['probes_per_second']:>10} probes/s  "
+                  f"p50 {result['latency_p50_ms']} ms  p99 {result['latency_p99_ms']} ms  "
+                  f"RSS {result['peak_rss_mb']} MB  missed {result['missed_open']}")
+        else:
+            print(f"{result['engine']:<14} lag p50 {result['lag_p50_ms']} ms  p99 {result['lag_p99_ms']} ms  "
+                  f"max {result['lag_max_ms']} ms  RSS {result['peak_rss_mb']} MB")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+    print(f'Report written to {output}', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
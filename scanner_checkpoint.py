@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import zlib
+import struct
+import threading
+from pathlib import Path
+
+# Checkpoint file layout: one JSON header line, then append-only binary records
+#   C <u64 chunk id>                          a chunk of target indices finished
+#   R <u16 port, u8 ip, u8 service, u8 status, u16 banner lengths> + UTF-8 fields
+#   B <u64 length> + zlib bitmap              completed-chunk bitmap (written on compaction)
+#   F                                         the scan ran to completion
+CHECKPOINT_DIR = 'checkpoints'
+CHECKPOINT_FORMAT = 'port-scanner-checkpoint/1'
+CHUNK_RECORD = struct.Struct('<Q')
+RESULT_RECORD = struct.Struct('<HBBBH')
+BITMAP_RECORD = struct.Struct('<Q')
+
+def bitmap_size(total, chunk_size):
+    chunks = (total + chunk_size - 1) // chunk_size
+    return (chunks + 7) // 8
+
+def encode_result(ip, port, service, status, banner):
+    fields = [value.encode('utf-8') for value in (ip, service, status)]
+    fields = [field[:255] for field in fields]
+    banner = banner.encode('utf-8')[:65535]
+    return (b'R' + RESULT_RECORD.pack(port, len(fields[0]), len(fields[1]), len(fields[2]), len(banner))
+            + b''.join(fields) + banner)
+
+class ScanCheckpoint:
+    def __init__(self, path, params, total, chunk_size, completed=None, results=None, finished=False):
+        self.path = Path(path)
+        self.params = params
+        self.total = total
+        self.chunk_size = chunk_size
+        self.completed = completed if completed is not None else bytearray(bitmap_size(total, chunk_size))
+        self.results = results if results is not None else []
+        self.finished = finished
+        self.found = {(result[0], result[1]) for result in self.results}
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def create(cls, params, total, chunk_size, path=None):
+        if path is None:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            path = os.path.join(CHECKPOINT_DIR, f"scan_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.ckpt")
+        checkpoint = cls(path, params, total, chunk_size)
+        checkpoint.write_compacted()
+        return checkpoint
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            data = f.read()
+        if header.get('format') != CHECKPOINT_FORMAT:
+            raise ValueError(f'{path} is not a scan checkpoint')
+        total, chunk_size = header['total'], header['chunk_size']
+        completed = bytearray(bitmap_size(total, chunk_size))
+        results = []
+        finished = False
+        offset = 0
+        # A crash can leave a half-written record at the end; everything before it is kept
+        while offset < len(data):
+            kind = data[offset:offset + 1]
+            offset += 1
+            if kind == b'C':
+                if offset + CHUNK_RECORD.size > len(data):
+                    break
+                chunk_id, = CHUNK_RECORD.unpack_from(data, offset)
+                offset += CHUNK_RECORD.size
+                completed[chunk_id >> 3] |= 1 << (chunk_id & 7)
+            elif kind == b'R':
+                if offset + RESULT_RECORD.size > len(data):
+                    break
+                port, *lengths = RESULT_RECORD.unpack_from(data, offset)
+                offset += RESULT_RECORD.size
+                if offset + sum(lengths) > len(data):
+                    break
+                fields = []
+                for length in lengths:
+                    fields.append(data[offset:offset + length].decode('utf-8', errors='ignore'))
+                    offset += length
+                ip, service, status, banner = fields
+                results.append((ip, port, service, status, banner))
+            elif kind == b'B':
+                if offset + BITMAP_RECORD.size > len(data):
+                    break
+                length, = BITMAP_RECORD.unpack_from(data, offset)
+                offset += BITMAP_RECORD.size
+                if offset + length > len(data):
+                    break
+                bitmap = zlib.decompress(data[offset:offset + length])
+                offset += length
+                for i, byte in enumerate(bitmap):
+                    completed[i] |= byte
+            elif kind == b'F':
+                finished = True
+            else:
+                break
+        return cls(path, header['params'], total, chunk_size, completed, results, finished)
+
+    def completed_count(self):
+        chunks = sum(bin(byte).count('1') for byte in self.completed)
+        last_chunk = (self.total - 1) // self.chunk_size
+        done = chunks * self.chunk_size
+        if self.total and self.completed[last_chunk >> 3] & (1 << (last_chunk & 7)):
+            done -= (last_chunk + 1) * self.chunk_size - self.total
+        return done
+
+    def write_compacted(self):
+        # Rewrites the file as header + one bitmap snapshot + results, so repeated
+        # resumes don't keep growing it
+        header = {'format': CHECKPOINT_FORMAT, 'params': self.params,
+                  'total': self.total, 'chunk_size': self.chunk_size}
+        bitmap = zlib.compress(bytes(self.completed))
+        temp_path = self.path.with_suffix('.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            f.write(b'B' + BITMAP_RECORD.pack(len(bitmap)) + bitmap)
+            for result in self.results:
+                f.write(encode_result(*result))
+            if self.finished:
+                f.write(b'F')
+        os.replace(temp_path, self.path)
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+
+    def add_result(self, ip, port, service, status, banner):
+        with self._lock:
+            # Chunks that were in flight when the scan stopped get probed again on resume
+            if (ip, port) in self.found:
+                return
+            self.found.add((ip, port))
+            self._buffer.append(encode_result(ip, port, service, status, banner))
+            self.maybe_flush()
+
+    def chunk_done(self, chunk_id):
+        with self._lock:
+            self.completed[chunk_id >> 3] |= 1 << (chunk_id & 7)
+            self._buffer.append(b'C' + CHUNK_RECORD.pack(chunk_id))
+            self.maybe_flush()
+
+    def maybe_flush(self, max_records=256, interval=1.0):
+        if len(self._buffer) >= max_records or time.monotonic() - self._last_flush >= interval:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self._buffer and self._file is not None:
+            self._file.write(b''.join(self._buffer))
+            self._file.flush()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self.flush_locked()
+
+    def close(self, finished=False):
+        with self._lock:
+            self.flush_locked()
+            if self._file is not None:
+                if finished and not self.finished:
+                    self._file.write(b'F')
+                self._file.close()
+                self._file = None
+            self.finished = self.finished or finished
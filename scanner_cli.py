@@ -0,0 +1,317 @@
+import sys
+import socket
+import argparse
+import ipaddress
+import logging
+import time
+from scanner_core import SCAN_PROFILES, SCAN_MODES, CHUNK_SIZE, TLS_CONCURRENCY, TargetSpace, validate_ports, run_scan
+from scanner_discovery import discover_hosts
+from scanner_resolver import parse_targets
+from scanner_source import create_source_binder
+from scanner_checkpoint import ScanCheckpoint
+from scanner_db import RESULT_DB, ScanDatabase
+from scanner_diff import ScanDiff
+from scanner_metrics import METRICS_INTERVAL, ScanMetrics, MetricsReporter
+from scanner_logging import LOG_LEVELS, LOG_LEVEL_VARIABLE, setup_logging
+from scanner_timing import MAX_HOST_CONCURRENCY
+from scanner_order import new_seed
+from scanner_fingerprint import load_fingerprints
+from scanner_export import TextSink, NdjsonSink, CsvSink, XmlSink, BinarySink, open_sink
+
+# json stays line-delimited so results can be consumed while the scan runs
+OUTPUT_FORMATS = {'text': TextSink, 'json': NdjsonSink, 'csv': CsvSink, 'xml': XmlSink, 'binary': BinarySink}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Headless network port scanner')
+    parser.add_argument('target', nargs='?',
+                        help='IPv4/IPv6 addresses, CIDR ranges or hostnames separated by commas, e.g. '
+                             '192.168.1.0/24,2001:db8::1,example.com; @FILE reads targets from FILE')
+    parser.add_argument('-iL', '--targets-file', metavar='FILE',
+                        help='Read targets from FILE, separated by whitespace, commas or newlines; # starts a comment')
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('-4', '--ipv4', dest='family', action='store_const', const=socket.AF_INET,
+                        default=socket.AF_UNSPEC, help='Resolve hostnames to IPv4 addresses only')
+    family.add_argument('-6', '--ipv6', dest='family', action='store_const', const=socket.AF_INET6,
+                        help='Resolve hostnames to IPv6 addresses only')
+    ports = parser.add_mutually_exclusive_group()
+    ports.add_argument('-p', '--ports', help='Port range or list, e.g. 1-1024 or 22,80,443')
+    ports.add_argument('--profile', choices=list(SCAN_PROFILES.keys()), default='Common',
+                       help='Scan profile used when --ports is not given (default: Common)')
+    parser.add_argument('-m', '--mode', choices=SCAN_MODES, default='Async', help='Scan engine (default: Async)')
+    parser.add_argument('-t', '--timeout', type=int, default=1000, help='Connect timeout in ms (default: 1000)')
+    parser.add_argument('--banner-timeout', type=int, default=500, help='Banner read timeout in ms (default: 500)')
+    parser.add_argument('--service-db', metavar='FILE',
+                        help='Identify services with the signatures in this nmap-service-probes file '
+                             '(default: the built-in signatures)')
+    parser.add_argument('--threads', type=int, default=10, help='Worker threads in Threaded mode (default: 10)')
+    parser.add_argument('-c', '--concurrency', type=int, default=1000,
+                        help='Connections in flight in Async mode, per process in Multi-process mode (default: 1000)')
+    parser.add_argument('--processes', type=int, help='Worker processes in Multi-process mode (default: CPU count)')
+    parser.add_argument('--fixed-timeout', action='store_true',
+                        help='Use --timeout for every probe instead of adapting it to each host\'s RTT')
+    parser.add_argument('--host-concurrency', type=int, default=MAX_HOST_CONCURRENCY, metavar='N',
+                        help=f'Most probes in flight to any one host (default: {MAX_HOST_CONCURRENCY}; '
+                             f'0 leaves it to adaptive timing, or unlimited with --fixed-timeout)')
+    parser.add_argument('--max-rate', type=float, default=0, metavar='PPS',
+                        help='Most probes per second for the whole scan (default: unlimited)')
+    parser.add_argument('--host-rate', type=float, default=0, metavar='PPS',
+                        help='Most probes per second to any one host, or subnet with --rate-prefix (default: unlimited)')
+    parser.add_argument('--rate-prefix', type=int, default=32, metavar='BITS',
+                        help='Apply --host-rate per IPv4 subnet of this prefix length, and per IPv6 /64 when below 32 '
+                             '(default: 32, each host on its own)')
+    parser.add_argument('--sequential', action='store_true',
+                        help='Probe host by host and port by port instead of in a random order')
+    parser.add_argument('-e', '--interface', help='Send probes through this network interface')
+    parser.add_argument('-S', '--source-ip', metavar='ADDRESSES',
+                        help='Source address, or comma-separated addresses to spread probes over')
+    parser.add_argument('--source-port', metavar='PORTS',
+                        help='Source port range or list to spread probes over, e.g. 40000-40999')
+    parser.add_argument('--discover', action='store_true',
+                        help='Find live hosts (ICMP where permitted, TCP to a few common ports) before port scanning')
+    checkpoint = parser.add_mutually_exclusive_group()
+    checkpoint.add_argument('--checkpoint', metavar='PATH',
+                            help='Record progress and results to PATH so an interrupted scan can be resumed')
+    checkpoint.add_argument('--resume', metavar='PATH',
+                            help='Resume the scan recorded in checkpoint PATH; scan options are taken from it')
+    parser.add_argument('-f', '--format', choices=list(OUTPUT_FORMATS), default='text',
+                        help='Output format; json is one object per line, binary is fixed-width records (default: text)')
+    parser.add_argument('-o', '--output', help='Write results to this file instead of stdout')
+    parser.add_argument('--db', nargs='?', const=RESULT_DB, metavar='PATH',
+                        help=f'Also record the scan and its results in the SQLite history database (default: {RESULT_DB})')
+    parser.add_argument('--diff', nargs='?', const='latest', metavar='SCAN_ID',
+                        help='Only report ports opened, closed or with a changed banner since a baseline scan in the '
+                             'history database (default: the latest completed scan of the same target and ports); '
+                             'implies --db')
+    parser.add_argument('--known-first', action='store_true',
+                        help='With --diff, re-probe the baseline\'s open ports before the full scan so closed and '
+                             'changed ports are reported first')
+    tls = parser.add_argument_group('TLS inspection')
+    tls.add_argument('--tls', action='store_true',
+                     help='Handshake with open TLS ports and report protocol, cipher, certificate and JA3S')
+    tls.add_argument('--tls-ports', metavar='PORTS',
+                     help='Ports to inspect over TLS; implies --tls (default: 443, 8443, 993, 995 and other '
+                          'common TLS ports)')
+    tls.add_argument('--tls-concurrency', type=int, default=TLS_CONCURRENCY, metavar='N',
+                     help=f'Most TLS handshakes at a time (default: {TLS_CONCURRENCY})')
+    metrics = parser.add_argument_group('telemetry')
+    metrics.add_argument('--metrics-file', metavar='PATH',
+                         help='Keep live scan metrics (rate, RTT histogram, errors, ETA) in PATH as JSON')
+    metrics.add_argument('--metrics-port', type=int, metavar='PORT',
+                         help='Serve live scan metrics on 127.0.0.1:PORT, in Prometheus text format at /metrics '
+                              'and as JSON at /metrics.json')
+    metrics.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL, metavar='SECONDS',
+                         help=f'How often --metrics-file is rewritten (default: {METRICS_INTERVAL:g})')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log scan activity to stderr')
+    parser.add_argument('--log-file', metavar='PATH',
+                        help='Also log to PATH, rotated when it reaches 10 MB (three old files are kept)')
+    parser.add_argument('--log-level', choices=LOG_LEVELS, type=str.upper,
+                        help=f'Level for --log-file (default: ${LOG_LEVEL_VARIABLE} or INFO)')
+    args = parser.parse_args(argv)
+    if args.targets_file:
+        args.target = ','.join(filter(None, [args.target, '@' + args.targets_file]))
+    if args.target is None and args.resume is None:
+        parser.error('a target is required unless --resume is given')
+    if args.diff is not None and (args.checkpoint or args.resume):
+        parser.error('--diff cannot be combined with --checkpoint or --resume')
+    if args.diff is not None and args.diff != 'latest' and not args.diff.isdigit():
+        parser.error('--diff takes a scan id from the history database')
+    if args.known_first and args.diff is None:
+        parser.error('--known-first requires --diff')
+    if args.diff is not None and not args.db:
+        args.db = RESULT_DB
+    if args.host_concurrency < 0:
+        parser.error('--host-concurrency must not be negative')
+    if args.max_rate < 0 or args.host_rate < 0:
+        parser.error('rate limits must not be negative')
+    if not 8 <= args.rate_prefix <= 32:
+        parser.error('--rate-prefix must be between 8 and 32')
+    if args.tls_ports is not None:
+        if not validate_ports(args.tls_ports):
+            parser.error(f'invalid --tls-ports: {args.tls_ports}')
+        args.tls = True
+    if args.tls_concurrency < 1:
+        parser.error('--tls-concurrency must be at least 1')
+    args.seed = None if args.sequential else new_seed()
+    return args
+
+def load_baseline(db, args, port_input):
+    scan_id = db.latest_scan(args.target, port_input) if args.diff == 'latest' else int(args.diff)
+    if scan_id is None:
+        logging.warning("No earlier completed scan of %s ports %s; every open port is new", args.target, port_input)
+        return ScanDiff([])
+    logging.info("Comparing against scan %s", scan_id)
+    return ScanDiff(db.scan_results(scan_id))
+
+def checkpoint_params(args, port_input, networks, hosts=None):
+    # Resolved networks are stored so a resumed scan covers the same addresses
+    return {'ip_range': args.target, 'networks': [str(network) for network in networks], 'ports': port_input,
+            'mode': args.mode, 'timeout': args.timeout, 'banner_timeout': args.banner_timeout, 'threads': args.threads,
+            'concurrency': args.concurrency, 'processes': args.processes, 'adaptive': not args.fixed_timeout,
+            'interface': args.interface, 'source_addresses': args.source_ip, 'source_ports': args.source_port,
+            'host_concurrency': args.host_concurrency, 'seed': args.seed, 'max_rate': args.max_rate,
+            'host_rate': args.host_rate, 'rate_prefix': args.rate_prefix, 'tls': args.tls, 'tls_ports': args.tls_ports,
+            'tls_concurrency': args.tls_concurrency, 'hosts': hosts}
+
+def apply_checkpoint_params(args, params):
+    args.target = params['ip_range']
+    args.ports = params['ports']
+    args.mode = params['mode']
+    args.timeout = params['timeout']
+    args.banner_timeout = params['banner_timeout']
+    args.threads = params['threads']
+    args.concurrency = params['concurrency']
+    args.processes = params['processes']
+    args.fixed_timeout = not params['adaptive']
+    args.interface = params['interface']
+    args.source_ip = params.get('source_addresses')
+    args.source_port = params.get('source_ports')
+    args.host_concurrency = params.get('host_concurrency', MAX_HOST_CONCURRENCY)
+    args.max_rate = params.get('max_rate', 0)
+    args.host_rate = params.get('host_rate', 0)
+    args.rate_prefix = params.get('rate_prefix', 32)
+    args.tls = params.get('tls', False)
+    args.tls_ports = params.get('tls_ports')
+    args.tls_concurrency = params.get('tls_concurrency', TLS_CONCURRENCY)
+    # The scan must continue in its original order; older checkpoints have none and were sequential
+    args.seed = params.get('seed')
+
+def report_errors(metrics):
+    # Worker errors are logged once each as they happen and summarised here
+    snapshot = metrics.snapshot()
+    if snapshot['errors']:
+        print(f"{snapshot['errors']} probe errors:", file=sys.stderr)
+        for message, count in snapshot['error_messages'].items():
+            print(f'  {count} x {message}', file=sys.stderr)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level, args.log_file, sys.stderr, logging.INFO if args.verbose else logging.WARNING)
+
+    checkpoint = None
+    if args.resume:
+        try:
+            checkpoint = ScanCheckpoint.load(args.resume)
+        except (OSError, ValueError) as e:
+            print(f'Cannot resume from {args.resume}: {e}', file=sys.stderr)
+            return 2
+        if checkpoint.finished:
+            print(f'The scan in {args.resume} already finished', file=sys.stderr)
+            return 2
+        apply_checkpoint_params(args, checkpoint.params)
+        checkpoint.write_compacted()
+
+    if checkpoint is not None and checkpoint.params.get('networks'):
+        networks = [ipaddress.ip_network(network) for network in checkpoint.params['networks']]
+    else:
+        try:
+            networks, unresolved = parse_targets(args.target, args.family)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        except OSError as e:
+            print(f'Cannot read targets: {e}', file=sys.stderr)
+            return 2
+        if unresolved:
+            print(f'Cannot resolve: {", ".join(unresolved)}', file=sys.stderr)
+        if not networks:
+            print(f'No targets to scan in {args.target}', file=sys.stderr)
+            return 2
+    port_input = args.ports or SCAN_PROFILES[args.profile]
+    ports = validate_ports(port_input)
+    if not ports:
+        print(f'Invalid port range: {port_input}', file=sys.stderr)
+        return 2
+    try:
+        source = create_source_binder(args.interface, args.source_ip, args.source_port)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        # Loaded up front so a bad path fails before the scan; run_scan reuses it
+        load_fingerprints(args.service_db)
+    except OSError as e:
+        print(f'Cannot read service signatures: {e}', file=sys.stderr)
+        return 2
+
+    hosts = checkpoint.params.get('hosts') if checkpoint is not None else None
+    if args.checkpoint:
+        if args.discover:
+            # Discovery runs up front so the checkpoint pins the exact target space
+            hosts = discover_hosts(networks, args.timeout, concurrency=args.concurrency)
+        total = len(TargetSpace(networks, ports, hosts))
+        checkpoint = ScanCheckpoint.create(checkpoint_params(args, port_input, networks, hosts), total,
+                                           CHUNK_SIZE, args.checkpoint)
+
+    output = open_sink(OUTPUT_FORMATS[args.format], args.output)
+    if checkpoint is not None:
+        output.write_all(checkpoint.results)
+    db = scan_id = diff = None
+    if args.db:
+        db = ScanDatabase(args.db)
+        if args.diff is not None:
+            diff = load_baseline(db, args, port_input)
+        scan_id = db.begin_scan(args.target, port_input, args.mode,
+                                str(checkpoint.path) if checkpoint is not None else None)
+        if checkpoint is not None:
+            db.add_results(scan_id, checkpoint.results)
+
+        def record_result(ip, port, service, status, banner):
+            if diff is None:
+                output.write(ip, port, service, status, banner)
+            else:
+                # The database keeps the full result set so this scan can be the next baseline
+                first, change = diff.observe(ip, port, service, status, banner)
+                if not first:
+                    return
+                if change is not None:
+                    output.write(*change)
+            db.add_result(scan_id, ip, port, service, status, banner)
+
+    # With --db every result is also recorded, and --diff reports only changes
+    on_result = output.write if db is None else record_result
+
+    metrics = ScanMetrics()
+    reporter = MetricsReporter(metrics, args.metrics_file, args.metrics_port, interval=args.metrics_interval)
+    try:
+        reporter.start()
+    except OSError as e:
+        print(f'Cannot serve metrics on port {args.metrics_port}: {e}', file=sys.stderr)
+        output.close()
+        if db is not None:
+            db.finish_scan(scan_id, 'stopped')
+            db.close()
+        return 2
+
+    started = time.monotonic()
+    status = 'stopped'
+    try:
+        scan_options = dict(interface=source, on_result=on_result, processes=args.processes,
+                            adaptive=not args.fixed_timeout, metrics=metrics, randomize=False, seed=args.seed,
+                            host_concurrency=args.host_concurrency, max_rate=args.max_rate,
+                            host_rate=args.host_rate, rate_prefix=args.rate_prefix,
+                            service_db=args.service_db, tls=args.tls, tls_concurrency=args.tls_concurrency,
+                            tls_ports=validate_ports(args.tls_ports) if args.tls_ports else None)
+        if args.known_first and len(diff):
+            run_scan(networks, ports, args.mode, args.timeout, args.threads, args.concurrency,
+                     args.banner_timeout, pairs=diff.known_targets(), **scan_options)
+        store = run_scan(networks, ports, args.mode, args.timeout, args.threads, args.concurrency,
+                         args.banner_timeout, discovery=args.discover and checkpoint is None,
+                         hosts=hosts, checkpoint=checkpoint, **scan_options)
+        if diff is not None:
+            # Only once the full scan is over: a known port the first pass missed may still turn up
+            output.write_all(diff.closed())
+        status = 'completed'
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        reporter.stop()
+        output.close()
+        if db is not None:
+            db.finish_scan(scan_id, status)
+            db.close()
+        report_errors(metrics)
+    logging.info("Scan of %s finished in %.2fs, %d open ports", args.target, time.monotonic() - started, len(store))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
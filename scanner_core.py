@@ -0,0 +1,776 @@
+import socket
+import threading
+import ipaddress
+import time
+import errno
+import logging
+import asyncio
+from array import array
+from bisect import bisect_right
+from scanner_timing import MAX_HOST_CONCURRENCY, TIMEOUT_ERRNOS, create_timing, record_probe
+from scanner_discovery import discover_hosts
+from scanner_source import source_binder
+from scanner_order import ScanOrder, new_seed
+from concurrent.futures import wait as wait_futures
+from scanner_ratelimit import RESCHEDULE_INTERVAL, create_rate_limiter
+from scanner_fingerprint import load_fingerprints
+
+# resource is POSIX-only; used to keep async scans under the open file limit
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# Common ports and their services
+COMMON_PORTS = {
+    20: 'FTP-DATA', 21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP', 53: 'DNS',
+    80: 'HTTP', 110: 'POP3', 143: 'IMAP', 443: 'HTTPS', 445: 'SMB', 3389: 'RDP',
+    3306: 'MySQL', 5432: 'PostgreSQL', 8080: 'HTTP-ALT', 8443: 'HTTPS-ALT'
+}
+
+# Scan profiles
+SCAN_PROFILES = {
+    'Common': '21,22,23,25,80,110,143,443,445,3389',
+    'Web': '80,443,8080,8443',
+    'Database': '3306,5432',
+    'Full': '1-65535',
+    'Quick': '21,22,80,443'
+}
+
+# Banner probes per port: None means the service speaks first (wait for its
+# greeting), bytes are sent straight away. Ports not listed wait for a
+# greeting and fall back to HTTP_PROBE if the service stays silent.
+HTTP_PROBE = b'HEAD / HTTP/1.0\r\n\r\n'
+BANNER_PROBES = {
+    21: None, 22: None, 23: None, 25: None, 110: None, 143: None, 3306: None,
+    80: HTTP_PROBE, 443: HTTP_PROBE, 8080: HTTP_PROBE, 8443: HTTP_PROBE
+}
+
+def read_banner(sock, port, timeout):
+    # The raw reply, b'' if there was none; sock may also be an SSLSocket
+    probe = BANNER_PROBES.get(port, HTTP_PROBE)
+    try:
+        sock.settimeout(timeout)
+        if port in BANNER_PROBES and probe is not None:
+            sock.sendall(probe)
+            return sock.recv(1024)
+        try:
+            return sock.recv(1024)
+        except socket.timeout:
+            if probe is None:
+                return b''
+        sock.sendall(probe)
+        return sock.recv(1024)
+    except OSError:
+        return b''
+
+def format_banner(data):
+    banner = data.decode('utf-8', errors='ignore').strip()
+    return banner[:100] if banner else 'No banner'
+
+# Scan engines selectable in the settings dialog
+SCAN_MODES = ['Threaded', 'Async', 'Multi-process', 'SYN', 'UDP']
+# Default TLS handshakes at a time; kept here so the CLI can show it without loading scanner_tls
+TLS_CONCURRENCY = 32
+
+class TargetSpace:
+    # Every (ip, port) pair is addressed by a single integer index:
+    # index = ip_offset * len(ports) + port_offset
+    # networks may be one network or a list mixing IPv4 and IPv6; their
+    # addresses are numbered one network after another.
+    # With hosts given (e.g. from host discovery) those IPv4 addresses replace
+    # the IPv4 networks; IPv6 networks are always scanned in full.
+    # With a seed, indices are scan positions that a ScanOrder permutes so
+    # probes are spread over hosts; the same seed gives the same order on resume
+    def __init__(self, networks, ports, hosts=None, seed=None):
+        if not isinstance(networks, (list, tuple)):
+            networks = [networks]
+        self.ports = ports if isinstance(ports, range) else array('H', ports)
+        self.segments = []
+        self.offsets = []
+        self.ip_count = 0
+        self.hosts = None
+        if hosts is not None:
+            self.hosts = array('I', hosts)
+            self.add_segment(None, ipaddress.IPv4Address, len(self.hosts))
+            networks = [network for network in networks if network.version != 4]
+        for network in networks:
+            self.add_segment(int(network.network_address), type(network.network_address), network.num_addresses)
+        self.seed = seed
+        self.order = ScanOrder(self.ip_count, len(self.ports), seed) if seed is not None else None
+
+    def add_segment(self, start, ip_class, count):
+        # start is None for the explicit hosts list
+        self.segments.append((start, ip_class))
+        self.offsets.append(self.ip_count)
+        self.ip_count += count
+
+    def __len__(self):
+        return self.ip_count * len(self.ports)
+
+    def decode(self, index):
+        if self.order is not None:
+            index = self.order[index]
+        ip_offset, port_offset = divmod(index, len(self.ports))
+        segment = bisect_right(self.offsets, ip_offset) - 1
+        start, ip_class = self.segments[segment]
+        ip_offset -= self.offsets[segment]
+        ip = self.hosts[ip_offset] if start is None else start + ip_offset
+        return str(ip_class(ip)), self.ports[port_offset]
+
+    def chunks(self, chunk_size, start=0, stop=None):
+        # Chunk boundaries are aligned to multiples of chunk_size, so chunk ids
+        # (index // chunk_size) mean the same thing in every shard
+        stop = len(self) if stop is None else stop
+        chunk_start = start
+        while chunk_start < stop:
+            chunk_stop = min((chunk_start // chunk_size + 1) * chunk_size, stop)
+            yield range(chunk_start, chunk_stop)
+            chunk_start = chunk_stop
+
+class TargetList:
+    # An explicit list of (ip, port) pairs, e.g. the known-open ports of a baseline scan
+    def __init__(self, pairs):
+        self.pairs = list(pairs)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def decode(self, index):
+        return self.pairs[index]
+
+    chunks = TargetSpace.chunks
+
+# Target indices handed out (and checkpointed) per chunk
+CHUNK_SIZE = 256
+
+class TargetFeeder:
+    # completed is an optional bitmap of chunk ids to skip (from a checkpoint);
+    # set on_chunk_done to be told when every index of a chunk has been probed
+    def __init__(self, targets, chunk_size=CHUNK_SIZE, start=0, stop=None, completed=None):
+        self.targets = targets
+        self.chunk_size = chunk_size
+        self.completed = completed
+        self.on_chunk_done = None
+        stop = len(targets) if stop is None else stop
+        self.total = stop - start
+        if completed is not None and stop > start:
+            self.total -= self.completed_between(start, stop)
+        self._chunks = targets.chunks(chunk_size, start, stop)
+        self._remaining = {}
+        self._lock = threading.Lock()
+
+    def completed_between(self, start, stop):
+        # Number of indices in [start, stop) that belong to completed chunks
+        first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+        bits = int.from_bytes(self.completed[first >> 3:(last >> 3) + 1], 'little') >> (first & 7)
+        count = bin(bits & ((1 << (last - first + 1)) - 1)).count('1') * self.chunk_size
+        if self.is_completed(first):
+            count -= start - first * self.chunk_size
+        if self.is_completed(last):
+            count -= (last + 1) * self.chunk_size - stop
+        return count
+
+    def is_completed(self, chunk_id):
+        return self.completed is not None and self.completed[chunk_id >> 3] & (1 << (chunk_id & 7))
+
+    def next_chunk(self):
+        with self._lock:
+            for chunk in self._chunks:
+                chunk_id = chunk.start // self.chunk_size
+                if self.is_completed(chunk_id):
+                    continue
+                if self.on_chunk_done is not None:
+                    self._remaining[chunk_id] = len(chunk)
+                return chunk
+            return None
+
+    def complete(self, index):
+        if self.on_chunk_done is None:
+            return
+        chunk_id = index // self.chunk_size
+        with self._lock:
+            self._remaining[chunk_id] -= 1
+            if self._remaining[chunk_id]:
+                return
+            del self._remaining[chunk_id]
+        self.chunk_done(chunk_id)
+
+    def chunk_done(self, chunk_id):
+        if self.completed is not None:
+            self.completed[chunk_id >> 3] |= 1 << (chunk_id & 7)
+        if self.on_chunk_done is not None:
+            self.on_chunk_done(chunk_id)
+
+    def decode(self, index):
+        return self.targets.decode(index)
+
+    def __iter__(self):
+        while True:
+            chunk = self.next_chunk()
+            if chunk is None:
+                return
+            yield from chunk
+
+class ResultStore:
+    # Columnar result storage: packed IPv4 addresses and ports, interned
+    # service/status names, and all banners in one UTF-8 buffer. IPv6
+    # addresses are rare enough to keep in a dict keyed by row
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ips = array('I')
+        self.ipv6 = {}
+        self.ports = array('H')
+        self.services = array('I')
+        self.statuses = array('B')
+        self.banner_data = bytearray()
+        self.banner_offsets = array('Q', [0])
+        self.service_names = []
+        self.status_names = []
+        self._service_ids = {}
+        self._status_ids = {}
+
+    def __len__(self):
+        return len(self.ports)
+
+    @staticmethod
+    def _intern(value, names, ids):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(names)
+            names.append(value)
+        return index
+
+    def append(self, ip, port, service, status, banner):
+        if ':' in ip:
+            self.ipv6[len(self.ips)] = int(ipaddress.IPv6Address(ip))
+            self.ips.append(0)
+        else:
+            self.ips.append(int.from_bytes(socket.inet_aton(ip), 'big'))
+        self.ports.append(port)
+        self.services.append(self._intern(service, self.service_names, self._service_ids))
+        self.statuses.append(self._intern(status, self.status_names, self._status_ids))
+        self.banner_data += banner.encode('utf-8')
+        self.banner_offsets.append(len(self.banner_data))
+
+    def extend(self, results):
+        for result in results:
+            self.append(*result)
+
+    def ip(self, row):
+        if row in self.ipv6:
+            return str(ipaddress.IPv6Address(self.ipv6[row]))
+        return socket.inet_ntoa(self.ips[row].to_bytes(4, 'big'))
+
+    def ip_key(self, row):
+        # Sorts IPv4 addresses before IPv6 ones, each numerically
+        if row in self.ipv6:
+            return 6, self.ipv6[row]
+        return 4, self.ips[row]
+
+    def service(self, row):
+        return self.service_names[self.services[row]]
+
+    def status(self, row):
+        return self.status_names[self.statuses[row]]
+
+    def banner(self, row):
+        return self.banner_data[self.banner_offsets[row]:self.banner_offsets[row + 1]].decode('utf-8')
+
+    def row(self, row):
+        return self.ip(row), self.ports[row], self.service(row), self.status(row), self.banner(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.row(row)
+
+def validate_ip(ip_input):
+    try:
+        if '/' in ip_input:
+            return ipaddress.ip_network(ip_input, strict=False)
+        else:
+            return ipaddress.ip_network(ipaddress.ip_address(ip_input))
+    except ValueError:
+        return None
+
+def address_family(ip):
+    return socket.AF_INET6 if ':' in ip else socket.AF_INET
+
+def validate_ports(port_input):
+    try:
+        if '-' in port_input:
+            start, end = map(int, port_input.split('-'))
+            if 1 <= start <= end <= 65535:
+                return range(start, end + 1)
+        else:
+            ports = [int(p) for p in port_input.split(',')]
+            if all(1 <= p <= 65535 for p in ports):
+                return ports
+        return None
+    except ValueError:
+        return None
+
+class ScanWorker:
+    def __init__(self, targets, timeout, interface=None, banner_timeout=None, timing=None):
+        self.targets = targets
+        self.timeout = timeout / 1000.0
+        self.banner_timeout = self.timeout if banner_timeout is None else banner_timeout / 1000.0
+        self.timing = timing
+        self.is_running = True
+        self.is_paused = False
+        # Workers block on these instead of polling; stop() also aborts in-flight sockets
+        self.stopped = threading.Event()
+        self.unpaused = threading.Event()
+        self.unpaused.set()
+        self.sockets = set()
+        self._sockets_lock = threading.Lock()
+        self.interface = interface
+        self.source = source_binder(interface)
+        # A ScanMetrics (scanner_metrics), a RateLimiter (scanner_ratelimit),
+        # ServiceFingerprints (scanner_fingerprint) and a TlsInspector
+        # (scanner_tls) shared by the scan's workers, set by whoever runs the
+        # scan, or None
+        self.metrics = None
+        self.limiter = None
+        self.fingerprints = None
+        self.tls = None
+        self.on_result = lambda ip, port, service, status, banner: None
+        self.on_progress = lambda count: None
+        self.on_error = lambda message: None
+
+    def get_service_banner(self, sock, port):
+        return read_banner(sock, port, self.banner_timeout)
+
+    def identify(self, port, data):
+        # The service a matching signature names in the banner, else the usual one for the port
+        match = self.fingerprints.match(port, data) if self.fingerprints is not None else None
+        return match.describe() if match is not None else COMMON_PORTS.get(port, 'Unknown')
+
+    def tls_result(self, port, inspection):
+        # Service and banner of a port inspected by self.tls: the banner sums up
+        # the handshake and the service comes from the reply read over TLS
+        match = self.fingerprints.match(port, inspection.data) if self.fingerprints is not None else None
+        service = COMMON_PORTS.get(port, 'Unknown') if match is None else f'SSL/{match.describe()}'
+        return service, inspection.summary()
+
+    def tls_inspection(self, ip, port):
+        # Waits for self.tls to inspect the port, in slices so stop() isn't held
+        # up by a slow handshake; None if the scan stopped meanwhile
+        future = self.tls.submit(ip, port)
+        while not self.stopped.is_set():
+            if wait_futures((future,), RESCHEDULE_INTERVAL).done:
+                return None if future.cancelled() else future.result()
+        return None
+
+    def probe_timeout(self, ip):
+        return self.timeout if self.timing is None else self.timing.host(ip).timeout()
+
+    def retry_probe(self, result, timeout):
+        # A port that timed out under an adaptive RTO shorter than the configured
+        # timeout may just be slow; it gets one more try before it counts as Closed
+        return result in TIMEOUT_ERRNOS and timeout < self.timeout and not self.stopped.is_set()
+
+    def connect(self, sock, ip, port, timeout):
+        if self.timing is None:
+            sock.settimeout(timeout)
+            return self.timed_connect(sock, ip, port)[0]
+        host = self.timing.host(ip)
+        host.acquire()
+        try:
+            if self.stopped.is_set():
+                return errno.ECANCELED
+            sock.settimeout(timeout)
+            result, rtt = self.timed_connect(sock, ip, port)
+            record_probe(host, result, rtt)
+            return result
+        finally:
+            host.release()
+
+    def timed_connect(self, sock, ip, port):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.probe_started()
+        started = time.monotonic()
+        result = sock.connect_ex((ip, port))
+        rtt = time.monotonic() - started
+        if metrics is not None:
+            metrics.probe_finished(None if self.stopped.is_set() else result, rtt)
+        return result, rtt
+
+    def throttle(self, ip):
+        # Waits for the rate limiter's go-ahead for a probe to ip; False if the scan stopped meanwhile
+        limiter = self.limiter
+        while limiter is not None:
+            epoch = limiter.epoch
+            start = limiter.reserve(ip)
+            while limiter.epoch == epoch:
+                delay = start - time.monotonic()
+                if delay <= 0:
+                    return True
+                if self.stopped.wait(min(delay, RESCHEDULE_INTERVAL)):
+                    return False
+        return True
+
+    def open_socket(self, ip):
+        if self.source is None:
+            sock = socket.socket(address_family(ip), socket.SOCK_STREAM)
+        else:
+            sock = self.source.socket(address_family(ip), socket.SOCK_STREAM)
+        with self._sockets_lock:
+            self.sockets.add(sock)
+        return sock
+
+    def close_socket(self, sock):
+        with self._sockets_lock:
+            self.sockets.discard(sock)
+        sock.close()
+
+    def abort_sockets(self):
+        # shutdown() wakes a thread blocked in connect or recv on the socket right away
+        with self._sockets_lock:
+            for sock in self.sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def run(self):
+        for index in self.targets:
+            self.unpaused.wait()
+            if self.stopped.is_set():
+                break
+            try:
+                ip, port = self.targets.decode(index)
+                if not self.throttle(ip):
+                    break
+                sock = self.open_socket(ip)
+                try:
+                    timeout = self.probe_timeout(ip)
+                    result = self.connect(sock, ip, port, timeout)
+                    if self.retry_probe(result, timeout):
+                        # A timed out connect can't be restarted, so the retry gets a fresh socket
+                        self.close_socket(sock)
+                        sock = self.open_socket(ip)
+                        result = self.connect(sock, ip, port, self.timeout)
+                    status = 'Open' if result == 0 else 'Closed'
+                    # TLS ports get their banner from the TLS handshake instead
+                    tls = status == 'Open' and self.tls is not None and port in self.tls.ports
+                    data = self.get_service_banner(sock, port) if status == 'Open' and not tls else b''
+                finally:
+                    self.close_socket(sock)
+                if self.stopped.is_set():
+                    # The probe was aborted, so its verdict means nothing
+                    break
+                if tls:
+                    inspection = self.tls_inspection(ip, port)
+                    if inspection is None:
+                        break
+                    service, banner = self.tls_result(port, inspection)
+                    self.on_result(ip, port, service, status, banner)
+                elif status == 'Open':
+                    self.on_result(ip, port, self.identify(port, data), status, format_banner(data))
+                self.targets.complete(index)
+                self.on_progress(1)
+            except Exception as e:
+                self.on_error(str(e))
+        self.is_running = False
+
+    def pause(self):
+        self.is_paused = True
+        self.unpaused.clear()
+
+    def resume(self):
+        self.is_paused = False
+        self.unpaused.set()
+
+    def stop(self):
+        self.is_running = False
+        self.stopped.set()
+        self.unpaused.set()
+        self.abort_sockets()
+
+class AsyncScanWorker(ScanWorker):
+    def __init__(self, targets, timeout, interface=None, concurrency=1000, banner_timeout=None, timing=None):
+        super().__init__(targets, timeout, interface, banner_timeout, timing)
+        self.concurrency = self.limit_concurrency(concurrency)
+        self.loop = None
+        self.resumed = None
+        self.tasks = []
+
+    @staticmethod
+    def limit_concurrency(concurrency):
+        # Leave headroom below RLIMIT_NOFILE for the GUI and log file
+        if RESOURCE_AVAILABLE:
+            soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft != resource.RLIM_INFINITY:
+                concurrency = min(concurrency, max(1, soft - 64))
+        return max(1, concurrency)
+
+    async def get_service_banner(self, reader, writer, port):
+        probe = BANNER_PROBES.get(port, HTTP_PROBE)
+        try:
+            if port in BANNER_PROBES and probe is not None:
+                writer.write(probe)
+                await writer.drain()
+                return await asyncio.wait_for(reader.read(1024), self.banner_timeout)
+            try:
+                return await asyncio.wait_for(reader.read(1024), self.banner_timeout)
+            except asyncio.TimeoutError:
+                if probe is None:
+                    return b''
+            writer.write(probe)
+            await writer.drain()
+            return await asyncio.wait_for(reader.read(1024), self.banner_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return b''
+
+    async def open_bound_connection(self, ip, port):
+        sock = self.source.socket(address_family(ip), socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (ip, port))
+        except BaseException:
+            sock.close()
+            raise
+        return await asyncio.open_connection(sock=sock)
+
+    async def open_connection(self, ip, port, timeout):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.probe_started()
+        started = time.monotonic()
+        # Stays None if the probe is cancelled by stop()
+        result = None
+        try:
+            if self.source is not None:
+                connection = await asyncio.wait_for(self.open_bound_connection(ip, port), timeout)
+            else:
+                connection = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+            result = 0
+            return connection, 0
+        except asyncio.TimeoutError:
+            result = errno.ETIMEDOUT
+            return None, result
+        except OSError as e:
+            result = e.errno
+            return None, result
+        finally:
+            if metrics is not None:
+                metrics.probe_finished(result, time.monotonic() - started)
+
+    async def throttle_async(self, ip):
+        limiter = self.limiter
+        while limiter is not None:
+            epoch = limiter.epoch
+            start = limiter.reserve(ip)
+            while limiter.epoch == epoch:
+                delay = start - time.monotonic()
+                if delay <= 0:
+                    return
+                await asyncio.sleep(min(delay, RESCHEDULE_INTERVAL))
+
+    async def probe(self, ip, port):
+        if self.timing is None:
+            connection, _ = await self.open_connection(ip, port, self.timeout)
+            return connection
+        host = self.timing.host(ip)
+        await host.acquire_async()
+        try:
+            timeout = host.timeout()
+            started = time.monotonic()
+            connection, result = await self.open_connection(ip, port, timeout)
+            record_probe(host, result, time.monotonic() - started)
+            if self.retry_probe(result, timeout):
+                started = time.monotonic()
+                connection, result = await self.open_connection(ip, port, self.timeout)
+                record_probe(host, result, time.monotonic() - started)
+            return connection
+        finally:
+            host.release()
+
+    async def worker(self, pending):
+        # All workers share one index iterator; they run on a single event loop thread
+        for index in pending:
+            await self.resumed.wait()
+            if self.stopped.is_set():
+                return
+            try:
+                ip, port = self.targets.decode(index)
+                await self.throttle_async(ip)
+                connection = await self.probe(ip, port)
+                if connection is not None:
+                    reader, writer = connection
+                    if self.tls is not None and port in self.tls.ports:
+                        writer.close()
+                        inspection = await asyncio.wrap_future(self.tls.submit(ip, port))
+                        service, banner = self.tls_result(port, inspection)
+                    else:
+                        try:
+                            data = await self.get_service_banner(reader, writer, port)
+                        finally:
+                            writer.close()
+                        service, banner = self.identify(port, data), format_banner(data)
+                    self.on_result(ip, port, service, 'Open', banner)
+                self.targets.complete(index)
+                self.on_progress(1)
+            except Exception as e:
+                self.on_error(str(e))
+
+    async def scan(self):
+        # Callbacks queued by pause/resume/stop run once this coroutine yields
+        self.loop = asyncio.get_running_loop()
+        self.resumed = asyncio.Event()
+        if not self.is_paused:
+            self.resumed.set()
+        pending = iter(self.targets)
+        self.tasks = [asyncio.create_task(self.worker(pending)) for _ in range(self.concurrency)]
+        if self.stopped.is_set():
+            self.cancel_tasks()
+        # Cancelled workers abandon their in-flight probe without reporting it
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.loop = None
+
+    def call_in_loop(self, callback):
+        # pause/resume/stop arrive from other threads; asyncio objects are only touched on the loop
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                pass
+
+    def cancel_tasks(self):
+        for task in self.tasks:
+            task.cancel()
+
+    def pause(self):
+        super().pause()
+        self.call_in_loop(lambda: self.resumed.clear())
+
+    def resume(self):
+        super().resume()
+        self.call_in_loop(lambda: self.resumed.set())
+
+    def stop(self):
+        super().stop()
+        self.call_in_loop(self.cancel_tasks)
+
+    def run(self):
+        try:
+            asyncio.run(self.scan())
+        except Exception as e:
+            self.on_error(str(e))
+        self.is_running = False
+
+def create_worker(targets, mode='Async', timeout=1000, interface=None, concurrency=1000, banner_timeout=None,
+                  processes=None, timing=None):
+    if mode == 'Multi-process':
+        # Imported lazily so single-process scans don't load multiprocessing
+        from scanner_parallel import ParallelScanWorker
+        return ParallelScanWorker(targets, timeout, interface, concurrency, banner_timeout, processes,
+                                  adaptive=timing is not None and timing.adaptive,
+                                  host_concurrency=timing.max_window if timing is not None else 0)
+    if mode == 'UDP':
+        from scanner_udp import UdpScanWorker
+        return UdpScanWorker(targets, timeout, interface, concurrency, timing)
+    if mode == 'SYN':
+        from scanner_syn import SynScanWorker
+        return SynScanWorker(targets, timeout, interface, timing)
+    if mode == 'Async':
+        return AsyncScanWorker(targets, timeout, interface, concurrency, banner_timeout, timing)
+    return ScanWorker(targets, timeout, interface, banner_timeout, timing)
+
+def chain_callbacks(*callbacks):
+    callbacks = [callback for callback in callbacks if callback]
+
+    def call(*args):
+        for callback in callbacks:
+            callback(*args)
+    return call
+
+def run_scan(networks, ports, mode='Async', timeout=1000, threads=10, concurrency=1000,
+             banner_timeout=None, interface=None, on_result=None, on_progress=None, on_error=None,
+             processes=None, adaptive=True, discovery=False, hosts=None, checkpoint=None, pairs=None,
+             metrics=None, randomize=True, seed=None, host_concurrency=MAX_HOST_CONCURRENCY,
+             max_rate=0, host_rate=0, rate_prefix=32, service_db=None, tls=False, tls_ports=None,
+             tls_concurrency=None):
+    # networks is one network or a list of them (see parse_targets in scanner_resolver);
+    # with pairs given, exactly those (ip, port) pairs are probed instead of networks x ports.
+    # metrics (a ScanMetrics) collects live telemetry and aggregates worker errors.
+    # Probes go out in a random order unless randomize is off; pass the seed of an
+    # interrupted scan to resume it in the same order. host_concurrency caps the
+    # probes in flight to any one host (0: only the adaptive window, if enabled).
+    # max_rate and host_rate limit probes per second overall and per host, or
+    # per subnet with a rate_prefix below 32 (0: unlimited). Services are
+    # identified from banners with the built-in signatures or those in the
+    # nmap-service-probes file service_db. With tls on, open TLS ports (tls_ports,
+    # default scanner_tls.TLS_PORTS) are inspected over TLS on a pool of their own
+    if pairs is not None:
+        space = TargetList(pairs)
+    else:
+        if hosts is None and discovery:
+            hosts = discover_hosts(networks, timeout, concurrency=concurrency)
+        if seed is None and randomize:
+            seed = new_seed()
+        space = TargetSpace(networks, ports, hosts, seed)
+    if checkpoint is not None:
+        targets = TargetFeeder(space, checkpoint.chunk_size, completed=checkpoint.completed)
+        targets.on_chunk_done = checkpoint.chunk_done
+        checkpoint.open()
+    else:
+        targets = TargetFeeder(space)
+    timing = create_timing(timeout, adaptive, host_concurrency)
+    limiter = create_rate_limiter(max_rate, host_rate, rate_prefix)
+    fingerprints = load_fingerprints(service_db)
+    inspector = None
+    if tls:
+        # Imported lazily, like the optional engines
+        from scanner_tls import TlsInspector
+        inspector = TlsInspector(timeout, banner_timeout, tls_concurrency, tls_ports, interface)
+    if metrics is not None:
+        # Added rather than set: the CLI runs a --known-first pass before the full scan
+        metrics.total += targets.total
+        on_progress = chain_callbacks(metrics.add_progress, on_progress)
+        on_error = chain_callbacks(metrics.add_error, on_error) if on_error else metrics.add_error
+    store = ResultStore()
+    lock = threading.Lock()
+
+    def add_result(ip, port, service, status, banner):
+        with lock:
+            store.append(ip, port, service, status, banner)
+            if checkpoint is not None:
+                checkpoint.add_result(ip, port, service, status, banner)
+            if on_result:
+                on_result(ip, port, service, status, banner)
+
+    workers = [create_worker(targets, mode, timeout, interface, concurrency, banner_timeout, processes, timing)
+               for _ in range(threads if mode == 'Threaded' else 1)]
+    for worker in workers:
+        worker.metrics = metrics
+        worker.limiter = limiter
+        worker.fingerprints = fingerprints
+        worker.tls = inspector
+        worker.on_result = add_result
+        if on_progress:
+            worker.on_progress = on_progress
+        worker.on_error = on_error or (lambda message: logging.error("Error: %s", message))
+    scan_threads = [threading.Thread(target=worker.run, daemon=True) for worker in workers[1:]]
+    for thread in scan_threads:
+        thread.start()
+    try:
+        workers[0].run()
+        for thread in scan_threads:
+            thread.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+        raise
+    finally:
+        if inspector is not None:
+            inspector.close()
+        if checkpoint is not None:
+            checkpoint.close(finished=checkpoint.completed_count() == checkpoint.total)
+    return store
@@ -0,0 +1,157 @@
+import time
+import sqlite3
+import threading
+
+RESULT_DB = 'scan_results.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    ip_range TEXT NOT NULL,
+    ports TEXT NOT NULL,
+    mode TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    checkpoint TEXT,
+    open_ports INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    service TEXT NOT NULL,
+    status TEXT NOT NULL,
+    banner TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_ip_port_scan ON results (ip, port, scan_id);
+CREATE INDEX IF NOT EXISTS results_port_scan ON results (port, scan_id);
+CREATE INDEX IF NOT EXISTS results_scan ON results (scan_id);
+CREATE INDEX IF NOT EXISTS scans_started ON scans (started);
+'''
+
+class ScanDatabase:
+    # Results are buffered and written batch_size rows (or interval seconds)
+    # per transaction by a writer thread, so callers (the GUI thread among
+    # them) never wait on a commit; one connection is shared behind a lock
+    def __init__(self, path=RESULT_DB, batch_size=5000, interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        # Index pages for random IPs don't stay hot in the 2 MB default cache
+        self.connection.execute('PRAGMA cache_size=-65536')
+        self.connection.executescript(SCHEMA)
+        self._buffer = []
+        self._counts = {}
+        self._lock = threading.Lock()
+        # Guards the buffer only, so adding results never waits for the connection
+        self._pending = threading.Condition(threading.Lock())
+        self._closing = False
+        self._writer = threading.Thread(target=self.write_loop, name='scan-db-writer', daemon=True)
+        self._writer.start()
+
+    def begin_scan(self, ip_range, ports, mode=None, checkpoint=None):
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO scans (started, ip_range, ports, mode, checkpoint) VALUES (?, ?, ?, ?, ?)',
+                (time.time(), ip_range, ports, mode, checkpoint))
+            return cursor.lastrowid
+
+    def set_checkpoint(self, scan_id, checkpoint):
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE scans SET checkpoint = ? WHERE id = ?', (checkpoint, scan_id))
+
+    def add_result(self, scan_id, ip, port, service, status, banner):
+        self.add_results(scan_id, [(ip, port, service, status, banner)])
+
+    def add_results(self, scan_id, results):
+        with self._pending:
+            self._buffer.extend((scan_id, *result) for result in results)
+            # Closed and Open|Filtered results are stored too but don't count as open ports
+            opened = sum(1 for result in results if result[3] == 'Open')
+            self._counts[scan_id] = self._counts.get(scan_id, 0) + opened
+            if len(self._buffer) >= self.batch_size:
+                self._pending.notify()
+
+    def flush_locked(self):
+        # Caller holds self._lock
+        with self._pending:
+            buffer, self._buffer = self._buffer, []
+            counts, self._counts = self._counts, {}
+        if buffer:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT INTO results (scan_id, ip, port, service, status, banner) VALUES (?, ?, ?, ?, ?, ?)',
+                    buffer)
+                self.connection.executemany('UPDATE scans SET open_ports = open_ports + ? WHERE id = ?',
+                                            [(count, scan_id) for scan_id, count in counts.items()])
+
+    def flush(self):
+        with self._lock:
+            self.flush_locked()
+
+    def write_loop(self):
+        while True:
+            with self._pending:
+                self._pending.wait_for(lambda: self._closing or len(self._buffer) >= self.batch_size,
+                                       self.interval)
+                closing = self._closing
+            self.flush()
+            if closing:
+                return
+
+    def finish_scan(self, scan_id, status):
+        with self._lock:
+            self.flush_locked()
+            with self.connection:
+                self.connection.execute('UPDATE scans SET finished = ?, status = ? WHERE id = ?',
+                                        (time.time(), status, scan_id))
+
+    def scans(self, limit=500):
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT id, started, ip_range, ports, mode, status, checkpoint, open_ports '
+                'FROM scans ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        keys = ('id', 'started', 'ip_range', 'ports', 'mode', 'status', 'checkpoint', 'open_ports')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def latest_scan(self, ip_range, ports, status='completed'):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT MAX(id) FROM scans WHERE ip_range = ? AND ports = ? AND status = ?',
+                (ip_range, ports, status)).fetchone()
+        return row[0]
+
+    def scan_results(self, scan_id):
+        with self._lock:
+            self.flush_locked()
+            return self.connection.execute(
+                'SELECT ip, port, service, status, banner FROM results WHERE scan_id = ?', (scan_id,)).fetchall()
+
+    def hosts_with_port(self, port, days=None, status='Open'):
+        # Scan ids grow with time, so the age limit becomes a range on the
+        # (port, scan_id) index instead of a join filter
+        with self._lock:
+            self.flush_locked()
+            first_scan = 0
+            if days is not None:
+                first_scan = self.connection.execute(
+                    'SELECT MIN(id) FROM scans WHERE started >= ?', (time.time() - days * 86400,)).fetchone()[0]
+                if first_scan is None:
+                    return []
+            return self.connection.execute(
+                'SELECT ip, port, service, status, banner, MAX(scan_id) FROM results '
+                'WHERE port = ? AND scan_id >= ? AND status = ? GROUP BY ip ORDER BY ip',
+                (port, first_scan, status)).fetchall()
+
+    def close(self):
+        with self._pending:
+            self._closing = True
+            self._pending.notify()
+        self._writer.join()
+        with self._lock:
+            self.flush_locked()
+            self.connection.close()
@@ -0,0 +1,72 @@
+import threading
+
+# Status values used for reported changes
+OPENED = 'Opened'
+CLOSED = 'Closed'
+CHANGED = 'Changed'
+
+class ScanDiff:
+    # Compares results against a baseline result set held in a dict keyed by
+    # (ip, port); only newly opened ports, changed banners and, once the scan
+    # is over, baseline ports that were not seen again are reported
+    def __init__(self, baseline):
+        self.baseline = {(ip, port): (service, banner) for ip, port, service, status, banner in baseline
+                         if status == 'Open'}
+        self.seen = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.baseline)
+
+    def change(self, ip, port, service, status, banner):
+        if status != 'Open':
+            return None
+        previous = self.baseline.get((ip, port))
+        if previous is None:
+            return ip, port, service, OPENED, banner
+        if previous[1] != banner:
+            return ip, port, service, CHANGED, banner
+        return None
+
+    def observe(self, ip, port, service, status, banner):
+        # Marks the result as seen; returns whether it was seen for the first
+        # time and the change to report, if any (only on the first sighting)
+        with self._lock:
+            if (ip, port) in self.seen:
+                return False, None
+            if status == 'Open':
+                self.seen.add((ip, port))
+        return True, self.change(ip, port, service, status, banner)
+
+    def filter(self, results):
+        changes = []
+        for result in results:
+            _, change = self.observe(*result)
+            if change is not None:
+                changes.append(change)
+        return changes
+
+    def wrap(self, callback):
+        # For extra consumers of the same result stream; doesn't mark results as
+        # seen, but like observe reports each port's change once. Closed ports
+        # come from closed() once the scan is over
+        reported = set()
+
+        def on_result(ip, port, service, status, banner):
+            change = self.change(ip, port, service, status, banner)
+            if change is None:
+                return
+            with self._lock:
+                if (ip, port) in reported:
+                    return
+                reported.add((ip, port))
+            callback(*change)
+        return on_result
+
+    def closed(self):
+        with self._lock:
+            return [(ip, port, service, CLOSED, banner) for (ip, port), (service, banner) in self.baseline.items()
+                    if (ip, port) not in self.seen]
+
+    def known_targets(self):
+        return list(self.baseline)
@@ -0,0 +1,141 @@
+import os
+import time
+import errno
+import socket
+import struct
+import select
+import asyncio
+import logging
+import itertools
+
+# Ports that almost every live host either accepts or actively refuses
+DISCOVERY_PORTS = [80, 443, 22, 445, 3389, 139, 135, 25]
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def open_icmp_socket():
+    # Unprivileged ping sockets first (Linux ping_group_range), raw sockets when root
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            sock.setblocking(False)
+            return sock
+        except (PermissionError, OSError):
+            continue
+    return None
+
+def icmp_sweep(hosts, timeout, cancel=None, batch_size=256):
+    sock = open_icmp_socket()
+    if sock is None:
+        logging.info("ICMP discovery unavailable (no ping socket privileges), using TCP only")
+        return None
+    raw = sock.type == socket.SOCK_RAW
+    identifier = os.getpid() & 0xffff
+    alive = set()
+
+    def receive():
+        while True:
+            try:
+                data, address = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            if raw:
+                # Raw sockets see every echo reply on the box, so match our identifier
+                data = data[(data[0] & 0x0f) * 4:]
+                if data[4:6] != identifier.to_bytes(2, 'big'):
+                    continue
+            if data and data[0] == ICMP_ECHO_REPLY:
+                alive.add(int.from_bytes(socket.inet_aton(address[0]), 'big'))
+
+    try:
+        for sequence, host in enumerate(hosts):
+            if cancel is not None and cancel.is_set():
+                break
+            header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence & 0xffff)
+            payload = b'portscan'
+            packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, icmp_checksum(header + payload),
+                                 identifier, sequence & 0xffff) + payload
+            address = socket.inet_ntoa(host.to_bytes(4, 'big'))
+            while True:
+                try:
+                    sock.sendto(packet, (address, 0))
+                    break
+                except (BlockingIOError, InterruptedError):
+                    select.select([sock], [sock], [], 0.01)
+                    receive()
+                except OSError:
+                    break
+            if sequence % batch_size == batch_size - 1:
+                receive()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not (cancel is not None and cancel.is_set()):
+            select.select([sock], [], [], max(0.0, deadline - time.monotonic()))
+            receive()
+    finally:
+        sock.close()
+    return alive
+
+async def tcp_ping(address, ports, timeout):
+    async def knock(port):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+            writer.close()
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except OSError as e:
+            # A refusal still proves something answered at that address
+            return e.errno == errno.ECONNREFUSED
+
+    tasks = [asyncio.create_task(knock(port)) for port in ports]
+    try:
+        for task in asyncio.as_completed(tasks):
+            if await task:
+                return True
+        return False
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def tcp_sweep(hosts, ports, timeout, concurrency, cancel=None):
+    alive = set()
+    pending = iter(hosts)
+
+    async def worker():
+        for host in pending:
+            if cancel is not None and cancel.is_set():
+                return
+            if await tcp_ping(socket.inet_ntoa(host.to_bytes(4, 'big')), ports, timeout):
+                alive.add(host)
+
+    workers = max(1, concurrency // max(1, len(ports)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return alive
+
+def discover_hosts(networks, timeout=1000, ports=DISCOVERY_PORTS, concurrency=1000, use_icmp=True, cancel=None):
+    # Returns the live addresses of the IPv4 networks as sorted integers, or
+    # None when there is no IPv4 network to sweep and every address should be
+    # scanned; IPv6 networks are left to the port scan
+    timeout = timeout / 1000.0
+    if not isinstance(networks, (list, tuple)):
+        networks = [networks]
+    networks = [network for network in networks if network.version == 4]
+    if not networks:
+        return None
+    ranges = [range(int(network.network_address), int(network.broadcast_address) + 1) for network in networks]
+    total = sum(len(hosts) for hosts in ranges)
+    alive = set()
+    if use_icmp:
+        alive = icmp_sweep(itertools.chain.from_iterable(ranges), timeout, cancel) or set()
+    remaining = (host for host in itertools.chain.from_iterable(ranges) if host not in alive)
+    alive |= asyncio.run(tcp_sweep(remaining, ports, timeout, concurrency, cancel))
+    logging.info("Host discovery found %d of %d addresses alive in %s", len(alive), total, ', '.join(map(str, networks)))
+    return sorted(alive)
@@ -0,0 +1,174 @@
+import re
+import sys
+import csv
+import json
+import time
+import socket
+import struct
+import threading
+from xml.sax.saxutils import escape
+
+# Binary export: a 4-byte magic, then one fixed-width record per result:
+#   16-byte address (IPv4 as ::ffff:a.b.c.d), u16 port, u8 status code, pad
+BINARY_MAGIC = b'PSR1'
+BINARY_RECORD = struct.Struct('<16sHBx')
+# New codes go at the end so existing files keep their meaning
+BINARY_STATUSES = ['Open', 'Closed', 'Filtered', 'Open|Filtered', 'Unknown', 'Opened', 'Changed']
+UNKNOWN_STATUS = BINARY_STATUSES.index('Unknown')
+IPV4_MAPPED_PREFIX = b'\0' * 10 + b'\xff\xff'
+# Text export keeps one result per line, so separators inside banners are escaped
+TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+# Characters XML 1.0 does not allow, even as character references
+XML_INVALID = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def pack_address(ip):
+    if ':' in ip:
+        return socket.inet_pton(socket.AF_INET6, ip)
+    return IPV4_MAPPED_PREFIX + socket.inet_aton(ip)
+
+def unpack_address(packed):
+    if packed.startswith(IPV4_MAPPED_PREFIX):
+        return socket.inet_ntoa(packed[12:])
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+def xml_text(value):
+    return escape(XML_INVALID.sub('', value))
+
+def read_binary(path):
+    with open(path, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f'{path} is not a binary scan export')
+        while True:
+            record = f.read(BINARY_RECORD.size)
+            if len(record) < BINARY_RECORD.size:
+                return
+            packed, port, status = BINARY_RECORD.unpack(record)
+            yield unpack_address(packed), port, BINARY_STATUSES[status if status < len(BINARY_STATUSES) else UNKNOWN_STATUS]
+
+class ResultSink:
+    # Appends results to a file as they arrive; the file is flushed every
+    # flush_every results or flush_interval seconds so it can be read mid-scan
+    binary = False
+    extension = 'txt'
+
+    def __init__(self, f, flush_every=256, flush_interval=0.5):
+        self.file = f
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    def write_footer(self):
+        pass
+
+    def write(self, ip, port, service, status, banner):
+        with self._lock:
+            self.write_result(ip, port, service, status, banner)
+            self.count += 1
+            self._pending += 1
+            if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush_locked()
+
+    def write_all(self, results):
+        for result in results:
+            self.write(*result)
+
+    def flush_locked(self):
+        self.file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self.flush_locked()
+
+    def close(self):
+        with self._lock:
+            self.write_footer()
+            self.flush_locked()
+            if self.file not in (sys.stdout, sys.stdout.buffer):
+                self.file.close()
+
+class TextSink(ResultSink):
+    def write_result(self, ip, port, service, status, banner):
+        self.file.write(f'{ip}\t{port}\t{service}\t{status}\t{banner.translate(TEXT_ESCAPES)}\n')
+
+class NdjsonSink(ResultSink):
+    extension = 'ndjson'
+
+    def write_result(self, ip, port, service, status, banner):
+        self.file.write(json.dumps({'ip': ip, 'port': port, 'service': service,
+                                    'status': status, 'banner': banner}, ensure_ascii=False) + '\n')
+
+class JsonSink(ResultSink):
+    # A JSON array is only valid once closed; use NDJSON to read results mid-scan
+    extension = 'json'
+
+    def write_header(self):
+        self.file.write('[')
+
+    def write_result(self, ip, port, service, status, banner):
+        self.file.write(',\n  ' if self.count else '\n  ')
+        self.file.write(json.dumps({'ip': ip, 'port': port, 'service': service,
+                                    'status': status, 'banner': banner}, ensure_ascii=False))
+
+    def write_footer(self):
+        self.file.write('\n]\n')
+
+class CsvSink(ResultSink):
+    extension = 'csv'
+
+    def write_header(self):
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['IP', 'Port', 'Service', 'Status', 'Banner'])
+
+    def write_result(self, ip, port, service, status, banner):
+        self.writer.writerow([ip, port, service, status, banner])
+
+class XmlSink(ResultSink):
+    extension = 'xml'
+
+    def write_header(self):
+        self.file.write("<?xml version='1.0' encoding='utf-8'?>\n<scan_results>\n")
+
+    def write_result(self, ip, port, service, status, banner):
+        self.file.write(f'  <result><ip>{escape(ip)}</ip><port>{port}</port><service>{xml_text(service)}</service>'
+                        f'<status>{escape(status)}</status><banner>{xml_text(banner)}</banner></result>\n')
+
+    def write_footer(self):
+        self.file.write('</scan_results>\n')
+
+class BinarySink(ResultSink):
+    # Banners and service names are left out to keep records fixed-width;
+    # services follow from the port number
+    binary = True
+    extension = 'bin'
+
+    def write_header(self):
+        self.file.write(BINARY_MAGIC)
+
+    def write_result(self, ip, port, service, status, banner):
+        code = BINARY_STATUSES.index(status) if status in BINARY_STATUSES else UNKNOWN_STATUS
+        self.file.write(BINARY_RECORD.pack(pack_address(ip), port, code))
+
+EXPORT_FORMATS = {
+    'CSV': CsvSink,
+    'JSON': JsonSink,
+    'NDJSON': NdjsonSink,
+    'XML': XmlSink,
+    'Binary': BinarySink
+}
+
+def open_sink(sink_class, path=None):
+    # Writes to stdout when no path is given
+    if path is None:
+        return sink_class(sys.stdout.buffer if sink_class.binary else sys.stdout)
+    if sink_class.binary:
+        return sink_class(open(path, 'wb'))
+    return sink_class(open(path, 'w', encoding='utf-8', newline=''))
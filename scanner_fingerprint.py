@@ -0,0 +1,375 @@
+import re
+import heapq
+import logging
+
+# Built-in signatures in the nmap-service-probes format: each match line gives
+# the service, a regex over the raw reply and version fields (p/product/,
+# v/version/, i/info/) filled from its groups. A full nmap-service-probes file
+# can be loaded instead with load_fingerprints(path)
+SERVICE_SIGNATURES = r'''
+Probe TCP NULL q||
+ports 21,22,23,25,110,143,587,3306,5900,6379,11211,27017
+match ssh m|^SSH-([\d.]+)-OpenSSH[_-]([\w.]+)(?: ([^\r\n]+))?\r?\n| p/OpenSSH/ v/$2/ i/$3; protocol $1/
+match ssh m|^SSH-([\d.]+)-dropbear_([\w.]+)\r?\n| p/Dropbear sshd/ v/$2/ i/protocol $1/
+match ssh m|^SSH-([\d.]+)-libssh[_-]([\w.]+)\r?\n| p/libssh/ v/$2/ i/protocol $1/
+match ssh m|^SSH-([\d.]+)-Cisco-([\d.]+)\r?\n| p/Cisco SSH/ v/$2/ i/protocol $1/
+softmatch ssh m|^SSH-([\d.]+)-([^\s\r\n]+)| i/protocol $1; $P(2)/
+match ftp m|^220 \(vsFTPd ([\w.-]+)\)\r\n| p/vsftpd/ v/$1/
+match ftp m|^220 ProFTPD ([\w.]+) Server| p/ProFTPD/ v/$1/
+match ftp m|^220[- ].*ProFTPD ([\w.]+)|s p/ProFTPD/ v/$1/
+match ftp m|^220-+ Welcome to Pure-FTPd|s p/Pure-FTPd/
+match ftp m|^220[- ]FileZilla Server(?: version)? ?([\w. ]*)\r\n| p/FileZilla ftpd/ v/$1/
+match ftp m|^220 Microsoft FTP Service\r\n| p/Microsoft ftpd/
+softmatch ftp m|^220[- ][^\r\n]*FTP|i
+match smtp m|^220 ([-\w.]+) ESMTP Postfix(?: \(([^)]+)\))?| p/Postfix smtpd/ h/$1/ i/$2/
+match smtp m|^220 ([-\w.]+) ESMTP Exim ([\d.]+)| p/Exim smtpd/ v/$2/ h/$1/
+match smtp m|^220 ([-\w.]+) ESMTP Sendmail ([\w.]+)/| p/Sendmail/ v/$2/ h/$1/
+match smtp m|^220 ([-\w.]+) Microsoft ESMTP MAIL Service| p/Microsoft ESMTP/ h/$1/
+match smtp m|^220 ([-\w.]+) ESMTP OpenSMTPD| p/OpenSMTPD/ h/$1/
+softmatch smtp m|^220[- ][^\r\n]*E?SMTP|i
+match pop3 m|^\+OK Dovecot (?:\([^)]+\) )?ready| p/Dovecot pop3d/
+match pop3 m|^\+OK .*POP3 server ready|i p/POP3 server/
+softmatch pop3 m|^\+OK |
+match imap m|^\* OK (?:\[CAPABILITY [^\]]*\] )?Dovecot(?: \([^)]+\))? ready| p/Dovecot imapd/
+match imap m|^\* OK \[CAPABILITY IMAP4rev1[^\]]*\] Courier-IMAP ready| p/Courier imapd/
+softmatch imap m|^\* OK [^\r\n]*IMAP|i
+match telnet m|^\xff[\xfb-\xfe][\x01\x03\x18\x1f\x20\x21\x22\x27]| p/Telnet negotiation/
+match mysql m|^.\0\0\0\x0a(\d+\.\d+\.\d+)-MariaDB|s p/MariaDB/ v/$1/
+match mysql m|^.\0\0\0\x0a([\d.]+[\w.-]*)\0|s p/MySQL/ v/$1/
+match mysql m|^.\0\0\0\xffj\x04Host '[^']*' is not allowed to connect|s p/MySQL/ i/unauthorized/
+match vnc m|^RFB (\d{3})\.(\d{3})\n| p/VNC/ i/protocol $1.$2/
+match amqp m|^AMQP\0\0\t\x01| p/AMQP/ i/protocol 0-9-1/
+match redis m|^-NOAUTH Authentication required| p/Redis key-value store/ i/password protected/
+match redis m|^-DENIED Redis is running in protected mode| p/Redis key-value store/ i/protected mode/
+match redis m|^-ERR wrong number of arguments for 'head' command\r\n| p/Redis key-value store/
+match redis m|^-ERR unknown command [`']HEAD[`'], with args beginning with: | p/Redis key-value store/
+match mongodb m|^.{4}\0\0\0\0\x01\0\0\0|s p/MongoDB/
+match memcached m|^ERROR\r\n$| p/Memcached/
+match postgresql m=^E\0\0\0.S(?:FATAL|ERROR)\0=s p/PostgreSQL DB/
+match rtsp m|^RTSP/1\.0 \d\d\d | p/RTSP server/
+match sip m|^SIP/2\.0 \d\d\d | p/SIP endpoint/
+
+Probe TCP GetRequest q|HEAD / HTTP/1.0\r\n\r\n|
+ports 80-85,443,3000,5000,7001,8000,8008,8080-8090,8443,8888,9000,9090,9200
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: nginx/([\d.]+)|s p/nginx/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: nginx\r\n|s p/nginx/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Apache/([\d.]+)(?: \(([^)]+)\))?|s p/Apache httpd/ v/$1/ i/$2/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Apache\r\n|s p/Apache httpd/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Microsoft-IIS/([\d.]+)|s p/Microsoft IIS httpd/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: lighttpd/([\d.]+)|s p/lighttpd/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Caddy\r\n|s p/Caddy httpd/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: openresty/([\d.]+)|s p/OpenResty web app server/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Jetty\(([\w.-]+)\)|s p/Jetty/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: gunicorn(?:/([\d.]+))?|s p/Gunicorn/ v/$1/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: uvicorn\r\n|s p/Uvicorn/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Werkzeug/([\d.]+) Python/([\d.]+)|s p/Werkzeug httpd/ v/$1/ i/Python $2/
+match http m|^HTTP/1\.[01] .*\r\nServer: SimpleHTTP/([\d.]+) Python/([\d.]+)|s p/SimpleHTTPServer/ v/$1/ i/Python $2/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: BaseHTTP/([\d.]+) Python/([\d.]+)|s p/BaseHTTPServer/ v/$1/ i/Python $2/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: Kestrel\r\n|s p/Kestrel httpd/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nX-Elastic-Product: Elasticsearch|s p/Elasticsearch REST API/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: ([^\r\n/]+)/([\w.-]+)|s p/$1/ v/$2/
+match http m|^HTTP/1\.[01] \d\d\d .*\r\nServer: ([^\r\n]+)\r\n|s p/$1/
+softmatch http m|^HTTP/1\.[01] \d\d\d |
+match http m|^<html>\r?\n<head><title>400 The plain HTTP request was sent to HTTPS port</title>|s p/nginx/ i/HTTPS port/
+'''
+
+# nmap's lowercase service names, respelled as the scanner shows them
+SERVICE_NAMES = {
+    'ftp': 'FTP', 'ssh': 'SSH', 'telnet': 'Telnet', 'smtp': 'SMTP', 'pop3': 'POP3', 'imap': 'IMAP',
+    'http': 'HTTP', 'https': 'HTTPS', 'mysql': 'MySQL', 'postgresql': 'PostgreSQL', 'redis': 'Redis',
+    'mongodb': 'MongoDB', 'memcached': 'Memcached', 'vnc': 'VNC', 'amqp': 'AMQP'
+}
+# A probe whose ports line spans more ports than this is indexed as matching any port
+MAX_INDEXED_PORTS = 4096
+# Signatures that can't be indexed by first byte are tried on any port if they
+# contain a literal this long, which is cheaper to look for than running the regex
+MIN_LITERAL = 3
+# Candidate lists are cached per (first byte, port); the cache is dropped when it outgrows this
+MAX_CANDIDATE_LISTS = 65536
+ESCAPES = {'0': 0, 'a': 7, 'e': 27, 'f': 12, 'n': 10, 'r': 13, 't': 9, 'v': 11}
+VERSION_FIELDS = {'p': 'product', 'v': 'version', 'i': 'info', 'h': 'hostname', 'o': 'os', 'd': 'device'}
+TEMPLATE = re.compile(r'\$(?:(\d)|P\((\d)\)|SUBST\((\d),"([^"]*)","([^"]*)"\)|I\((\d),"([<>])"\))')
+OPTIONAL = object()
+
+def class_end(pattern, i):
+    # Index of the ] closing the class opened at i, where a leading ] or ^] is literal
+    i += 1
+    if pattern[i:i + 1] == '^':
+        i += 1
+    if pattern[i:i + 1] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i
+
+def pattern_tokens(pattern):
+    # Splits a regex into single literal bytes (ints) and opaque pieces (None),
+    # enough to find which byte a match must start with and a literal it must
+    # contain. Returns None for a top-level alternation
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\' and i + 1 < len(pattern):
+            c = pattern[i + 1]
+            i += 2
+            if c == 'x' and re.fullmatch('[0-9a-fA-F]{2}', pattern[i:i + 2]):
+                tokens.append(int(pattern[i:i + 2], 16))
+                i += 2
+            elif c in ESCAPES and not pattern[i:i + 1].isdigit():
+                tokens.append(ESCAPES[c])
+            elif c.isalnum():
+                tokens.append(None)
+            else:
+                tokens.append(ord(c))
+            continue
+        if c == '[':
+            i = class_end(pattern, i)
+            tokens.append(None)
+        elif c == '(':
+            depth = 0
+            while i < len(pattern):
+                if pattern[i] == '\\':
+                    i += 1
+                elif pattern[i] == '[':
+                    i = class_end(pattern, i)
+                elif pattern[i] == '(':
+                    depth += 1
+                elif pattern[i] == ')':
+                    depth -= 1
+                    if not depth:
+                        break
+                i += 1
+            tokens.append(None)
+        elif c == '|':
+            return None
+        elif c in '?*{':
+            if c == '{':
+                i = pattern.find('}', i) if '}' in pattern[i:] else i
+            # The quantified item may be absent
+            if tokens:
+                tokens[-1] = OPTIONAL
+        elif c == '+':
+            tokens.append(None)
+        else:
+            tokens.append(None if c in '.^$' else ord(c))
+        i += 1
+    return tokens
+
+def analyze_pattern(pattern, ignore_case):
+    # (bytes a match can start with or None, longest literal every match contains)
+    tokens = pattern_tokens(pattern)
+    if tokens is None:
+        return None, b''
+    first = None
+    if pattern.startswith('^') and len(tokens) > 1 and isinstance(tokens[1], int):
+        first = {tokens[1]}
+        if ignore_case:
+            first |= {ord(chr(tokens[1]).lower()), ord(chr(tokens[1]).upper())}
+    literal = run = b''
+    for token in tokens:
+        if isinstance(token, int):
+            run += bytes([token])
+            literal = max(literal, run, key=len)
+        else:
+            run = b''
+    return first, literal.lower() if ignore_case else literal
+
+def parse_ports(text):
+    ports = set()
+    for part in text.split(','):
+        start, _, end = part.strip().partition('-')
+        ports.update(range(int(start), int(end or start) + 1))
+        if len(ports) > MAX_INDEXED_PORTS:
+            return None
+    return ports
+
+def parse_fields(text):
+    # The version fields after a match's pattern: p/.../ v|...| cpe:/.../a and so on
+    fields = {}
+    i = 0
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+            continue
+        key = 'cpe' if text.startswith('cpe:', i) else text[i]
+        i += 4 if key == 'cpe' else 1
+        if i >= len(text):
+            break
+        end = text.find(text[i], i + 1)
+        if end < 0:
+            break
+        if key in VERSION_FIELDS:
+            fields[VERSION_FIELDS[key]] = text[i + 1:end]
+        i = end + 1
+        while i < len(text) and not text[i].isspace():
+            i += 1
+    return fields
+
+def printable(data):
+    return ''.join(c for c in data if ' ' <= c <= '~')
+
+def fill_template(template, match):
+    def group(number):
+        value = match.group(int(number))
+        return value.decode('latin-1') if value is not None else ''
+
+    def substitute(m):
+        number, printable_number, subst, old, new, integer, order = m.groups()
+        if number:
+            return printable(group(number))
+        if printable_number:
+            return printable(group(printable_number))
+        if subst:
+            return printable(group(subst)).replace(old, new)
+        value = match.group(int(integer)) or b''
+        return str(int.from_bytes(value, 'big' if order == '>' else 'little'))
+    return ' '.join(TEMPLATE.sub(substitute, template).split())
+
+class ServiceMatch:
+    def __init__(self, service, fields, soft=False):
+        self.service = service
+        self.product = fields.get('product', '')
+        self.version = fields.get('version', '')
+        self.info = fields.get('info', '').strip('; ')
+        self.soft = soft
+
+    def describe(self):
+        # The service column: the service name, then product and version if known
+        name = SERVICE_NAMES.get(self.service, self.service.upper())
+        detail = ' '.join(value for value in (self.product, self.version) if value)
+        return f'{name} ({detail})' if detail else name
+
+class Signature:
+    def __init__(self, order, service, regex, fields, soft, ports, first, literal, ignore_case):
+        self.order = order
+        self.service = service
+        self.regex = regex
+        self.fields = fields
+        self.soft = soft
+        self.ports = ports
+        self.first = first
+        self.literal = literal
+        self.ignore_case = ignore_case
+
+    def __lt__(self, other):
+        return self.order < other.order
+
+    def result(self, match):
+        fields = {name: fill_template(template, match) for name, template in self.fields.items()}
+        return ServiceMatch(self.service, fields, self.soft)
+
+class ServiceFingerprints:
+    # A compiled signature database. Signatures are indexed by the byte their
+    # replies start with and, failing that and a literal to look for, by the
+    # ports of their probe, so a banner is only tried against the few that
+    # could match it; a literal every match must contain is checked before
+    # the regex is run
+    def __init__(self, text, path=None):
+        self.path = path
+        self.signatures = []
+        self.by_byte = {}
+        self.by_port = {}
+        self.anywhere = []
+        self.candidates = {}
+        self.parse(text)
+
+    def parse(self, text):
+        ports = None
+        skipped = 0
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith('Probe '):
+                ports = None
+            elif line.startswith('ports '):
+                try:
+                    ports = parse_ports(line[6:])
+                except ValueError:
+                    ports = None
+            elif line.startswith(('match ', 'softmatch ')):
+                try:
+                    self.add(line, ports)
+                except (re.error, ValueError, IndexError):
+                    skipped += 1
+        if skipped:
+            logging.debug("Skipped %d service signatures that Python's re cannot compile", skipped)
+
+    def add(self, line, ports):
+        kind, service, rest = line.split(None, 2)
+        if not rest.startswith('m'):
+            raise ValueError(line)
+        delimiter = rest[1]
+        end = rest.index(delimiter, 2)
+        pattern = rest[2:end]
+        flags_end = end + 1
+        while flags_end < len(rest) and rest[flags_end] in 'is':
+            flags_end += 1
+        flags = rest[end + 1:flags_end]
+        regex = re.compile(pattern.encode('latin-1'), (re.I if 'i' in flags else 0) | (re.S if 's' in flags else 0))
+        first, literal = analyze_pattern(pattern, 'i' in flags)
+        signature = Signature(len(self.signatures), service, regex, parse_fields(rest[flags_end:]),
+                              kind == 'softmatch', ports, first, literal, 'i' in flags)
+        self.signatures.append(signature)
+        if first:
+            for byte in first:
+                self.by_byte.setdefault(byte, []).append(signature)
+        elif ports and len(literal) < MIN_LITERAL:
+            for port in ports:
+                self.by_port.setdefault(port, []).append(signature)
+        else:
+            self.anywhere.append(signature)
+        self.candidates.clear()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def candidates_for(self, port, first):
+        key = (first, port)
+        candidates = self.candidates.get(key)
+        if candidates is None:
+            if len(self.candidates) >= MAX_CANDIDATE_LISTS:
+                self.candidates.clear()
+            # Merged back into database order, since the first hard match wins
+            candidates = self.candidates[key] = tuple(heapq.merge(
+                self.by_byte.get(first, ()), self.by_port.get(port, ()), self.anywhere))
+        return candidates
+
+    def match(self, port, data):
+        # The first hard match for a reply, else the first soft one, else None
+        if not data:
+            return None
+        lowered = None
+        soft = None
+        for signature in self.candidates_for(port, data[0]):
+            if soft is not None and signature.soft:
+                continue
+            if signature.literal:
+                if signature.ignore_case:
+                    if lowered is None:
+                        lowered = data.lower()
+                    if signature.literal not in lowered:
+                        continue
+                elif signature.literal not in data:
+                    continue
+            found = signature.regex.search(data)
+            if found is None:
+                continue
+            if not signature.soft:
+                return signature.result(found)
+            soft = signature.result(found)
+        return soft
+
+_loaded = {}
+
+def load_fingerprints(path=None):
+    # The built-in database, or an nmap-service-probes file; compiled once per process
+    fingerprints = _loaded.get(path)
+    if fingerprints is None:
+        if path is None:
+            text = SERVICE_SIGNATURES
+        else:
+            with open(path, encoding='latin-1') as f:
+                text = f.read()
+        fingerprints = _loaded[path] = ServiceFingerprints(text, path)
+        logging.debug("Loaded %d service signatures from %s", len(fingerprints), path or 'the built-in database')
+    return fingerprints
@@ -0,0 +1,103 @@
+import os
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = 'port_scanner.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(threadName)s - %(message)s'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+# Overrides the default level of the GUI and the CLI's --log-level default
+LOG_LEVEL_VARIABLE = 'PORT_SCANNER_LOG_LEVEL'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+LOG_BUFFER = 64 * 1024
+
+_listener = None
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler.prepare() formats the message on the logging thread; records
+    # here never leave the process, so formatting is left to the writer thread
+    def prepare(self, record):
+        return record
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    # StreamHandler flushes after every record; this one leaves flushing to the
+    # listener, which does it once the queue is drained, so a burst of records
+    # becomes a few large writes
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER, encoding=self.encoding, errors=self.errors)
+
+    def flush(self):
+        pass
+
+    def flush_buffer(self):
+        super().flush()
+
+    def close(self):
+        self.flush_buffer()
+        super().close()
+
+class BatchingQueueListener(QueueListener):
+    def dequeue(self, block):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            # Nothing more queued: write out the batch before waiting for the next record
+            for handler in self.handlers:
+                getattr(handler, 'flush_buffer', handler.flush)()
+            return self.queue.get(block)
+
+def log_level(name=None, default='INFO'):
+    # An explicit name must be valid; an unknown one in the environment is ignored
+    if name is None:
+        name = os.environ.get(LOG_LEVEL_VARIABLE, '').upper()
+        if name not in LOG_LEVELS:
+            name = default
+    name = name.upper()
+    if name not in LOG_LEVELS:
+        raise ValueError(f'Invalid log level: {name}')
+    return getattr(logging, name)
+
+def setup_logging(level=None, path=LOG_FILE, stream=None, stream_level=logging.WARNING,
+                  max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    # Every logging call only queues the record; a background thread formats
+    # it and writes to a size-rotated file and/or a stream. Calling it again
+    # replaces the previous setup
+    global _listener
+    stop_logging()
+    level = log_level(level) if not isinstance(level, int) else level
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if path:
+        handler = BufferedRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setLevel(level)
+        handlers.append(handler)
+    if stream is not None:
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(stream_level)
+        handlers.append(handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(records))
+    # Records below every handler's level are dropped before any work is done on them
+    root.setLevel(min([handler.level for handler in handlers] or [level]))
+    _listener = BatchingQueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    # Writes out what is still queued; registered to run at exit
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
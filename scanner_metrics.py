@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import errno
+import logging
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scanner_timing import TIMEOUT_ERRNOS
+
+# Upper bounds of the RTT histogram buckets in seconds, as in a Prometheus histogram
+RTT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Probe rate and ETA are taken over this trailing window so they follow changes in pace
+RATE_WINDOW = 10.0
+METRICS_INTERVAL = 5.0
+# Only this many distinct error messages are kept; the rest are counted as 'other'
+MAX_ERROR_MESSAGES = 50
+COUNTERS = ('sent', 'open', 'refused', 'timeouts')
+
+def errno_name(result):
+    return errno.errorcode.get(result, str(result))
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}'
+
+class ScanMetrics:
+    # Thread-safe counters fed by the workers (probe outcomes and RTTs) and by
+    # whoever consumes their progress and errors; snapshot() derives the rate
+    # and ETA. Multi-process children keep their own and ship deltas (take/merge)
+    def __init__(self, total=0):
+        self.total = total
+        self.completed = 0
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.errnos = Counter()
+        self.errors = Counter()
+        self.buckets = [0] * (len(RTT_BUCKETS) + 1)
+        self.rtt_sum = 0.0
+        self.in_flight = 0
+        self.remote_in_flight = {}
+        self.started = time.monotonic()
+        self.samples = deque([(self.started, 0)])
+        self._lock = threading.Lock()
+
+    def probe_started(self):
+        with self._lock:
+            self.counts['sent'] += 1
+            self.in_flight += 1
+
+    def probe_finished(self, result, rtt=None):
+        # result is a connect errno (0 for open); None just ends an abandoned or unanswered probe
+        with self._lock:
+            self.in_flight -= 1
+            if result is not None:
+                self._record(result, rtt)
+
+    def record_reply(self, result, rtt=None):
+        # For engines that can't tie a reply to an in-flight probe (SYN)
+        with self._lock:
+            self._record(result, rtt)
+
+    def _record(self, result, rtt):
+        if result == 0:
+            self.counts['open'] += 1
+        elif result == errno.ECONNREFUSED:
+            self.counts['refused'] += 1
+        elif result in TIMEOUT_ERRNOS:
+            self.counts['timeouts'] += 1
+            return
+        else:
+            self.errnos[errno_name(result)] += 1
+            return
+        # Only answered probes have a meaningful RTT
+        if rtt is not None:
+            self.rtt_sum += rtt
+            for bucket, bound in enumerate(RTT_BUCKETS):
+                if rtt <= bound:
+                    break
+            else:
+                bucket = len(RTT_BUCKETS)
+            self.buckets[bucket] += 1
+
+    def add_progress(self, count):
+        with self._lock:
+            self.completed += count
+            now = time.monotonic()
+            if now - self.samples[-1][0] >= 0.5:
+                self.samples.append((now, self.completed))
+                while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+                    self.samples.popleft()
+
+    def add_error(self, message):
+        with self._lock:
+            if message not in self.errors and len(self.errors) >= MAX_ERROR_MESSAGES:
+                message = 'other'
+            self.errors[message] += 1
+            first = self.errors[message] == 1
+        # Repeats are only counted; the log gets each distinct error once
+        if first:
+            logging.error("Error: %s", message)
+
+    def take(self):
+        # Counts since the last take, for shipping to the parent process
+        with self._lock:
+            delta = {'pid': os.getpid(), 'in_flight': self.in_flight, 'counts': self.counts,
+                     'errnos': dict(self.errnos), 'buckets': self.buckets, 'rtt_sum': self.rtt_sum}
+            self.counts = dict.fromkeys(COUNTERS, 0)
+            self.errnos = Counter()
+            self.buckets = [0] * (len(RTT_BUCKETS) + 1)
+            self.rtt_sum = 0.0
+        return delta
+
+    def merge(self, delta):
+        with self._lock:
+            for name, count in delta['counts'].items():
+                self.counts[name] += count
+            self.errnos.update(delta['errnos'])
+            self.buckets = [total + count for total, count in zip(self.buckets, delta['buckets'])]
+            self.rtt_sum += delta['rtt_sum']
+            self.remote_in_flight[delta['pid']] = delta['in_flight']
+
+    def process_exited(self, pid):
+        with self._lock:
+            self.remote_in_flight.pop(pid, None)
+
+    def rtt_percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile; None without samples
+        answered = sum(self.buckets)
+        if not answered:
+            return None
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= fraction * answered:
+                return RTT_BUCKETS[bucket] if bucket < len(RTT_BUCKETS) else float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.started
+            since, done_before = self.samples[0]
+            rate = (self.completed - done_before) / (now - since) if now > since else 0.0
+            remaining = max(0, self.total - self.completed)
+            eta = remaining / rate if rate > 0 else None
+            if not remaining:
+                eta = 0.0
+            answered = sum(self.buckets)
+            return {
+                'elapsed': round(elapsed, 3),
+                'total': self.total,
+                'completed': self.completed,
+                'rate': round(rate, 1),
+                'average_rate': round(self.completed / elapsed, 1) if elapsed > 0 else 0.0,
+                'eta': None if eta is None else round(eta, 1),
+                'in_flight': self.in_flight + sum(self.remote_in_flight.values()),
+                **self.counts,
+                'errnos': dict(self.errnos.most_common()),
+                'errors': sum(self.errors.values()),
+                'error_messages': dict(self.errors.most_common()),
+                'rtt': {
+                    'count': answered,
+                    'average': round(self.rtt_sum / answered, 6) if answered else None,
+                    'p50': self.rtt_percentile(0.5),
+                    'p90': self.rtt_percentile(0.9),
+                    'p99': self.rtt_percentile(0.99),
+                    'buckets': list(self.buckets)
+                }
+            }
+
+    def prometheus(self):
+        # Text exposition format, version 0.0.4
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP portscan_{name} {help_text}')
+            lines.append(f'# TYPE portscan_{name} {kind}')
+            for labels, value in samples:
+                lines.append(f'portscan_{name}{labels} {value}')
+
+        metric('probes_total', 'counter', 'Probes finished', [('', snapshot['completed'])])
+        metric('targets', 'gauge', 'Probes in this scan', [('', snapshot['total'])])
+        metric('probes_started_total', 'counter', 'Probes started', [('', snapshot['sent'])])
+        metric('in_flight', 'gauge', 'Probes waiting for an answer', [('', snapshot['in_flight'])])
+        metric('probe_rate', 'gauge', f'Probes finished per second over the last {RATE_WINDOW:g}s',
+               [('', snapshot['rate'])])
+        metric('eta_seconds', 'gauge', 'Estimated time to finish the scan',
+               [('', 'NaN' if snapshot['eta'] is None else snapshot['eta'])])
+        metric('responses_total', 'counter', 'Probe outcomes',
+               [(f'{{result="{name}"}}', snapshot[name]) for name in ('open', 'refused', 'timeouts')])
+        metric('socket_errors_total', 'counter', 'Probes that failed with another errno',
+               [(f'{{errno="{name}"}}', count) for name, count in snapshot['errnos'].items()])
+        metric('worker_errors_total', 'counter', 'Errors reported by scan workers', [('', snapshot['errors'])])
+        lines.append('# HELP portscan_rtt_seconds Round-trip time of answered probes')
+        lines.append('# TYPE portscan_rtt_seconds histogram')
+        cumulative = 0
+        for bound, count in zip(RTT_BUCKETS + ('+Inf',), snapshot['rtt']['buckets']):
+            cumulative += count
+            lines.append(f'portscan_rtt_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'portscan_rtt_seconds_sum {self.rtt_sum:.6f}')
+        lines.append(f'portscan_rtt_seconds_count {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        # Written aside and renamed so readers never see a partial file
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary, path)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        metrics = self.server.metrics
+        if self.path.split('?', 1)[0] == '/metrics':
+            body = metrics.prometheus().encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?', 1)[0] == '/metrics.json':
+            body = json.dumps(metrics.snapshot()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics request from %s: " + format, self.client_address[0], *args)
+
+class MetricsReporter:
+    # Publishes a scan's metrics for headless runs: a JSON file rewritten every
+    # interval and/or an HTTP endpoint serving /metrics (Prometheus) and /metrics.json
+    def __init__(self, metrics, path=None, port=None, host='127.0.0.1', interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.server = None
+        self.threads = []
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.metrics = self.metrics
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+            logging.info("Serving metrics on http://%s:%d/metrics", self.host, self.server.server_address[1])
+        if self.path:
+            self.threads.append(threading.Thread(target=self.write_periodically, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def write_periodically(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            self.metrics.write_json(self.path)
+        except OSError as e:
+            logging.warning("Cannot write metrics to %s: %s", self.path, e)
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if self.path:
+            # The final figures, once the workers have stopped
+            self.write()
@@ -0,0 +1,61 @@
+import random
+
+# Hosts whose ports are shuffled together; kept below AdaptiveTiming's host
+# table so per-host RTT estimates survive while their block is being scanned
+HOST_BLOCK = 1024
+FEISTEL_ROUNDS = 4
+MASK64 = (1 << 64) - 1
+
+def new_seed():
+    return random.getrandbits(63)
+
+class Permutation:
+    # A keyed bijection on range(size) with random access: a balanced Feistel
+    # network over the smallest even number of bits covering size, with cycle
+    # walking to stay inside the range (under four rounds on average)
+    def __init__(self, size, seed):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        bits += bits & 1
+        self.half_bits = bits // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        keys = random.Random(seed)
+        self.keys = [keys.getrandbits(64) for _ in range(FEISTEL_ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position):
+        half_bits = self.half_bits
+        half_mask = self.half_mask
+        value = position
+        while True:
+            left = value >> half_bits
+            right = value & half_mask
+            for key in self.keys:
+                # Multiply-xorshift mixing of the right half with the round key
+                mixed = ((right ^ key) * 0x9e3779b97f4a7c15) & MASK64
+                left, right = right, left ^ ((mixed ^ (mixed >> 29)) & half_mask)
+            value = (left << half_bits) | right
+            if value < self.size:
+                return value
+
+class ScanOrder:
+    # Maps scan positions to target indices (ip_offset * port_count + port_offset).
+    # Hosts are taken in blocks of HOST_BLOCK and every (host, port) pair of a
+    # block is visited in permuted order, so consecutive probes go to different
+    # hosts and ports without a shuffled list ever being built
+    def __init__(self, ip_count, port_count, seed):
+        self.seed = seed
+        total = ip_count * port_count
+        self.block_size = min(ip_count, HOST_BLOCK) * port_count
+        last = total % self.block_size if self.block_size else 0
+        self.last_start = total - last
+        self.block = Permutation(self.block_size, seed) if self.block_size else None
+        self.last = Permutation(last, seed) if last else None
+
+    def __getitem__(self, position):
+        if position >= self.last_start:
+            return self.last_start + self.last[position - self.last_start]
+        offset = position % self.block_size
+        return position - offset + self.block[offset]
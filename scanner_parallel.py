@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from scanner_core import TargetFeeder, AsyncScanWorker
+from scanner_timing import create_timing
+from scanner_metrics import ScanMetrics
+from scanner_ratelimit import RateLimiter
+from scanner_fingerprint import load_fingerprints
+
+# Shards per process; more shards than processes lets fast workers pick up
+# the slack left by shards full of slow or filtered hosts
+SHARDS_PER_PROCESS = 8
+
+def shard_ranges(total, shards, chunk_size=256):
+    # Shards cover whole chunks so each chunk is finished by exactly one process
+    chunks = (total + chunk_size - 1) // chunk_size
+    shards = max(1, min(shards, chunks))
+    size, extra = divmod(chunks, shards)
+    start = 0
+    for shard in range(shards):
+        stop = start + size + (1 if shard < extra else 0)
+        yield start * chunk_size, min(stop * chunk_size, total)
+        start = stop
+
+class ResultBatcher:
+    # Collects results in a worker process and ships them to the parent in batches,
+    # along with the metrics counted since the last batch
+    def __init__(self, result_queue, batch_size=512, interval=0.1, metrics=None):
+        self.result_queue = result_queue
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.interval = interval
+        self._results = []
+        self._progress = 0
+        self._chunks = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_result(self, ip, port, service, status, banner):
+        with self._lock:
+            self._results.append((ip, port, service, status, banner))
+            due = self.flush_due()
+        if due:
+            self.flush()
+
+    def add_progress(self, count):
+        with self._lock:
+            self._progress += count
+            due = self.flush_due()
+        if due:
+            self.flush()
+
+    def add_chunk(self, chunk_id):
+        with self._lock:
+            self._chunks.append(chunk_id)
+
+    def add_error(self, message):
+        self.result_queue.put(('error', message))
+
+    def flush_due(self):
+        # Caller holds self._lock
+        return len(self._results) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self):
+        with self._lock:
+            results, self._results = self._results, []
+            progress, self._progress = self._progress, 0
+            chunks, self._chunks = self._chunks, []
+            self._last_flush = time.monotonic()
+        metrics = self.metrics.take() if self.metrics is not None else None
+        if results or progress or chunks or metrics is not None:
+            self.result_queue.put(('batch', (results, progress, chunks, metrics)))
+
+def mirror_events(worker, stop_event, pause_event, rate_limits=None):
+    while worker.is_running:
+        if stop_event.wait(0.1):
+            worker.stop()
+            return
+        if rate_limits is not None and tuple(rate_limits) != worker.limiter.rates():
+            worker.limiter.set_rates(*rate_limits)
+        if pause_event.is_set() and not worker.is_paused:
+            worker.pause()
+        elif not pause_event.is_set() and worker.is_paused:
+            worker.resume()
+
+def scan_shards(targets, chunk_size, completed, track_chunks, shard_queue, result_queue, stop_event, pause_event,
+                timeout, interface, concurrency, banner_timeout, adaptive, host_concurrency, track_metrics,
+                rate_limits, rate_prefix, fingerprint, service_db, tls_options):
+    batcher = ResultBatcher(result_queue, metrics=ScanMetrics() if track_metrics else None)
+    timing = create_timing(timeout, adaptive, host_concurrency)
+    # rate_limits is this process's share of the limits, updated by the parent when they change
+    limiter = RateLimiter(*rate_limits, prefix=rate_prefix) if rate_limits is not None else None
+    fingerprints = load_fingerprints(service_db) if fingerprint else None
+    # tls_options is (ports, this process's share of the handshake pool)
+    inspector = None
+    if tls_options is not None:
+        from scanner_tls import TlsInspector
+        inspector = TlsInspector(timeout, banner_timeout, tls_options[1], tls_options[0], interface)
+    try:
+        while not stop_event.is_set():
+            shard = shard_queue.get()
+            if shard is None:
+                break
+            start, stop = shard
+            feeder = TargetFeeder(targets, chunk_size, start, stop, completed)
+            if track_chunks:
+                feeder.on_chunk_done = batcher.add_chunk
+            worker = AsyncScanWorker(feeder, timeout, interface, concurrency, banner_timeout, timing)
+            worker.metrics = batcher.metrics
+            worker.limiter = limiter
+            worker.fingerprints = fingerprints
+            worker.tls = inspector
+            worker.on_result = batcher.add_result
+            worker.on_progress = batcher.add_progress
+            worker.on_error = batcher.add_error
+            watcher = threading.Thread(target=mirror_events, args=(worker, stop_event, pause_event, rate_limits),
+                                       daemon=True)
+            watcher.start()
+            worker.run()
+            watcher.join()
+            batcher.flush()
+    except Exception as e:
+        result_queue.put(('error', str(e)))
+    finally:
+        if inspector is not None:
+            inspector.close()
+        batcher.flush()
+        result_queue.put(('exit', os.getpid()))
+
+class ParallelScanWorker:
+    def __init__(self, targets, timeout, interface=None, concurrency=1000, banner_timeout=None, processes=None,
+                 adaptive=False, host_concurrency=0):
+        self.targets = targets
+        self.adaptive = adaptive
+        self.host_concurrency = host_concurrency
+        self.timeout = timeout
+        self.interface = interface
+        self.concurrency = concurrency
+        self.banner_timeout = banner_timeout
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.is_running = True
+        self.is_paused = False
+        # spawn keeps children clear of the parent's Qt and scan threads
+        self.context = multiprocessing.get_context('spawn')
+        self.stop_event = self.context.Event()
+        self.pause_event = self.context.Event()
+        self.metrics = None
+        self.limiter = None
+        self.fingerprints = None
+        self.tls = None
+        self.on_result = lambda ip, port, service, status, banner: None
+        self.on_progress = lambda count: None
+        self.on_error = lambda message: None
+
+    def run(self):
+        # targets is the parent's TargetFeeder; children get the target space plus
+        # the completed-chunk bitmap and report finished chunks back in batches
+        feeder = self.targets
+        total = len(feeder.targets)
+        shard_queue = self.context.Queue()
+        result_queue = self.context.Queue()
+        for shard in shard_ranges(total, self.processes * SHARDS_PER_PROCESS, feeder.chunk_size):
+            shard_queue.put(shard)
+        processes = []
+        count = min(self.processes, total) or 1
+        # Every process may probe every host, so each gets a share of the per-host cap and rate limits
+        host_concurrency = max(1, self.host_concurrency // count) if self.host_concurrency else 0
+        rate_limits = None
+        if self.limiter is not None:
+            rate_limits = self.context.Array('d', self.share_rates(count), lock=False)
+            epoch = self.limiter.epoch
+        tls_options = None
+        if self.tls is not None:
+            tls_options = (sorted(self.tls.ports), max(1, self.tls.concurrency // count))
+        for _ in range(count):
+            shard_queue.put(None)
+            process = self.context.Process(
+                target=scan_shards,
+                args=(feeder.targets, feeder.chunk_size, feeder.completed, feeder.on_chunk_done is not None,
+                      shard_queue, result_queue, self.stop_event, self.pause_event,
+                      self.timeout, self.interface, self.concurrency, self.banner_timeout, self.adaptive,
+                      host_concurrency, self.metrics is not None, rate_limits,
+                      self.limiter.prefix if self.limiter is not None else 32,
+                      # Children compile the signatures again rather than unpickle them
+                      self.fingerprints is not None, getattr(self.fingerprints, 'path', None), tls_options),
+                daemon=True)
+            process.start()
+            processes.append(process)
+
+        running = len(processes)
+        while running:
+            if rate_limits is not None and self.limiter.epoch != epoch:
+                epoch = self.limiter.epoch
+                rate_limits[:] = self.share_rates(count)
+            try:
+                kind, payload = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    self.on_error('Scan worker processes exited unexpectedly')
+                    break
+                continue
+            if kind == 'batch':
+                results, progress, chunks, metrics = payload
+                if metrics is not None and self.metrics is not None:
+                    self.metrics.merge(metrics)
+                for result in results:
+                    self.on_result(*result)
+                for chunk_id in chunks:
+                    feeder.chunk_done(chunk_id)
+                if progress:
+                    self.on_progress(progress)
+            elif kind == 'error':
+                self.on_error(payload)
+            elif kind == 'exit':
+                running -= 1
+                if self.metrics is not None:
+                    self.metrics.process_exited(payload)
+        for process in processes:
+            process.join()
+        self.is_running = False
+
+    def share_rates(self, count):
+        return [rate / count for rate in self.limiter.rates()]
+
+    def pause(self):
+        self.is_paused = True
+        self.pause_event.set()
+
+    def resume(self):
+        self.is_paused = False
+        self.pause_event.clear()
+
+    def stop(self):
+        self.is_running = False
+        self.stop_event.set()
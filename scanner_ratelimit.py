@@ -0,0 +1,133 @@
+import time
+import socket
+import ipaddress
+import threading
+from collections import OrderedDict
+
+# A bucket holds this many seconds' worth of probes, so short stalls can be caught up
+BURST_SECONDS = 0.1
+# Probes waiting for their turn wake up this often to notice a rate change
+RESCHEDULE_INTERVAL = 0.25
+# IPv6 hosts are grouped by /64 when IPv4 ones are grouped by subnet
+IPV6_SUBNET_PREFIX = 64
+
+class TokenBucket:
+    # GCRA form of a token bucket: instead of counting tokens it keeps the
+    # time the bucket is next empty, so a reservation is a comparison and an
+    # addition. A rate of 0 means unlimited
+    def __init__(self, rate=0, now=None):
+        self.granted = 0
+        self.reset(rate, now)
+
+    def reset(self, rate, now=None):
+        # A new rate starts from a full bucket; earlier bookings are forgotten
+        self.rate = rate
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = self.interval * max(0.0, rate * BURST_SECONDS - 1)
+        self.next_free = time.monotonic() if now is None else now
+
+    def reserve(self, now):
+        # Books the next slot at or after now and returns when it starts
+        self.granted += 1
+        if not self.interval:
+            return now
+        next_free = max(self.next_free, now)
+        self.next_free = next_free + self.interval
+        return max(now, next_free - self.tolerance)
+
+    def idle(self, now):
+        # An idle bucket is no different from a new one
+        return self.next_free <= now
+
+class RateLimiter:
+    # Probe rate limits for a whole scan (rate) and for each host or subnet
+    # (host_rate, hosts grouped by IPv4 prefix), both in probes per second and
+    # changeable while the scan runs. Workers book a slot with reserve() and
+    # wait for it; a rate change increments epoch so waiting probes book again
+    def __init__(self, rate=0, host_rate=0, prefix=32, max_keys=65536):
+        self.rate = rate
+        self.host_rate = host_rate
+        self.prefix = prefix
+        self.max_keys = max_keys
+        self.epoch = 0
+        self.bucket = TokenBucket(rate)
+        self.buckets = OrderedDict()
+        self.sampled = {}
+        self.sampled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.rate or self.host_rate)
+
+    def key(self, ip):
+        if ':' in ip:
+            prefix = 128 if self.prefix >= 32 else IPV6_SUBNET_PREFIX
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+            return 6, value >> (128 - prefix) << (128 - prefix), prefix
+        value = int.from_bytes(socket.inet_aton(ip), 'big')
+        return 4, value >> (32 - self.prefix) << (32 - self.prefix), self.prefix
+
+    def reserve(self, ip):
+        # Returns the monotonic time at which the probe to ip may be sent
+        with self._lock:
+            now = time.monotonic()
+            start = now
+            if self.host_rate:
+                key = self.key(ip)
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TokenBucket(self.host_rate, now)
+                    if len(self.buckets) > self.max_keys:
+                        self.evict(now)
+                else:
+                    self.buckets.move_to_end(key)
+                start = bucket.reserve(now)
+            return self.bucket.reserve(start)
+
+    def evict(self, now):
+        for key in list(self.buckets)[:len(self.buckets) - self.max_keys]:
+            if self.buckets[key].idle(now):
+                del self.buckets[key]
+                self.sampled.pop(key, None)
+
+    def set_rates(self, rate=None, host_rate=None):
+        # Probes already booked under the old rates book again, so a lower
+        # limit takes effect at once and a higher one doesn't wait out the backlog
+        with self._lock:
+            now = time.monotonic()
+            if rate is not None:
+                self.rate = rate
+            if host_rate is not None:
+                self.host_rate = host_rate
+            self.bucket.reset(self.rate, now)
+            for bucket in self.buckets.values():
+                bucket.reset(self.host_rate, now)
+            self.epoch += 1
+
+    def rates(self):
+        return self.rate, self.host_rate
+
+    def busiest(self, count=5):
+        # [(host or subnet, probes/s)] since the previous call, highest first
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self.sampled_at, 1e-6)
+            rates = []
+            for key, bucket in self.buckets.items():
+                sent = bucket.granted - self.sampled.get(key, 0)
+                self.sampled[key] = bucket.granted
+                if sent:
+                    rates.append((sent / elapsed, key))
+            self.sampled_at = now
+        rates.sort(reverse=True)
+        return [(format_key(key), rate) for rate, key in rates[:count]]
+
+def format_key(key):
+    version, value, prefix = key
+    address = ipaddress.IPv6Address(value) if version == 6 else ipaddress.IPv4Address(value)
+    return str(address) if prefix == address.max_prefixlen else f'{address}/{prefix}'
+
+def create_rate_limiter(rate=0, host_rate=0, prefix=32):
+    # None when neither limit is set, so unlimited scans skip the limiter entirely
+    limiter = RateLimiter(rate, host_rate, prefix)
+    return limiter or None
@@ -0,0 +1,117 @@
+import re
+import time
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from scanner_core import validate_ip
+
+# getaddrinfo doesn't report record TTLs, so answers are kept for a fixed
+# time; failed lookups are cached for less so a fixed name is picked up soon
+DEFAULT_TTL = 300
+NEGATIVE_TTL = 60
+RESOLVER_WORKERS = 64
+# IPv6 ranges are numbered exhaustively like IPv4 ones, so cap them at the size of the IPv4 space
+MIN_IPV6_PREFIX = 96
+HOSTNAME = re.compile(r'^(?=.{1,253}\.?$)(?!-)[A-Za-z0-9_-]{1,63}(?<!-)(?:\.(?!-)[A-Za-z0-9_-]{1,63}(?<!-))*\.?$')
+SEPARATORS = re.compile(r'[\s,]+')
+
+class Resolver:
+    # Thread-safe TTL cache in front of getaddrinfo; resolve() looks names up
+    # on a thread pool so thousands of names take about as long as the slowest
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL, workers=RESOLVER_WORKERS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, name, family=socket.AF_UNSPEC):
+        # Addresses in the order getaddrinfo prefers them (RFC 6724 on most systems)
+        key = (name.lower(), family)
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        try:
+            infos = socket.getaddrinfo(name, None, family, socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos if info[0] in (socket.AF_INET, socket.AF_INET6)))
+            ttl = self.ttl
+        except (socket.gaierror, UnicodeError) as e:
+            logging.warning("Cannot resolve %s: %s", name, e)
+            addresses = []
+            ttl = self.negative_ttl
+        with self._lock:
+            self.cache[key] = (time.monotonic() + ttl, addresses)
+        return addresses
+
+    def resolve(self, names, family=socket.AF_UNSPEC):
+        # Returns {name: addresses}; duplicates are looked up once
+        names = list(dict.fromkeys(names))
+        if len(names) <= 1:
+            return {name: self.lookup(name, family) for name in names}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(names))) as pool:
+            return dict(zip(names, pool.map(lambda name: self.lookup(name, family), names)))
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+
+# Shared so repeated scans of the same names within the TTL skip DNS
+resolver = Resolver()
+
+def read_target_file(path):
+    # One or more targets per line; # starts a comment
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield from split_targets(line.split('#', 1)[0], allow_files=False)
+
+def split_targets(text, allow_files=True):
+    # Targets are separated by commas or whitespace; @path reads a target file
+    for token in SEPARATORS.split(text.strip()):
+        if not token:
+            continue
+        if token.startswith('@') and allow_files:
+            yield from read_target_file(token[1:])
+        else:
+            yield token
+
+def check_target(token):
+    # Syntax only: an address, a CIDR range or something that can be a hostname
+    network = validate_ip(token)
+    if network is not None:
+        return network.version == 4 or network.prefixlen >= MIN_IPV6_PREFIX
+    # An all-numeric last label is a mistyped address, not a hostname
+    return bool(HOSTNAME.match(token)) and not token.rstrip('.').rsplit('.', 1)[-1].isdigit()
+
+def targets_valid(text):
+    # For validating input as it is typed: checks syntax without reading files or resolving names
+    tokens = [token for token in SEPARATORS.split(text.strip()) if token]
+    return bool(tokens) and all(len(token) > 1 if token.startswith('@') else check_target(token) for token in tokens)
+
+def parse_targets(text, family=socket.AF_UNSPEC, cache=None):
+    # Turns a target list into networks in the order given. Hostnames become
+    # single-address networks of their first address (of the given family, or
+    # whichever getaddrinfo prefers), so each target keeps its own family.
+    # Returns (networks, unresolved names); raises ValueError for a malformed
+    # target and OSError for an unreadable target file
+    cache = resolver if cache is None else cache
+    entries = []
+    for token in split_targets(text):
+        if not check_target(token):
+            raise ValueError(f'Invalid target: {token}')
+        entries.append(validate_ip(token) or token)
+    names = [entry for entry in entries if isinstance(entry, str)]
+    addresses = cache.resolve(names, family) if names else {}
+    networks = []
+    unresolved = []
+    for entry in entries:
+        if isinstance(entry, str):
+            if not addresses[entry]:
+                unresolved.append(entry)
+                continue
+            logging.info("%s resolved to %s", entry, addresses[entry][0])
+            entry = validate_ip(addresses[entry][0].split('%', 1)[0])
+        networks.append(entry)
+    # A name listed twice, or resolving to an address also listed, is scanned once
+    return list(dict.fromkeys(networks)), unresolved
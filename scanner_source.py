@@ -0,0 +1,161 @@
+import sys
+import socket
+import ipaddress
+
+# netifaces is optional; without it an interface is honoured through
+# SO_BINDTODEVICE only
+try:
+    import netifaces
+    NETIFACES_AVAILABLE = True
+except ImportError:
+    NETIFACES_AVAILABLE = False
+
+SO_BINDTODEVICE = getattr(socket, 'SO_BINDTODEVICE', None)
+# Linux: bind the address now but pick the ephemeral port at connect time, so
+# source-bound connect scans aren't limited to one ephemeral range per address
+IP_BIND_ADDRESS_NO_PORT = getattr(socket, 'IP_BIND_ADDRESS_NO_PORT', 24) if sys.platform.startswith('linux') else None
+
+def network_interfaces():
+    if NETIFACES_AVAILABLE:
+        return netifaces.interfaces()
+    try:
+        return [name for _, name in socket.if_nameindex()]
+    except (AttributeError, OSError):
+        return []
+
+def interface_addresses(interface):
+    # Unicast addresses of the interface, IPv4 first; link-local IPv6 is skipped
+    # because it would need a scope id on every destination
+    if not NETIFACES_AVAILABLE:
+        return []
+    addresses = netifaces.ifaddresses(interface)
+    result = [entry['addr'] for entry in addresses.get(netifaces.AF_INET, [])]
+    for entry in addresses.get(netifaces.AF_INET6, []):
+        address = entry['addr'].split('%', 1)[0]
+        if not ipaddress.IPv6Address(address).is_link_local:
+            result.append(address)
+    return result
+
+def device_binding_allowed(interface):
+    # SO_BINDTODEVICE needs CAP_NET_RAW on most kernels
+    if SO_BINDTODEVICE is None:
+        return False
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface.encode())
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def parse_source_addresses(text):
+    # Comma- or space-separated addresses
+    try:
+        return [str(ipaddress.ip_address(token)) for token in text.replace(',', ' ').split()]
+    except ValueError:
+        raise ValueError(f'Invalid source address: {text}')
+
+def parse_source_ports(text):
+    # A range (40000-40999) or a comma-separated list
+    try:
+        if '-' in text:
+            start, end = map(int, text.split('-'))
+            ports = range(start, end + 1)
+        else:
+            ports = [int(port) for port in text.split(',')]
+    except ValueError:
+        ports = None
+    if not ports or not all(1 <= port <= 65535 for port in ports):
+        raise ValueError(f'Invalid source port range: {text}')
+    return ports
+
+class SourceBinder:
+    # Binds probe sockets to an interface and spreads probes round-robin over
+    # source addresses and ports. The interface is used through SO_BINDTODEVICE
+    # where permitted, otherwise through its addresses (netifaces). Holds only
+    # plain data so it can be sent to Multi-process workers; the rotation
+    # counter isn't locked since an occasional repeated source does no harm
+    def __init__(self, interface=None, addresses=None, ports=None):
+        self.interface = interface or None
+        self.ports = list(ports) if ports else None
+        addresses = list(addresses or [])
+        self.bind_device = False
+        if self.interface:
+            if self.interface not in network_interfaces():
+                raise ValueError(f'Unknown network interface: {self.interface}')
+            self.bind_device = device_binding_allowed(self.interface)
+            if not addresses and not self.bind_device:
+                addresses = interface_addresses(self.interface)
+                if not addresses:
+                    raise ValueError(f'Cannot bind to {self.interface}: binding to a device needs root or '
+                                     f'CAP_NET_RAW, and its addresses are unknown without netifaces')
+        self.addresses = {socket.AF_INET: [], socket.AF_INET6: []}
+        for address in addresses:
+            family = socket.AF_INET6 if ':' in address else socket.AF_INET
+            check_address(family, address)
+            self.addresses[family].append(address)
+        self.counter = 0
+
+    def __bool__(self):
+        return bool(self.bind_device or self.ports or any(self.addresses.values()))
+
+    def attach(self, sock):
+        if self.bind_device:
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, self.interface.encode())
+
+    def next_source(self, family):
+        # Cycles through every address/port combination of the family;
+        # (None, 0) means let the kernel choose
+        addresses = self.addresses[family] or [None]
+        ports = self.ports or [0]
+        count = self.counter
+        self.counter += 1
+        return addresses[count % len(addresses)], ports[count // len(addresses) % len(ports)]
+
+    def bind(self, sock, source=None):
+        self.attach(sock)
+        address, port = self.next_source(sock.family) if source is None else source
+        if address is None and not port:
+            return
+        if port:
+            # Lets several probes share a source port; each still has its own destination
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif sock.type == socket.SOCK_STREAM and IP_BIND_ADDRESS_NO_PORT is not None:
+            sock.setsockopt(socket.IPPROTO_IP, IP_BIND_ADDRESS_NO_PORT, 1)
+        if address is None:
+            address = '::' if sock.family == socket.AF_INET6 else '0.0.0.0'
+        sock.bind((address, port))
+
+    def socket(self, family, sock_type):
+        sock = socket.socket(family, sock_type)
+        try:
+            self.bind(sock)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+def check_address(family, address):
+    # Fails early, with the address in the message, instead of on every probe
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.bind((address, 0))
+    except OSError as e:
+        raise ValueError(f'Cannot use source address {address}: {e.strerror}')
+    finally:
+        sock.close()
+
+def create_source_binder(interface=None, addresses=None, ports=None):
+    # From user input: an interface name and address/port strings, any of them empty.
+    # Returns None when nothing needs binding
+    binder = SourceBinder(interface, parse_source_addresses(addresses or ''),
+                          parse_source_ports(ports) if ports else None)
+    return binder or None
+
+def source_binder(interface):
+    # Workers take an interface name or a SourceBinder; None (or an empty
+    # binder) leaves source selection to the kernel
+    if isinstance(interface, SourceBinder):
+        return interface or None
+    return SourceBinder(interface) if interface else None
@@ -0,0 +1,271 @@
+import os
+import time
+import errno
+import random
+import select
+import socket
+import struct
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from scanner_core import COMMON_PORTS, ScanWorker
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+TCP_HEADER = struct.Struct('!HHIIBBHHH')
+PSEUDO_HEADER = struct.Struct('!4s4sBBH')
+# Source ports above the usual ephemeral range so replies don't collide with real connections
+SOURCE_PORTS = (61000, 65535)
+# Routing decisions remembered for the most recently probed destinations
+SOURCE_CACHE_SIZE = 4096
+# Open ports remembered to drop retransmitted SYN-ACKs; retransmits follow within seconds
+REPORTED_CACHE_SIZE = 65536
+
+def tcp_checksum(source, destination, segment):
+    data = PSEUDO_HEADER.pack(source, destination, 0, socket.IPPROTO_TCP, len(segment)) + segment
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def source_address(ip, binder=None):
+    # Let the routing table (of the bound interface, if any) pick the local address that would reach ip
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        if binder is not None:
+            binder.attach(probe)
+        probe.connect((ip, 9))
+        return probe.getsockname()[0]
+    finally:
+        probe.close()
+
+def syn_scan_available():
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP).close()
+        return True
+    except OSError:
+        return False
+
+class SynScanWorker(ScanWorker):
+    # Half-open scan: SYNs go out through one raw socket and a receive thread
+    # matches SYN-ACK/RST replies by their acknowledgement number. Each probe's
+    # sequence number is a keyed hash of the target (a stateless cookie), so
+    # nothing is kept per probe except when its wait ends. Needs root or CAP_NET_RAW.
+    # Source addresses get a raw socket each; source ports are just header fields
+    def __init__(self, targets, timeout, interface=None, timing=None):
+        super().__init__(targets, timeout, interface, None, timing)
+        self.secret = os.urandom(16)
+        self.source_port = random.randint(*SOURCE_PORTS)
+        self.source_ports = {self.source_port}
+        if self.source is not None and self.source.ports:
+            self.source_ports = set(self.source.ports)
+        self.reported = OrderedDict()
+        self.opened = 0
+        self.sent = 0
+        # Most probes in flight to one host (the timing's cap). A probe counts
+        # until its reply arrives or its wait ends; kept only while the cap applies
+        self.host_cap = timing.max_window if timing is not None else 0
+        self.in_flight = {}
+        self.outstanding = set()
+        self.flight = threading.Condition()
+
+    def cookie(self, ip_bytes, port):
+        digest = hashlib.blake2s(ip_bytes + port.to_bytes(2, 'big'), key=self.secret, digest_size=4).digest()
+        return int.from_bytes(digest, 'big')
+
+    def build_syn(self, source, destination, port, source_port):
+        header = TCP_HEADER.pack(source_port, port, self.cookie(destination, port), 0, 5 << 4, TCP_SYN,
+                                 1024, 0, 0)
+        checksum = tcp_checksum(source, destination, header)
+        return header[:16] + checksum.to_bytes(2, 'big') + header[18:]
+
+    def receive(self, sock):
+        try:
+            while not self.receiver_done.is_set():
+                readable, _, _ = select.select([sock], [], [], 0.1)
+                if not readable:
+                    continue
+                while True:
+                    try:
+                        packet = sock.recv(65535)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    self.handle_reply(packet)
+        except OSError as e:
+            # Without the receiver every probe would go unanswered, so the scan stops
+            self.on_error(f'SYN scan stopped, cannot receive replies: {e}')
+            self.stop()
+
+    def handle_reply(self, packet):
+        offset = (packet[0] & 0x0f) * 4
+        if len(packet) < offset + TCP_HEADER.size:
+            return
+        port, destination_port, _, ack, _, flags, _, _, _ = TCP_HEADER.unpack_from(packet, offset)
+        if destination_port not in self.source_ports or not flags & TCP_ACK:
+            return
+        ip_bytes = packet[12:16]
+        if ack != (self.cookie(ip_bytes, port) + 1) & 0xffffffff:
+            return
+        if self.host_cap:
+            self.settle((ip_bytes, port))
+        if flags & TCP_RST:
+            if self.metrics is not None:
+                self.metrics.record_reply(errno.ECONNREFUSED)
+        elif flags & TCP_SYN:
+            ip = socket.inet_ntoa(ip_bytes)
+            # SYN-ACKs are retransmitted until the kernel's RST arrives; report once
+            if (ip, port) in self.reported:
+                return
+            self.reported[(ip, port)] = None
+            if len(self.reported) > REPORTED_CACHE_SIZE:
+                self.reported.popitem(last=False)
+            self.opened += 1
+            if self.metrics is not None:
+                self.metrics.record_reply(0)
+            self.on_result(ip, port, COMMON_PORTS.get(port, 'Unknown'), 'Open', '')
+
+    def send(self, sock, packet, ip):
+        while True:
+            try:
+                sock.sendto(packet, (ip, 0))
+                return
+            except (BlockingIOError, InterruptedError):
+                select.select([], [sock], [], 0.01)
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                time.sleep(0.001)
+
+    def track(self, key):
+        with self.flight:
+            if key not in self.outstanding:
+                self.outstanding.add(key)
+                self.in_flight[key[0]] = self.in_flight.get(key[0], 0) + 1
+
+    def settle(self, key):
+        # Called for replies and ended waits alike; only the first frees the host's slot
+        with self.flight:
+            if key in self.outstanding:
+                self.outstanding.discard(key)
+                count = self.in_flight.pop(key[0]) - 1
+                if count:
+                    self.in_flight[key[0]] = count
+                self.flight.notify()
+
+    def wait_for_host(self, destination, waiting):
+        # Holds the next probe while its host is at the cap; False if the scan stopped meanwhile
+        while not self.stopped.is_set():
+            with self.flight:
+                if self.in_flight.get(destination, 0) < self.host_cap:
+                    return True
+                self.flight.wait(min(0.1, max(0.0, waiting[0][0] - time.monotonic())))
+            self.expire(waiting, time.monotonic())
+        return False
+
+    def expire(self, waiting, now):
+        # A probe is finished once its reply window has passed, answered or not
+        expired = 0
+        while waiting and waiting[0][0] <= now:
+            _, index, key = waiting.popleft()
+            if self.host_cap:
+                self.settle(key)
+            self.targets.complete(index)
+            expired += 1
+            if self.metrics is not None:
+                # Replies aren't matched to probes, so unanswered ones aren't counted as timeouts
+                self.metrics.probe_finished(None)
+        if expired:
+            self.on_progress(expired)
+
+    def open_send_sockets(self):
+        # One raw socket per source address, or a single unbound one
+        send_socks = {}
+        addresses = self.source.addresses[socket.AF_INET] if self.source is not None else []
+        try:
+            for address in addresses or [None]:
+                sock = send_socks[address] = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+                sock.setblocking(False)
+                if self.source is not None:
+                    self.source.attach(sock)
+                if address is not None:
+                    sock.bind((address, 0))
+        except OSError:
+            for sock in send_socks.values():
+                sock.close()
+            raise
+        return send_socks
+
+    def run(self):
+        try:
+            send_socks = self.open_send_sockets()
+            recv_sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        except PermissionError:
+            self.on_error('SYN scan needs root or the CAP_NET_RAW capability')
+            self.is_running = False
+            return
+        recv_sock.setblocking(False)
+        if self.source is not None:
+            self.source.attach(recv_sock)
+        recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.receiver_done = threading.Event()
+        receiver = threading.Thread(target=self.receive, args=(recv_sock,), daemon=True)
+        receiver.start()
+        waiting = deque()
+        sources = OrderedDict()
+        try:
+            for index in self.targets:
+                if not self.unpaused.is_set():
+                    self.unpaused.wait()
+                if self.stopped.is_set():
+                    break
+                ip, port = self.targets.decode(index)
+                if ':' in ip:
+                    raise ValueError('SYN scan supports IPv4 targets only')
+                destination = socket.inet_aton(ip)
+                if self.host_cap and not self.wait_for_host(destination, waiting):
+                    break
+                if not self.throttle(ip):
+                    break
+                address, source_port = (None, 0) if self.source is None else self.source.next_source(socket.AF_INET)
+                if address is None:
+                    # Keyed by destination: routes aren't bound to /24 boundaries
+                    source = sources.get(destination)
+                    if source is None:
+                        source = sources[destination] = socket.inet_aton(source_address(ip, self.source))
+                        if len(sources) > SOURCE_CACHE_SIZE:
+                            sources.popitem(last=False)
+                    else:
+                        sources.move_to_end(destination)
+                else:
+                    source = socket.inet_aton(address)
+                packet = self.build_syn(source, destination, port, source_port or self.source_port)
+                if self.host_cap:
+                    # Before sending, so a fast reply finds it
+                    self.track((destination, port))
+                self.send(send_socks[address], packet, ip)
+                self.sent += 1
+                if self.metrics is not None:
+                    self.metrics.probe_started()
+                now = time.monotonic()
+                waiting.append((now + self.timeout, index, (destination, port)))
+                if self.sent % 256 == 0:
+                    self.expire(waiting, now)
+            while waiting and not self.stopped.is_set():
+                self.stopped.wait(max(0.0, waiting[0][0] - time.monotonic()))
+                self.expire(waiting, time.monotonic())
+        except Exception as e:
+            self.on_error(str(e))
+        finally:
+            if self.metrics is not None:
+                for _ in waiting:
+                    self.metrics.probe_finished(None)
+            self.receiver_done.set()
+            receiver.join()
+            for sock in send_socks.values():
+                sock.close()
+            recv_sock.close()
+            logging.info("SYN scan sent %d probes, %d open ports", self.sent, self.opened)
+            self.is_running = False
@@ -0,0 +1,183 @@
+import time
+import errno
+import threading
+import asyncio
+from collections import OrderedDict, deque
+
+# connect_ex results that mean the probe got no answer at all
+TIMEOUT_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ETIMEDOUT, errno.EINPROGRESS}
+# Default cap on probes in flight to one host; also the ceiling of the adaptive window
+MAX_HOST_CONCURRENCY = 256
+
+class HostTiming:
+    # RTT estimation follows RFC 6298 (SRTT/RTTVAR/RTO); the per-host
+    # concurrency window uses TCP-style slow start and congestion avoidance
+    # and halves when probes are dropped
+    def __init__(self, initial_timeout, min_timeout, max_timeout, initial_window, max_window):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.rto = initial_timeout
+        self.srtt = None
+        self.rttvar = None
+        self.window = float(initial_window)
+        self.threshold = float(max_window)
+        self.max_window = max_window
+        self.in_flight = 0
+        self.refused = 0
+        self.refused_since = 0.0
+        self.last_timeout = 0.0
+        self.last_backoff = 0.0
+        self.condition = threading.Condition()
+        self.waiters = deque()
+
+    def timeout(self):
+        return self.rto
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.window):
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.window):
+                    self.in_flight += 1
+                    return
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self.waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Woken and cancelled before taking the slot: the wake-up goes to the next waiter
+                if not future.cancelled():
+                    with self.condition:
+                        self.wake(1)
+                raise
+
+    def wake(self, count):
+        # Caller holds the condition; wakes threads and coroutines waiting for a slot
+        self.condition.notify(count)
+        while count > 0 and self.waiters:
+            loop, future = self.waiters.popleft()
+            if future.done():
+                # Its coroutine was cancelled while waiting
+                continue
+            loop.call_soon_threadsafe(self.resolve, future)
+            count -= 1
+
+    def resolve(self, future):
+        # Runs on the waiter's loop; one cancelled since wake() passes the wake-up on
+        if future.done():
+            with self.condition:
+                self.wake(1)
+        else:
+            future.set_result(None)
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.wake(1)
+
+    def on_reply(self, rtt, refused=False):
+        with self.condition:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.rto = min(self.max_timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+            if not (refused and self.refusal_storm()):
+                if self.window < self.threshold:
+                    self.window = min(self.max_window, self.window + 1)
+                else:
+                    self.window = min(self.max_window, self.window + 1 / self.window)
+            self.wake(int(self.window) - self.in_flight)
+
+    def on_timeout(self):
+        with self.condition:
+            # Karn's backoff: once a host drops probes, wait longer before the next verdict
+            self.rto = min(self.max_timeout, self.rto * 2)
+            self.last_timeout = time.monotonic()
+            self.back_off()
+
+    def refusal_storm(self, limit=200, interval=1.0):
+        # Hosts that rate-limit RSTs answer a burst with a flood of refusals and
+        # silently drop the rest; stop growing the window while both show up
+        now = time.monotonic()
+        if now - self.refused_since >= interval:
+            self.refused = 0
+            self.refused_since = now
+        self.refused += 1
+        return self.refused > limit and now - self.last_timeout < interval
+
+    def back_off(self):
+        # Halve at most once per RTO, like TCP's reaction to a loss event
+        now = time.monotonic()
+        if now - self.last_backoff >= self.rto:
+            self.threshold = max(2.0, self.window / 2)
+            self.window = self.threshold
+            self.last_backoff = now
+
+class FixedHostTiming(HostTiming):
+    # With adaptive timing off: the configured timeout and a fixed per-host cap
+    def on_reply(self, rtt, refused=False):
+        pass
+
+    def on_timeout(self):
+        pass
+
+def record_probe(host, result, rtt):
+    if result == 0 or result == errno.ECONNREFUSED:
+        host.on_reply(rtt, refused=result == errno.ECONNREFUSED)
+    elif result in TIMEOUT_ERRNOS:
+        host.on_timeout()
+
+class AdaptiveTiming:
+    # The configured timeout stays the upper bound; hosts only ever get faster verdicts.
+    # With adaptive off every host keeps the configured timeout and max_window probes in flight
+    def __init__(self, timeout, min_timeout=50, initial_window=8, max_window=MAX_HOST_CONCURRENCY, max_hosts=4096,
+                 adaptive=True):
+        self.adaptive = adaptive
+        self.initial_timeout = timeout / 1000.0
+        self.min_timeout = min(min_timeout / 1000.0, self.initial_timeout)
+        self.initial_window = initial_window
+        self.max_window = max_window
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def host(self, ip):
+        with self._lock:
+            timing = self.hosts.get(ip)
+            if timing is None:
+                if self.adaptive:
+                    timing = HostTiming(self.initial_timeout, self.min_timeout, self.initial_timeout,
+                                        self.initial_window, self.max_window)
+                else:
+                    timing = FixedHostTiming(self.initial_timeout, self.initial_timeout, self.initial_timeout,
+                                             self.max_window, self.max_window)
+                self.hosts[ip] = timing
+                if len(self.hosts) > self.max_hosts:
+                    self.evict()
+            else:
+                self.hosts.move_to_end(ip)
+            return timing
+
+    def evict(self):
+        # Forget the least recently probed idle hosts so sweeps of large ranges stay bounded
+        for ip in list(self.hosts)[:len(self.hosts) - self.max_hosts]:
+            if self.hosts[ip].in_flight == 0:
+                del self.hosts[ip]
+
+def create_timing(timeout, adaptive=True, host_concurrency=MAX_HOST_CONCURRENCY):
+    # Per-host state for the workers; None (no per-host limit at all) only with
+    # adaptive timing off and host_concurrency 0
+    if not adaptive and not host_concurrency:
+        return None
+    host_concurrency = host_concurrency or MAX_HOST_CONCURRENCY
+    return AdaptiveTiming(timeout, initial_window=min(8, host_concurrency), max_window=host_concurrency,
+                          adaptive=adaptive)
@@ -0,0 +1,302 @@
+import ssl
+import socket
+import hashlib
+import logging
+import ipaddress
+import threading
+from weakref import WeakKeyDictionary
+from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scanner_core import TLS_CONCURRENCY, address_family, read_banner
+from scanner_source import source_binder
+
+# Ports inspected over TLS when TLS inspection is on
+TLS_PORTS = frozenset((443, 465, 563, 636, 853, 989, 990, 992, 993, 994, 995, 5061, 5986, 6697, 8443, 9443))
+# Sessions and parsed certificates kept for hosts seen again, in this and later scans
+TLS_CACHE_SIZE = 4096
+HANDSHAKE = 22
+SERVER_HELLO = 2
+# Relative distinguished names shown in subjects and issuers
+NAME_ATTRIBUTES = {b'\x55\x04\x03': 'CN', b'\x55\x04\x0a': 'O', b'\x55\x04\x0b': 'OU', b'\x55\x04\x06': 'C',
+                   b'\x55\x04\x08': 'ST', b'\x55\x04\x07': 'L'}
+SUBJECT_ALT_NAME = b'\x55\x1d\x11'
+
+def der_items(data, start=0, end=None):
+    # (tag, value start, value end) of each DER element in data[start:end]
+    end = len(data) if end is None else end
+    while start < end:
+        tag = data[start]
+        length = data[start + 1]
+        start += 2
+        if length & 0x80:
+            count = length & 0x7f
+            length = int.from_bytes(data[start:start + count], 'big')
+            start += count
+        yield tag, start, start + length
+        start += length
+
+def der_string(tag, value):
+    if tag == 0x1e:
+        return value.decode('utf-16-be', errors='replace')
+    return value.decode('utf-8', errors='replace')
+
+def der_time(tag, value):
+    text = value.decode('ascii')
+    if tag == 0x17:
+        # UTCTime has a two-digit year: 50-99 are 19xx
+        text = ('19' if int(text[:2]) >= 50 else '20') + text
+    return datetime.strptime(text[:14], '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+
+def der_name(data, start, end):
+    parts = []
+    for _, set_start, set_end in der_items(data, start, end):
+        for _, pair_start, pair_end in der_items(data, set_start, set_end):
+            (_, oid_start, oid_end), (tag, value_start, value_end) = der_items(data, pair_start, pair_end)
+            name = NAME_ATTRIBUTES.get(bytes(data[oid_start:oid_end]))
+            if name is not None:
+                parts.append(f'{name}={der_string(tag, data[value_start:value_end])}')
+    return ', '.join(parts)
+
+def der_alt_names(data, start, end):
+    names = []
+    for _, seq_start, seq_end in der_items(data, start, end):
+        for tag, value_start, value_end in der_items(data, seq_start, seq_end):
+            if tag == 0x82:
+                names.append(data[value_start:value_end].decode('ascii', errors='replace'))
+            elif tag == 0x87:
+                names.append(str(ipaddress.ip_address(bytes(data[value_start:value_end]))))
+    return names
+
+class CertificateInfo:
+    # The parts of an X.509 certificate worth reporting, read straight from
+    # its DER encoding (the ssl module only decodes verified certificates)
+    def __init__(self, der):
+        self.sha256 = hashlib.sha256(der).hexdigest()
+        self.subject = self.issuer = ''
+        self.alt_names = []
+        self.not_before = self.not_after = None
+        _, cert_start, cert_end = next(der_items(der))
+        _, tbs_start, tbs_end = next(der_items(der, cert_start, cert_end))
+        fields = list(der_items(der, tbs_start, tbs_end))
+        if fields[0][0] == 0xa0:
+            # Skip the explicit version
+            fields = fields[1:]
+        _, issuer_start, issuer_end = fields[2]
+        self.issuer = der_name(der, issuer_start, issuer_end)
+        _, validity_start, validity_end = fields[3]
+        (before_tag, before_start, before_end), (after_tag, after_start, after_end) = \
+            der_items(der, validity_start, validity_end)
+        self.not_before = der_time(before_tag, der[before_start:before_end])
+        self.not_after = der_time(after_tag, der[after_start:after_end])
+        _, subject_start, subject_end = fields[4]
+        self.subject = der_name(der, subject_start, subject_end)
+        for tag, start, end in fields[6:]:
+            if tag != 0xa3:
+                continue
+            _, extensions_start, extensions_end = next(der_items(der, start, end))
+            for _, extension_start, extension_end in der_items(der, extensions_start, extensions_end):
+                parts = list(der_items(der, extension_start, extension_end))
+                _, oid_start, oid_end = parts[0]
+                if der[oid_start:oid_end] == SUBJECT_ALT_NAME:
+                    _, value_start, value_end = parts[-1]
+                    self.alt_names = der_alt_names(der, value_start, value_end)
+
+def ja3s(hello):
+    # JA3S of a ServerHello handshake message: md5 of "version,cipher,extension types"
+    body = hello[4:]
+    version = int.from_bytes(body[0:2], 'big')
+    offset = 34 + 1 + body[34]
+    cipher = int.from_bytes(body[offset:offset + 2], 'big')
+    # Skip the cipher suite and compression method
+    offset += 3
+    extensions = []
+    if offset + 2 <= len(body):
+        end = offset + 2 + int.from_bytes(body[offset:offset + 2], 'big')
+        offset += 2
+        while offset + 4 <= end:
+            extensions.append(int.from_bytes(body[offset:offset + 2], 'big'))
+            offset += 4 + int.from_bytes(body[offset + 2:offset + 4], 'big')
+    text = f'{version},{cipher},{"-".join(map(str, extensions))}'
+    return hashlib.md5(text.encode()).hexdigest()
+
+def server_fingerprint(hello):
+    try:
+        return ja3s(hello) if hello else None
+    except IndexError:
+        return None
+
+class TlsInspection:
+    def __init__(self, version=None, cipher=None, bits=None, certificate=None, ja3s=None, resumed=False,
+                 data=b'', error=None):
+        self.version = version
+        self.cipher = cipher
+        self.bits = bits
+        self.certificate = certificate
+        self.ja3s = ja3s
+        self.resumed = resumed
+        # The service's reply read over TLS, for fingerprinting
+        self.data = data
+        self.error = error
+
+    def summary(self):
+        # The banner column of a TLS port
+        if self.version is None:
+            return f'TLS handshake failed: {self.error}'
+        parts = [f'{self.version} {self.cipher}']
+        certificate = self.certificate
+        if certificate is not None:
+            parts.append(certificate.subject or 'no subject')
+            if certificate.alt_names:
+                parts.append('SAN ' + ','.join(certificate.alt_names))
+            if certificate.not_after is not None:
+                expired = certificate.not_after < datetime.now(timezone.utc)
+                parts.append(f"{'expired' if expired else 'expires'} {certificate.not_after:%Y-%m-%d}")
+        if self.ja3s:
+            parts.append(f'JA3S {self.ja3s}')
+        return ' | '.join(parts)
+
+class TlsCache:
+    # One client context for every inspection (sessions only resume on the
+    # context that made them) with the sessions and parsed certificates
+    # collected so far, each kept for the TLS_CACHE_SIZE most recent keys
+    def __init__(self, size=TLS_CACHE_SIZE):
+        self.size = size
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.context.check_hostname = False
+        self.context.verify_mode = ssl.CERT_NONE
+        self.context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+        try:
+            # Inspection wants to see legacy servers too, not only those OpenSSL would trust
+            self.context.set_ciphers('ALL:@SECLEVEL=0')
+        except ssl.SSLError:
+            pass
+        # ServerHello messages per TLS connection, until the inspection takes them
+        self.server_hellos = WeakKeyDictionary()
+        self.sessions = OrderedDict()
+        self.certificates = OrderedDict()
+        self._lock = threading.Lock()
+        # JA3S is best-effort. The ssl module has no public API for handshake
+        # messages, so the ServerHello comes from SSLContext._msg_callback, the
+        # private, undocumented hook behind CPython's own TLS tracing. Where it
+        # is missing (other interpreters or future versions) summaries leave JA3S out
+        if hasattr(self.context, '_msg_callback'):
+            self.context._msg_callback = self.record_hello
+
+    def record_hello(self, connection, direction, version, content_type, msg_type, data):
+        if direction == 'read' and content_type == HANDSHAKE and msg_type == SERVER_HELLO:
+            with self._lock:
+                self.server_hellos[connection] = data
+
+    def take_hello(self, connection):
+        with self._lock:
+            return self.server_hellos.pop(connection, None)
+
+    def remember(self, table, key, value):
+        with self._lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.size:
+                table.popitem(last=False)
+
+    def session(self, key):
+        # (session, JA3S of the full handshake that made it), or (None, None)
+        with self._lock:
+            return self.sessions.get(key, (None, None))
+
+    def certificate(self, der):
+        # Parsed once per distinct certificate, however many hosts present it
+        key = hashlib.sha1(der).digest()
+        with self._lock:
+            certificate = self.certificates.get(key)
+        if certificate is None:
+            try:
+                certificate = CertificateInfo(der)
+            except (ValueError, IndexError, StopIteration):
+                return None
+            self.remember(self.certificates, key, certificate)
+        return certificate
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def tls_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TlsCache()
+        return _cache
+
+class TlsInspector:
+    # Handshakes with open TLS ports on its own thread pool, so slow TLS
+    # servers never hold up the scan's probes. Each (ip, port) is inspected
+    # once per scan; hosts seen before resume their TLS session instead of a
+    # full handshake
+    def __init__(self, timeout, banner_timeout=None, concurrency=None, ports=None, interface=None, cache=None):
+        self.timeout = timeout / 1000.0
+        self.banner_timeout = self.timeout if banner_timeout is None else banner_timeout / 1000.0
+        self.concurrency = max(1, concurrency or TLS_CONCURRENCY)
+        self.ports = frozenset(ports) if ports is not None else TLS_PORTS
+        self.source = source_binder(interface)
+        self.cache = cache if cache is not None else tls_cache()
+        self.pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix='tls')
+        self.inspections = {}
+        self.handshakes = 0
+        self.resumed = 0
+        self._lock = threading.Lock()
+
+    def submit(self, ip, port):
+        # A future for the port's TlsInspection, shared by repeated requests
+        with self._lock:
+            future = self.inspections.get((ip, port))
+            if future is None:
+                future = self.inspections[(ip, port)] = self.pool.submit(self.inspect, ip, port)
+        return future
+
+    def inspect(self, ip, port):
+        try:
+            if self.source is None:
+                sock = socket.socket(address_family(ip), socket.SOCK_STREAM)
+            else:
+                sock = self.source.socket(address_family(ip), socket.SOCK_STREAM)
+        except OSError as e:
+            return TlsInspection(error=e.strerror or str(e))
+        cache = self.cache
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect((ip, port))
+            session, first_fingerprint = cache.session((ip, port))
+            with cache.context.wrap_socket(sock, do_handshake_on_connect=False, session=session) as tls:
+                try:
+                    tls.do_handshake()
+                    version = tls.version()
+                    cipher, _, bits = tls.cipher()
+                    der = tls.getpeercert(binary_form=True)
+                    resumed = tls.session_reused
+                    data = read_banner(tls, port, self.banner_timeout)
+                finally:
+                    hello = cache.take_hello(tls)
+                # A resumed handshake has a ServerHello of its own; the fingerprint
+                # reported stays that of the full handshake, so results compare across scans
+                fingerprint = server_fingerprint(hello)
+                if resumed:
+                    fingerprint = first_fingerprint
+                # TLS 1.3 tickets arrive after the handshake, so the session is taken last
+                if tls.session is not None:
+                    cache.remember(cache.sessions, (ip, port), (tls.session, fingerprint))
+        except (OSError, ValueError) as e:
+            return TlsInspection(error=getattr(e, 'reason', None) or getattr(e, 'strerror', None) or str(e)
+                                 or type(e).__name__)
+        finally:
+            sock.close()
+        with self._lock:
+            self.handshakes += 1
+            self.resumed += resumed
+        return TlsInspection(version, cipher, bits, cache.certificate(der) if der else None, fingerprint, resumed,
+                             data)
+
+    def close(self):
+        # Called once the workers are done; in-flight handshakes run out their timeouts on the pool's threads
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.handshakes:
+            logging.info("TLS inspection: %d handshakes, %d resumed sessions", self.handshakes, self.resumed)
@@ -0,0 +1,227 @@
+import sys
+import time
+import errno
+import socket
+import selectors
+import struct
+from collections import deque
+from scanner_core import COMMON_PORTS, ScanWorker, address_family
+
+# Probes for services that ignore an empty datagram; other ports get an empty one
+DNS_QUERY = b'\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01'
+UDP_PAYLOADS = {
+    53: ('DNS', DNS_QUERY),
+    69: ('TFTP', b'\x00\x01probe\x00octet\x00'),
+    111: ('RPC', struct.pack('!10I', 0x12345678, 0, 2, 100000, 2, 0, 0, 0, 0, 0)),
+    123: ('NTP', b'\x1b' + b'\x00' * 47),
+    137: ('NetBIOS', b'\x80\xf0\x00\x10\x00\x01\x00\x00\x00\x00\x00\x00\x20CK' + b'A' * 30 + b'\x00\x00\x21\x00\x01'),
+    161: ('SNMP', b'\x30\x29\x02\x01\x00\x04\x06public\xa0\x1c\x02\x04\x00\x00\x00\x01\x02\x01\x00\x02\x01\x00'
+                  b'\x30\x0e\x30\x0c\x06\x08\x2b\x06\x01\x02\x01\x01\x01\x00\x05\x00'),
+    1900: ('SSDP', b'M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nMAN: "ssdp:discover"\r\n'
+                   b'MX: 1\r\nST: ssdp:all\r\n\r\n'),
+    5353: ('mDNS', DNS_QUERY),
+    11211: ('Memcached', b'\x00\x01\x00\x00\x00\x01\x00\x00stats\r\n')
+}
+
+# Linux queues ICMP errors for unconnected UDP sockets with IP_RECVERR, so one
+# socket can tell closed ports (port unreachable) from silent ones
+ERRQUEUE_AVAILABLE = sys.platform.startswith('linux') and hasattr(socket, 'MSG_ERRQUEUE')
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+EXTENDED_ERROR = struct.Struct('=IBBBBII')
+# (level, option, origin, destination unreachable type, port unreachable code) per family
+RECVERR = {
+    socket.AF_INET: (socket.IPPROTO_IP, IP_RECVERR, SO_EE_ORIGIN_ICMP, 3, 3),
+    socket.AF_INET6: (socket.IPPROTO_IPV6, IPV6_RECVERR, SO_EE_ORIGIN_ICMP6, 1, 4)
+}
+SEND_ERRNOS = {errno.ECONNREFUSED, errno.ENOBUFS, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EACCES}
+# Closed and Filtered ports are counted but not reported, like closed TCP ports
+REPORTED_STATUSES = ('Open', 'Open|Filtered')
+# How each verdict is counted in the scan metrics, as the connect errno it corresponds to
+STATUS_RESULTS = {'Open': 0, 'Closed': errno.ECONNREFUSED, 'Filtered': errno.EHOSTUNREACH,
+                  'Open|Filtered': errno.ETIMEDOUT}
+
+def printable_banner(data):
+    banner = ''.join(chr(byte) if 32 <= byte < 127 else '.' for byte in data[:100]).strip('.')
+    return banner or 'No banner'
+
+class UdpScanWorker(ScanWorker):
+    # All probes go through one unconnected socket per address family (and per
+    # source address/port when spreading over several); up to concurrency
+    # probes are in flight and each is retried before it is called open|filtered
+    def __init__(self, targets, timeout, interface=None, concurrency=1000, timing=None, retries=1):
+        super().__init__(targets, timeout, interface, None, timing)
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        # Most probes in flight to one host (the timing's cap), with the count per host
+        self.host_cap = timing.max_window if timing is not None else 0
+        self.host_probes = {}
+        # (ip, port) -> [target indices, tries, time of the latest try]
+        self.pending = {}
+        self.deadlines = deque()
+        self.progress = 0
+        self.udp_sockets = {}
+        self.selector = selectors.DefaultSelector()
+
+    def socket_for(self, ip):
+        family = address_family(ip)
+        key = (family, None if self.source is None else self.source.next_source(family))
+        sock = self.udp_sockets.get(key)
+        if sock is None:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            self.udp_sockets[key] = sock
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            if ERRQUEUE_AVAILABLE:
+                sock.setsockopt(RECVERR[family][0], RECVERR[family][1], 1)
+            if self.source is not None:
+                self.source.bind(sock, key[1])
+            self.selector.register(sock, selectors.EVENT_READ)
+        return sock
+
+    def probe(self, ip, port, tries):
+        sock = self.socket_for(ip)
+        payload = UDP_PAYLOADS.get(port, (None, b''))[1]
+        for _ in range(2):
+            try:
+                sock.sendto(payload, (ip, port))
+                break
+            except (BlockingIOError, InterruptedError):
+                # Send buffer full: count it as lost and let the retry pick it up
+                break
+            except OSError as e:
+                # An ICMP error for an earlier probe is reported by whichever call
+                # comes next and the datagram isn't sent, so try once more
+                if e.errno not in SEND_ERRNOS:
+                    raise
+        now = time.monotonic()
+        self.deadlines.append((now + self.timeout, (ip, port), tries))
+        if self.metrics is not None:
+            # RTTs are measured from the latest try
+            self.pending[(ip, port)][2] = now
+
+    def finish(self, key, status, data=b''):
+        indices, _, sent = self.pending.pop(key)
+        ip, port = key
+        if self.host_cap:
+            count = self.host_probes.pop(ip) - 1
+            if count:
+                self.host_probes[ip] = count
+        if self.metrics is not None:
+            self.metrics.probe_finished(STATUS_RESULTS[status], time.monotonic() - sent)
+        if status in REPORTED_STATUSES:
+            service = UDP_PAYLOADS[port][0] if port in UDP_PAYLOADS else COMMON_PORTS.get(port, 'Unknown')
+            self.on_result(ip, port, service, status, printable_banner(data) if status == 'Open' else '')
+        for index in indices:
+            self.targets.complete(index)
+        self.progress += len(indices)
+
+    def receive(self, sock):
+        while True:
+            try:
+                data, address = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Without IP_RECVERR some platforms surface ICMP errors here, with
+                # no address to match a probe; the selector reports what's left
+                break
+            if address[:2] in self.pending:
+                self.finish(address[:2], 'Open', data)
+        while ERRQUEUE_AVAILABLE:
+            try:
+                _, ancdata, _, address = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                break
+            key = address[:2] if address else None
+            if key not in self.pending:
+                continue
+            level, option, icmp_origin, unreachable, port_unreachable = RECVERR[sock.family]
+            for level_received, kind, data in ancdata:
+                if level_received != level or kind != option or len(data) < EXTENDED_ERROR.size:
+                    continue
+                _, origin, icmp_type, icmp_code, _, _, _ = EXTENDED_ERROR.unpack_from(data)
+                if origin == icmp_origin and icmp_type == unreachable:
+                    self.finish(key, 'Closed' if icmp_code == port_unreachable else 'Filtered')
+                    break
+
+    def expire(self):
+        now = time.monotonic()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, key, tries = self.deadlines.popleft()
+            entry = self.pending.get(key)
+            if entry is None or entry[1] != tries:
+                continue
+            if tries <= self.retries:
+                entry[1] += 1
+                if self.limiter is not None:
+                    # Retries count against the rate limits but aren't held back
+                    self.limiter.reserve(key[0])
+                self.probe(key[0], key[1], entry[1])
+            else:
+                self.finish(key, 'Open|Filtered')
+
+    def run(self):
+        indices = iter(self.targets)
+        exhausted = False
+        # [index, ip, port, start, epoch] of the next target while it waits for its rate-limit slot
+        held = None
+        try:
+            while not self.stopped.is_set():
+                if not self.unpaused.is_set():
+                    self.unpaused.wait()
+                    continue
+                # Send a whole window of probes before waiting on any reply
+                while not exhausted and len(self.pending) < self.concurrency:
+                    if held is None:
+                        index = next(indices, None)
+                        if index is None:
+                            exhausted = True
+                            break
+                        held = [index, *self.targets.decode(index), 0.0, None]
+                        if (held[1], held[2]) in self.pending:
+                            # Listed twice and already in flight: completed along with that probe,
+                            # so a checkpoint never counts it done before the verdict is in
+                            self.pending[(held[1], held[2])][0].append(index)
+                            held = None
+                            continue
+                    if self.host_cap and self.host_probes.get(held[1], 0) >= self.host_cap:
+                        break
+                    if self.limiter is not None:
+                        if held[4] != self.limiter.epoch:
+                            # Booked again after a rate change
+                            held[4] = self.limiter.epoch
+                            held[3] = self.limiter.reserve(held[1])
+                        if held[3] > time.monotonic():
+                            break
+                    index, ip, port, _, _ = held
+                    held = None
+                    self.pending[(ip, port)] = [[index], 1, 0.0]
+                    if self.host_cap:
+                        self.host_probes[ip] = self.host_probes.get(ip, 0) + 1
+                    if self.metrics is not None:
+                        self.metrics.probe_started()
+                    self.probe(ip, port, 1)
+                if exhausted and not self.pending:
+                    break
+                wait = self.deadlines[0][0] - time.monotonic() if self.deadlines else 0.1
+                if held is not None:
+                    wait = min(wait, held[3] - time.monotonic())
+                for key, _ in self.selector.select(min(max(0.0, wait), 0.1)):
+                    self.receive(key.fileobj)
+                self.expire()
+                if self.progress:
+                    self.on_progress(self.progress)
+                    self.progress = 0
+        except Exception as e:
+            self.on_error(str(e))
+        finally:
+            if self.metrics is not None:
+                for _ in self.pending:
+                    self.metrics.probe_finished(None)
+            for sock in self.udp_sockets.values():
+                sock.close()
+            self.selector.close()
+            self.is_running = False